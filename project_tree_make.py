@@ -1,7 +1,19 @@
+import argparse
+import hashlib
+import json
 import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, NamedTuple, TextIO
 
 """
-这个脚本的功能是生成一个项目的目录树结构，并递归地展示项目的文件夹结构
+这个脚本的功能是生成一个项目的目录树结构，并展示项目的文件夹结构
+使用 os.scandir 迭代遍历（不递归，目录再深也不会超出递归深度），目录项的类型直接取自 DirEntry 的缓存，不再逐个 stat；
+同一目录下先列出子目录、再列出文件，各自按名称排序，多次运行输出一致。
+网络文件系统上列目录较慢时，可以用线程池提前并行读取即将展开的子目录。
+需要目录大小或 JSON/Markdown 输出时先建立目录索引（每个目录的修改时间、子项和文件大小），索引可以保存为快照，
+之后的运行只重新读取修改时间变化了的目录。
 """
 # 定义需要排除的目录列表
 EXCLUDE_DIRS = [".git", ".vscode", ".idea"]
@@ -12,29 +24,641 @@ WEB_EXCLUDE_DIRS = ["node_modules", "dist"]
 # 合并所有排除目录，使用集合存储，避免重复元素
 ALL_EXCLUDE_DIRS = set(EXCLUDE_DIRS + PYTHON_EXCLUDE_DIRS + JAVA_EXCLUDE_DIRS + WEB_EXCLUDE_DIRS)
 
+# 攒够这么多行再写出一次
+WRITE_BATCH_LINES = 4096
 
-def generate_tree(directory, indent=""):
-    # 获取当前目录下的所有目录项
-    items = [entry for entry in os.listdir(directory) if os.path.isdir(os.path.join(directory, entry))]
-    # 过滤掉需要排除的目录
-    valid_items = [item for item in items if item not in ALL_EXCLUDE_DIRS]
-    for index, entry in enumerate(valid_items):
-        path = os.path.join(directory, entry)
-        # 判断是否为最后一个目录
-        if index == len(valid_items) - 1:
-            print(f"{indent}└── {entry}/")
-            new_indent = indent + "    "
+# 快照默认保存在缓存目录下，与 voice/ 工具共用 ITOOLS_CACHE_DIR
+DEFAULT_SNAPSHOT_DIR = os.path.join(
+    os.environ.get("ITOOLS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "itools")),
+    "tree_snapshots",
+)
+SNAPSHOT_VERSION = 1
+
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
+
+
+class TreeEntry(NamedTuple):
+    name: str
+    path: str  # 文件系统路径；基于目录索引输出时为相对根目录的路径
+    is_dir: bool
+    expandable: bool  # 是否展开子目录：符号链接指向的目录只列出，不进入，避免循环
+    size: int = 0  # 文件大小，仅基于目录索引输出时填写
+
+
+class DirRecord(NamedTuple):
+    mtime_ns: int  # 读取目录前的修改时间，不变说明子项没有增删改名
+    dirs: list  # [(名称, 是否展开)]，按名称排序
+    files: list  # [(名称, 大小)]，按名称排序
+
+
+def _gitignore_regex(pattern: str) -> str:
+    """
+    把一条 .gitignore 风格的规则（已去掉开头的 ! 和结尾的 /）转换为匹配相对路径的正则表达式。
+    包含 / 的规则相对根目录匹配，否则匹配任意一层的名称；* 和 ? 不跨越 /，** 可以匹配多层。
+    """
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    parts = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            parts.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            parts.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            parts.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            parts.append("[^/]")
+            index += 1
+        elif pattern[index] == "[" and "]" in pattern[index + 2 :]:
+            end = pattern.index("]", index + 2)
+            body = pattern[index + 1 : end].replace("\\", "\\\\")
+            parts.append(f"[{'^' + body[1:] if body.startswith('!') else body}]")
+            index = end + 1
+        elif pattern[index] == "\\" and index + 1 < len(pattern):
+            parts.append(re.escape(pattern[index + 1]))
+            index += 2
         else:
-            print(f"{indent}├── {entry}/")
-            new_indent = indent + "│   "
-        generate_tree(path, new_indent)
+            parts.append(re.escape(pattern[index]))
+            index += 1
+    return ("" if anchored else "(?:.*/)?") + "".join(parts) + "$"
+
+
+class ExcludeRules:
+    """
+    排除规则：按名称排除的目录，加上 .gitignore 风格的通配规则（创建时编译一次）。
+    与 .gitignore 相同，后面的规则优先，以 ! 开头的规则重新包含，以 / 结尾的规则只匹配目录；
+    被排除的目录整棵跳过，其中的文件无法再被重新包含。
+    """
+
+    def __init__(self, names=ALL_EXCLUDE_DIRS, patterns=()):
+        """
+        :param names: 按名称排除的目录
+        :param patterns: .gitignore 风格的规则，空行和 # 开头的行被忽略
+        """
+        self.names = frozenset(names)
+        self.patterns = []
+        self._rules = []
+        for line in patterns:
+            line = line.rstrip("\n")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+            if not line or line.startswith("#"):
+                continue
+            self.patterns.append(line)
+            negate = line.startswith("!")
+            pattern = line[1:] if negate else line
+            dir_only = pattern.endswith("/")
+            self._rules.append((re.compile(_gitignore_regex(pattern.rstrip("/"))), negate, dir_only))
+
+    @staticmethod
+    def read_ignore_file(path: str) -> list:
+        """
+        读取 .gitignore 风格的规则文件，文件不存在时返回空列表。
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                return f.readlines()
+        except FileNotFoundError:
+            return []
+
+    @property
+    def key(self) -> list:
+        """
+        规则的标识，规则变化时之前的快照不再可用。
+        """
+        return [sorted(self.names), self.patterns]
+
+    def excluded(self, relative_path: str, name: str, is_dir: bool) -> bool:
+        """
+        :param relative_path: 相对根目录的路径，以 / 分隔
+        :param name: 文件或目录名
+        :param is_dir: 是否为目录
+        """
+        if is_dir and name in self.names:
+            return True
+        result = False
+        for regex, negate, dir_only in self._rules:
+            if (is_dir or not dir_only) and regex.match(relative_path):
+                result = not negate
+        return result
+
+
+DEFAULT_RULES = ExcludeRules()
+
+
+def _child_path(relative_dir: str, name: str) -> str:
+    return f"{relative_dir}/{name}" if relative_dir else name
+
+
+def scan_directory(
+    directory: str,
+    include_files: bool = False,
+    rules: ExcludeRules = DEFAULT_RULES,
+    relative_dir: str = "",
+) -> list:
+    """
+    读取一个目录的直接子项：子目录在前、文件在后，各自按名称排序；没有权限读取时返回空列表。
+    :param directory: 目录路径
+    :param include_files: 是否包含文件
+    :param rules: 排除规则
+    :param relative_dir: 该目录相对根目录的路径，用于匹配通配规则
+    :return: TreeEntry 列表
+    """
+    dirs, files = [], []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if not is_dir and not include_files:
+                    continue
+                if rules.excluded(_child_path(relative_dir, entry.name), entry.name, is_dir):
+                    continue
+                if is_dir:
+                    dirs.append(TreeEntry(entry.name, entry.path, True, not entry.is_symlink()))
+                else:
+                    files.append(TreeEntry(entry.name, entry.path, False, False))
+    except OSError:
+        return []
+    dirs.sort()
+    files.sort()
+    return dirs + files
+
+
+def _iter_tree(
+    children_of: Callable[[str, int], list], root: str, indent: str, max_depth: int | None
+) -> Iterator[tuple]:
+    """
+    深度优先地遍历目录树。
+    :param children_of: (目录, 深度) -> 子项列表，目录即 TreeEntry.path
+    :return: (TreeEntry, 深度, 前缀, 是否为最后一项) 的迭代器，根目录的子项深度为 1
+    """
+    if max_depth is not None and max_depth <= 0:
+        return
+    # 栈中每一层是 (子项列表, 下一个下标, 前缀, 深度)
+    stack = [[children_of(root, 0), 0, indent, 1]]
+    while stack:
+        frame = stack[-1]
+        children, index, prefix, depth = frame
+        if index >= len(children):
+            stack.pop()
+            continue
+        frame[1] += 1
+        entry = children[index]
+        # 判断是否为最后一项
+        last = index == len(children) - 1
+        yield entry, depth, prefix, last
+        if entry.expandable and (max_depth is None or depth < max_depth):
+            child_prefix = prefix + ("    " if last else "│   ")
+            stack.append([children_of(entry.path, depth), 0, child_prefix, depth + 1])
+
+
+def _tree_line(entry: TreeEntry, prefix: str, last: bool, note: str = "") -> str:
+    suffix = "/" if entry.is_dir else ""
+    return f"{prefix}{'└── ' if last else '├── '}{entry.name}{suffix}{note}"
+
+
+def iter_tree_lines(
+    directory: str,
+    indent: str = "",
+    max_depth: int | None = None,
+    include_files: bool = False,
+    rules: ExcludeRules = DEFAULT_RULES,
+    workers: int = 0,
+) -> Iterator[str]:
+    """
+    直接读取文件系统，深度优先地逐行生成目录树（不含根目录本身那一行）。
+    :param directory: 根目录
+    :param indent: 每行的前缀
+    :param max_depth: 最多展开的层数，None 表示不限制
+    :param include_files: 是否列出文件
+    :param rules: 排除规则
+    :param workers: 大于 0 时用这么多线程提前读取即将展开的子目录（适合网络文件系统）
+    :return: 目录树各行（不含换行符）的迭代器
+    """
+    pool = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+    prefetched = {}
+    root = os.path.normpath(directory)
+
+    def scan(path: str) -> list:
+        relative_dir = os.path.relpath(path, root).replace(os.sep, "/")
+        return scan_directory(path, include_files, rules, "" if relative_dir == "." else relative_dir)
+
+    def expand(path: str, depth: int) -> list:
+        future = prefetched.pop(path, None)
+        children = future.result() if future else scan(path)
+        # 子目录将要展开时才需要读取，提前提交给线程池；只预读当前路径上各层的兄弟目录，数量有限
+        if pool is not None and (max_depth is None or depth + 1 < max_depth):
+            for child in children:
+                if child.expandable:
+                    prefetched[child.path] = pool.submit(scan, child.path)
+        return children
+
+    try:
+        for entry, _, prefix, last in _iter_tree(expand, root, indent, max_depth):
+            yield _tree_line(entry, prefix, last)
+    finally:
+        if pool is not None:
+            for future in prefetched.values():
+                future.cancel()
+            pool.shutdown(wait=True)
+
+
+def _scan_record(path: str, relative_dir: str, rules: ExcludeRules, mtime_ns: int) -> DirRecord:
+    """
+    读取一个目录，记录子目录和文件大小。文件大小来自 DirEntry.stat，在 Linux 上每个文件一次 lstat。
+    """
+    dirs, files = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                    if rules.excluded(_child_path(relative_dir, entry.name), entry.name, is_dir):
+                        continue
+                    if is_dir:
+                        dirs.append((entry.name, not entry.is_symlink()))
+                    else:
+                        files.append((entry.name, entry.stat(follow_symlinks=False).st_size))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    dirs.sort()
+    files.sort()
+    return DirRecord(mtime_ns, dirs, files)
+
+
+class TreeIndex:
+    """
+    目录索引：每个目录（相对根目录的路径，以 / 分隔）的修改时间、子目录和文件大小。
+    """
+
+    def __init__(self, root: str, rules: ExcludeRules, records: dict, order: list):
+        self.root = os.path.abspath(root)
+        self.rules = rules
+        self.records = records
+        self.order = order  # 广度优先的目录顺序，逆序即可自底向上汇总
+        self.rescanned = 0
+        self.reused = 0
+        self._totals = None
+
+    @classmethod
+    def scan(
+        cls, root: str, rules: ExcludeRules = DEFAULT_RULES, previous=None, workers: int = 0
+    ) -> "TreeIndex":
+        """
+        逐层读取目录树。previous 中修改时间没有变化的目录直接复用，不再读取。
+        目录的修改时间只随子项的增删改名变化，文件内容改变（大小变化）不会反映出来，需要时用完整扫描刷新。
+        :param root: 根目录
+        :param rules: 排除规则
+        :param previous: 上次的索引，None 表示完整扫描
+        :param workers: 大于 0 时每一层的目录用这么多线程并行读取
+        """
+        root = os.path.abspath(root)
+        old_records = previous.records if previous is not None else {}
+        records, order = {}, []
+        index = cls(root, rules, records, order)
+
+        def load(relative_dir: str):
+            path = os.path.join(root, relative_dir) if relative_dir else root
+            try:
+                # 先取修改时间再读取，读取期间发生的变化会在下次运行时被发现
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                return relative_dir, None, False
+            old = old_records.get(relative_dir)
+            if old is not None and old.mtime_ns == mtime_ns:
+                return relative_dir, old, False
+            return relative_dir, _scan_record(path, relative_dir, rules, mtime_ns), True
+
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 0 else None
+        try:
+            level = [""]
+            while level:
+                results = pool.map(load, level) if pool is not None else map(load, level)
+                level = []
+                for relative_dir, record, scanned in results:
+                    if record is None:
+                        continue
+                    records[relative_dir] = record
+                    order.append(relative_dir)
+                    if scanned:
+                        index.rescanned += 1
+                    else:
+                        index.reused += 1
+                    level.extend(
+                        _child_path(relative_dir, name) for name, expandable in record.dirs if expandable
+                    )
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        return index
+
+    @classmethod
+    def load(cls, path: str, root: str, rules: ExcludeRules):
+        """
+        读取快照；快照不存在、已损坏、结构不对、根目录或排除规则不同时返回 None。
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            not isinstance(data, dict)
+            or data.get("version") != SNAPSHOT_VERSION
+            or data.get("root") != os.path.abspath(root)
+            or data.get("rules") != rules.key
+        ):
+            return None
+        try:
+            records = {
+                relative_dir: DirRecord(
+                    int(mtime_ns),
+                    [(str(name), bool(expandable)) for name, expandable in dirs],
+                    [(str(name), int(size)) for name, size in files],
+                )
+                for relative_dir, (mtime_ns, dirs, files) in data["dirs"].items()
+            }
+        except (KeyError, TypeError, ValueError, AttributeError):
+            # 版本号相同但结构不对（手工修改或写入方出错），当作没有快照，重新完整扫描
+            return None
+        return cls(root, rules, records, list(records))
+
+    def save(self, path: str) -> None:
+        """
+        保存快照：先写临时文件再原子替换，中断时不会留下写了一半的快照。
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "root": self.root,
+            "rules": self.rules.key,
+            "dirs": {relative_dir: self.records[relative_dir] for relative_dir in self.order},
+        }
+        temp_path = path + ".part"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    def totals(self) -> dict:
+        """
+        各目录（含所有子目录）的总大小和文件数，自底向上汇总一次后缓存。
+        :return: {相对路径: (字节数, 文件数)}
+        """
+        if self._totals is None:
+            totals = {}
+            for relative_dir in reversed(self.order):
+                record = self.records[relative_dir]
+                size = sum(file_size for _, file_size in record.files)
+                count = len(record.files)
+                for name, expandable in record.dirs:
+                    child = totals.get(_child_path(relative_dir, name)) if expandable else None
+                    if child is not None:
+                        size += child[0]
+                        count += child[1]
+                totals[relative_dir] = (size, count)
+            self._totals = totals
+        return self._totals
+
+    def children(self, relative_dir: str, include_files: bool = False) -> list:
+        """
+        某个目录的子项，TreeEntry.path 为相对根目录的路径。
+        """
+        record = self.records.get(relative_dir)
+        if record is None:
+            return []
+        totals = self.totals()
+        entries = []
+        for name, expandable in record.dirs:
+            path = _child_path(relative_dir, name)
+            entries.append(TreeEntry(name, path, True, expandable, totals.get(path, (0, 0))[0]))
+        if include_files:
+            entries += [
+                TreeEntry(name, _child_path(relative_dir, name), False, False, size)
+                for name, size in record.files
+            ]
+        return entries
+
+
+def default_snapshot_path(root: str) -> str:
+    """
+    根目录对应的默认快照路径（缓存目录下，不会改动被扫描的目录本身）。
+    """
+    digest = hashlib.sha1(os.path.abspath(root).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(DEFAULT_SNAPSHOT_DIR, f"{digest}.json")
+
+
+def format_size(size: int) -> str:
+    """
+    以 1024 进位的可读大小，如 1.5 MB。
+    """
+    value = float(size)
+    for unit in _SIZE_UNITS:
+        if value < 1024 or unit == _SIZE_UNITS[-1]:
+            return f"{size} B" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+
+
+def _describe(index: TreeIndex, entry: TreeEntry) -> str:
+    if entry.is_dir:
+        if not entry.expandable:
+            return "（符号链接）"
+        count = index.totals().get(entry.path, (0, 0))[1]
+        return f"（{format_size(entry.size)}，{count} 个文件）"
+    return f"（{format_size(entry.size)}）"
+
+
+def _write_lines(lines, output: TextIO) -> int:
+    """
+    成批写出各行。
+    :return: 写出的行数
+    """
+    batch = []
+    count = 0
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= WRITE_BATCH_LINES:
+            output.write("\n".join(batch) + "\n")
+            count += len(batch)
+            batch.clear()
+    if batch:
+        output.write("\n".join(batch) + "\n")
+        count += len(batch)
+    output.flush()
+    return count
+
+
+def write_tree(directory: str, output: TextIO = sys.stdout, **options) -> int:
+    """
+    把目录树（第一行为根目录名）成批写入 output。
+    :param options: 传给 iter_tree_lines 的参数
+    :return: 写出的行数（不含根目录那一行）
+    """
+    # 先打印当前文件夹名(project_path) 只要最后的文件夹的名字
+    output.write(f"{os.path.basename(os.path.normpath(directory))}\n")
+    return _write_lines(iter_tree_lines(directory, **options), output)
+
+
+def write_index(
+    index: TreeIndex,
+    output: TextIO = sys.stdout,
+    output_format: str = "text",
+    max_depth: int | None = None,
+    include_files: bool = False,
+    sizes: bool = True,
+) -> None:
+    """
+    基于目录索引输出目录树。
+    :param output_format: "text"（树形文本）、"json"（嵌套对象）或 "markdown"（嵌套列表）
+    :param max_depth: 最多展开的层数，None 表示不限制；目录大小始终包含所有层级
+    :param include_files: 是否列出文件
+    :param sizes: 文本格式是否标注大小和文件数
+    """
+    root_name = os.path.basename(index.root) or index.root
+    root_size, root_count = index.totals().get("", (0, 0))
+    tree = _iter_tree(
+        lambda path, _: index.children(path, include_files), "", "", max_depth
+    )
+
+    if output_format == "json":
+        root = {"name": root_name, "type": "dir", "size": root_size, "files": root_count, "children": []}
+        # 按前序遍历的深度把节点挂到对应的父节点下
+        parents = [root]
+        for entry, depth, _, _ in tree:
+            if entry.is_dir:
+                node = {"name": entry.name, "type": "dir", "size": entry.size}
+                if entry.expandable:
+                    node["files"] = index.totals().get(entry.path, (0, 0))[1]
+                    # 超出 --max-depth 的目录不展开，标记出来以免被当成空目录
+                    if max_depth is not None and depth >= max_depth:
+                        node["truncated"] = True
+                    else:
+                        node["children"] = []
+                else:
+                    node["symlink"] = True
+            else:
+                node = {"name": entry.name, "type": "file", "size": entry.size}
+            del parents[depth:]
+            parents[-1]["children"].append(node)
+            if "children" in node:
+                parents.append(node)
+        json.dump(root, output, ensure_ascii=False, indent=2)
+        output.write("\n")
+        output.flush()
+        return
+
+    if output_format == "markdown":
+        header = f"- **{root_name}/**（{format_size(root_size)}，{root_count} 个文件）"
+        lines = (
+            f"{'  ' * depth}- {f'**{entry.name}/**' if entry.is_dir else entry.name}"
+            f"{_describe(index, entry)}"
+            for entry, depth, _, _ in tree
+        )
+    else:
+        header = root_name
+        if sizes:
+            header += f"（{format_size(root_size)}，{root_count} 个文件）"
+        lines = (
+            _tree_line(entry, prefix, last, _describe(index, entry) if sizes else "")
+            for entry, _, prefix, last in tree
+        )
+    output.write(header + "\n")
+    _write_lines(lines, output)
+
+
+def generate_tree(directory, indent=""):
+    """
+    打印目录树（只包含目录），不含根目录那一行。
+    """
+    for line in iter_tree_lines(directory, indent):
+        print(line)
 
 
 if __name__ == "__main__":
-    project_path = input("Enter the project directory path: ")
+    parser = argparse.ArgumentParser(description="生成项目的目录树结构")
+    parser.add_argument("path", nargs="?", default=None, help="项目目录，省略时交互输入")
+    parser.add_argument("--max-depth", type=int, default=None, help="最多展开的层数")
+    parser.add_argument("--files", action="store_true", help="同时列出文件")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="并行读取目录的线程数（适合网络文件系统）"
+    )
+    parser.add_argument("--output", default=None, help="输出文件，默认输出到标准输出")
+    parser.add_argument(
+        "--format", choices=("text", "json", "markdown"), default="text", help="输出格式"
+    )
+    parser.add_argument("--sizes", action="store_true", help="文本格式中标注目录大小和文件数")
+    parser.add_argument(
+        "--snapshot",
+        nargs="?",
+        const="",
+        default=None,
+        help="使用目录快照，只重新读取修改时间变化了的目录；不指定路径时保存在缓存目录下",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="忽略已有快照，完整扫描一次并更新快照"
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help=".gitignore 风格的排除规则，可重复指定（如 '*.log'、'build/'、'/docs/tmp'）",
+    )
+    parser.add_argument(
+        "--gitignore", action="store_true", help="同时使用根目录下 .gitignore 中的规则"
+    )
+    parser.add_argument(
+        "--no-default-excludes",
+        action="store_true",
+        help="不排除内置的目录（.git、node_modules、__pycache__ 等）",
+    )
+    args = parser.parse_args()
+
+    project_path = args.path or input("Enter the project directory path: ")
     if os.path.exists(project_path) and os.path.isdir(project_path):
-        # 先打印当前文件夹名(project_path) 只要最后的文件夹的名字
-        print(f"{os.path.basename(project_path)}")
-        generate_tree(project_path)
+        patterns = list(args.exclude)
+        if args.gitignore:
+            patterns = ExcludeRules.read_ignore_file(os.path.join(project_path, ".gitignore")) + patterns
+        exclude_rules = ExcludeRules(() if args.no_default_excludes else ALL_EXCLUDE_DIRS, patterns)
+
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            if args.format == "text" and not args.sizes and args.snapshot is None:
+                # 不需要大小时直接边读边输出
+                write_tree(
+                    project_path,
+                    output,
+                    max_depth=args.max_depth,
+                    include_files=args.files,
+                    rules=exclude_rules,
+                    workers=args.workers,
+                )
+            else:
+                snapshot_path = None
+                previous = None
+                if args.snapshot is not None:
+                    snapshot_path = args.snapshot or default_snapshot_path(project_path)
+                    if not args.full:
+                        previous = TreeIndex.load(snapshot_path, project_path, exclude_rules)
+                tree_index = TreeIndex.scan(project_path, exclude_rules, previous, args.workers)
+                if snapshot_path:
+                    tree_index.save(snapshot_path)
+                    print(
+                        f"重新读取 {tree_index.rescanned} 个目录，复用快照中的 {tree_index.reused} 个: {snapshot_path}",
+                        file=sys.stderr,
+                    )
+                write_index(
+                    tree_index, output, args.format, args.max_depth, args.files, args.sizes
+                )
+        finally:
+            if output is not sys.stdout:
+                output.close()
     else:
-        print("Invalid directory path!")
\ No newline at end of file
+        print("Invalid directory path!")
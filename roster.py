@@ -0,0 +1,302 @@
+"""
+多人排班与在岗覆盖查询：每个人有自己的上班/休息周期和起始时间（sortwork.ShiftSchedule），
+在规划时间范围内展开所有班次，建立按上班时间排序的区间索引和覆盖人数的阶梯函数：
+- 某一时刻谁在班：只需检查上班时间落在 (T - 最长班次时长, T] 内的少量班次
+- 某一时刻在班人数、在班人数少于 K 的时间段：在边界数组上二分查找
+安装了 NumPy 时用向量化的方式展开班次和建立索引（几千人一年的排班在一秒内完成），否则使用纯 Python 实现（结果相同，速度较慢）。
+"""
+import argparse
+import csv
+import sys
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate
+from typing import Iterable, Iterator, NamedTuple
+
+from sortwork import TIME_FORMAT, ShiftSchedule, parse_time
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+# 索引内部以整数微秒表示时间
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+class Person(NamedTuple):
+    name: str
+    schedule: ShiftSchedule
+
+
+class Gap(NamedTuple):
+    start: datetime
+    end: datetime
+    min_on_duty: int  # 该时间段内的最少在班人数
+
+
+def _to_us(moment) -> int:
+    return (parse_time(moment) - _EPOCH) // _MICROSECOND
+
+
+def _from_us(value) -> datetime:
+    return _EPOCH + timedelta(microseconds=int(value))
+
+
+def _search_right(values, value: int) -> int:
+    """
+    有序序列中大于 value 的第一个位置。
+    """
+    if np is not None:
+        return int(np.searchsorted(values, value, "right"))
+    return bisect_right(values, value)
+
+
+def load_roster(path: str) -> list:
+    """
+    从 CSV 读取排班，列为 name,start,work_hours,rest_hours；start 为某次下班时间（格式同 sortwork），
+    后两列可以省略（默认上 12 小时、休 24 小时）。
+    :return: Person 列表
+    """
+    people = []
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        for row in csv.DictReader(f):
+            schedule = ShiftSchedule(
+                row["start"],
+                float(row.get("work_hours") or 12),
+                float(row.get("rest_hours") or 24),
+            )
+            people.append(Person(row["name"], schedule))
+    return people
+
+
+class CoverageIndex:
+    """
+    规划时间范围 [begin, end) 内所有人的班次索引。
+    """
+
+    def __init__(self, people: Iterable[Person], begin, end):
+        """
+        :param people: 排班人员
+        :param begin: 规划范围开始
+        :param end: 规划范围结束
+        """
+        self.people = list(people)
+        self.begin = parse_time(begin)
+        self.end = parse_time(end)
+        if self.end <= self.begin:
+            raise ValueError("规划范围的结束时间必须晚于开始时间")
+        begin_us, end_us = _to_us(self.begin), _to_us(self.end)
+        anchors = [_to_us(person.schedule.anchor) for person in self.people]
+        periods = [person.schedule.period // _MICROSECOND for person in self.people]
+        works = [person.schedule.work // _MICROSECOND for person in self.people]
+        self._max_work = max(works, default=0)
+        if np is not None:
+            self._build_numpy(anchors, periods, works, begin_us, end_us)
+        else:
+            self._build_python(anchors, periods, works, begin_us, end_us)
+
+    def _build_numpy(self, anchors, periods, works, begin_us, end_us) -> None:
+        """
+        向量化展开班次：每人与规划范围重叠的班次序号是一个连续区间，由取模直接算出。
+        """
+        anchors = np.asarray(anchors, dtype=np.int64)
+        periods = np.asarray(periods, dtype=np.int64)
+        works = np.asarray(works, dtype=np.int64)
+        # 第 k 个班次与 [begin, end) 重叠：anchor + k*period < end 且 anchor + k*period + work > begin
+        first = (begin_us - works - anchors) // periods + 1
+        last = (end_us - 1 - anchors) // periods
+        counts = np.maximum(last - first + 1, 0)
+        owners = np.repeat(np.arange(len(anchors)), counts)
+        offsets = np.arange(owners.size) - np.repeat(np.cumsum(counts) - counts, counts)
+        starts = anchors[owners] + (first[owners] + offsets) * periods[owners]
+        order = np.argsort(starts, kind="stable")
+        self._starts = starts[order]
+        self._ends = self._starts + works[owners[order]]
+        self._owners = owners[order]
+
+        # 覆盖人数的阶梯函数：边界处上班 +1、下班 -1，同一时刻的变化合并
+        events = np.concatenate([self._starts, self._ends])
+        deltas = np.concatenate(
+            [np.ones(self._starts.size, np.int64), -np.ones(self._ends.size, np.int64)]
+        )
+        order = np.argsort(events, kind="stable")
+        events, totals = events[order], np.cumsum(deltas[order])
+        last_of_time = np.flatnonzero(np.diff(events, append=np.iinfo(np.int64).max))
+        self._times = events[last_of_time]
+        self._counts = totals[last_of_time]
+
+    def _build_python(self, anchors, periods, works, begin_us, end_us) -> None:
+        """
+        纯 Python 实现，逻辑同 _build_numpy。
+        """
+        shifts = []
+        for owner, (anchor, period, work) in enumerate(zip(anchors, periods, works)):
+            first = (begin_us - work - anchor) // period + 1
+            last = (end_us - 1 - anchor) // period
+            for index in range(first, last + 1):
+                start = anchor + index * period
+                shifts.append((start, start + work, owner))
+        shifts.sort(key=lambda shift: shift[0])
+        self._starts = [start for start, _, _ in shifts]
+        self._ends = [end for _, end, _ in shifts]
+        self._owners = [owner for _, _, owner in shifts]
+
+        changes = {}
+        for start, end, _ in shifts:
+            changes[start] = changes.get(start, 0) + 1
+            changes[end] = changes.get(end, 0) - 1
+        self._times = sorted(changes)
+        self._counts = list(accumulate(changes[time] for time in self._times))
+
+    @property
+    def shift_count(self) -> int:
+        """
+        索引中的班次数。
+        """
+        return len(self._starts)
+
+    def on_duty(self, moment) -> list:
+        """
+        该时刻在班的人（按上班时间排序）。
+        """
+        moment_us = _to_us(moment)
+        if np is not None:
+            low = np.searchsorted(self._starts, moment_us - self._max_work, "right")
+            high = np.searchsorted(self._starts, moment_us, "right")
+            owners = self._owners[low:high][self._ends[low:high] > moment_us].tolist()
+        else:
+            low = bisect_right(self._starts, moment_us - self._max_work)
+            high = bisect_right(self._starts, moment_us)
+            owners = [
+                self._owners[index] for index in range(low, high) if self._ends[index] > moment_us
+            ]
+        return [self.people[owner] for owner in owners]
+
+    def count_at(self, moment) -> int:
+        """
+        该时刻的在班人数。
+        """
+        index = _search_right(self._times, _to_us(moment)) - 1
+        return int(self._counts[index]) if index >= 0 else 0
+
+    def counts_at(self, moments):
+        """
+        批量查询在班人数。
+        :param moments: 时刻序列；安装了 NumPy 时可以直接传入 datetime64 数组
+        :return: 安装了 NumPy 时为整数数组，否则为整数列表
+        """
+        if np is None:
+            return [self.count_at(moment) for moment in moments]
+        moments_us = (
+            np.asarray(moments, dtype="datetime64[us]") - np.datetime64(_EPOCH, "us")
+        ).astype(np.int64)
+        counts = np.append(self._counts, 0)  # 第一个边界之前的人数为 0，用下标 -1 取到
+        return counts[np.searchsorted(self._times, moments_us, "right") - 1]
+
+    def steps(self, begin=None, end=None) -> Iterator[tuple]:
+        """
+        逐段产出在班人数不变的时间段。
+        :param begin: 开始时间，默认为规划范围开始
+        :param end: 结束时间，默认为规划范围结束
+        :return: (开始, 结束, 在班人数) 的迭代器，时间为微秒整数
+        """
+        begin_us = _to_us(begin if begin is not None else self.begin)
+        end_us = _to_us(end if end is not None else self.end)
+        index = _search_right(self._times, begin_us)
+        count = int(self._counts[index - 1]) if index else 0
+        position = begin_us
+        while position < end_us:
+            boundary = int(self._times[index]) if index < len(self._times) else end_us
+            boundary = min(boundary, end_us)
+            if boundary > position:
+                yield position, boundary, count
+                position = boundary
+            if index < len(self._times):
+                count = int(self._counts[index])
+            index += 1
+
+    def gaps(self, min_staff: int, begin=None, end=None) -> list:
+        """
+        在班人数少于 min_staff 的时间段，相邻的时间段合并为一个。
+        :param min_staff: 最少需要的在班人数
+        :param begin: 开始时间，默认为规划范围开始
+        :param end: 结束时间，默认为规划范围结束
+        :return: Gap 列表
+        """
+        if np is not None:
+            return self._gaps_numpy(min_staff, begin, end)
+        gaps = []
+        current = None
+        for start, end_us, count in self.steps(begin, end):
+            if count >= min_staff:
+                current = None
+                continue
+            if current is not None and current[1] == start:
+                current[1] = end_us
+                current[2] = min(current[2], count)
+            else:
+                current = [start, end_us, count]
+                gaps.append(current)
+        return [Gap(_from_us(start), _from_us(end_us), count) for start, end_us, count in gaps]
+
+    def _gaps_numpy(self, min_staff: int, begin, end) -> list:
+        """
+        向量化实现，逻辑同 gaps。
+        """
+        begin_us = _to_us(begin if begin is not None else self.begin)
+        end_us = _to_us(end if end is not None else self.end)
+        if end_us <= begin_us:
+            return []
+        # 范围内的各段：第一段从 begin 开始，之后每个边界开始一段
+        low = np.searchsorted(self._times, begin_us, "right")
+        high = np.searchsorted(self._times, end_us, "left")
+        inner = self._times[low:high]
+        starts = np.concatenate([[begin_us], inner])
+        ends = np.concatenate([inner, [end_us]])
+        before = self._counts[low - 1] if low else 0
+        counts = np.concatenate([[before], self._counts[low:high]])
+
+        # 人手不足的连续段合并：找出布尔序列中每一串 True 的起止位置
+        short = np.concatenate([[False], counts < min_staff, [False]])
+        edges = np.diff(short.astype(np.int8))
+        run_starts = np.flatnonzero(edges == 1)
+        run_ends = np.flatnonzero(edges == -1)
+        if run_starts.size == 0:
+            return []
+        bounds = np.stack([run_starts, run_ends], axis=1).ravel()
+        minimums = np.minimum.reduceat(np.append(counts, 0), bounds)[::2]
+        return [
+            Gap(_from_us(starts[first]), _from_us(ends[stop - 1]), int(minimum))
+            for first, stop, minimum in zip(run_starts, run_ends, minimums)
+        ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多人排班的在班查询与人手不足时间段")
+    parser.add_argument(
+        "--roster", required=True, help="排班 CSV，列为 name,start,work_hours,rest_hours"
+    )
+    parser.add_argument("--begin", required=True, help="规划范围开始，格式为 YYYY-MM-DD HH:MM")
+    parser.add_argument("--end", required=True, help="规划范围结束，格式同 --begin")
+    parser.add_argument("--at", action="append", default=[], help="查询该时刻谁在班，可重复指定")
+    parser.add_argument(
+        "--min-staff", type=int, default=None, help="列出在班人数少于该值的时间段"
+    )
+    args = parser.parse_args()
+
+    index = CoverageIndex(load_roster(args.roster), args.begin, args.end)
+    print(f"{len(index.people)} 人，规划范围内共 {index.shift_count} 个班次")
+    for moment in args.at:
+        names = [person.name for person in index.on_duty(moment)]
+        print(f"{moment} 在班 {len(names)} 人: {', '.join(names) or '无'}")
+    if args.min_staff is not None:
+        gaps = index.gaps(args.min_staff)
+        print(f"在班人数少于 {args.min_staff} 的时间段（{len(gaps)} 个）：")
+        for gap in gaps:
+            print(
+                f"  {gap.start:{TIME_FORMAT}} - {gap.end:{TIME_FORMAT}}，最少 {gap.min_on_duty} 人"
+            )
+    if not args.at and args.min_staff is None:
+        sys.exit("请指定 --at 或 --min-staff")
@@ -0,0 +1,113 @@
+"""
+roster.CoverageIndex 的性能基准：用固定种子生成若干人的随机排班（不同的上班/休息时长和起始时间），
+统计建立索引、逐个查询谁在班、批量查询在班人数和查找人手不足时间段的耗时。
+建立索引与一个月的人手不足查询总耗时超过预算时以非零状态退出。
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import roster
+from roster import CoverageIndex, Person
+from sortwork import ShiftSchedule
+
+# 随机排班使用的上班、休息时长（小时）
+WORK_HOURS = (8, 10, 12, 24)
+REST_HOURS = (12, 16, 24, 48, 72)
+
+# 默认的总耗时预算（秒）
+DEFAULT_BUDGET = 1.0
+
+
+def generate_people(count: int, begin: datetime, seed: int) -> list:
+    """
+    生成确定性的随机排班，起始时间分布在 begin 之后的两周内，以半小时为粒度。
+    """
+    rng = random.Random(seed)
+    return [
+        Person(
+            f"staff-{index:05d}",
+            ShiftSchedule(
+                begin + timedelta(minutes=30 * rng.randrange(14 * 48)),
+                rng.choice(WORK_HOURS),
+                rng.choice(REST_HOURS),
+            ),
+        )
+        for index in range(count)
+    ]
+
+
+def _timed(results: list, label: str, function, *args):
+    start = time.perf_counter()
+    value = function(*args)
+    seconds = time.perf_counter() - start
+    results.append((label, seconds))
+    return value
+
+
+def run_benchmark(people_count: int, days: int, queries: int, min_staff: int, seed: int) -> list:
+    """
+    运行一轮基准。
+    :return: (项目, 耗时秒数) 列表
+    """
+    begin = datetime(2025, 1, 1)
+    end = begin + timedelta(days=days)
+    people = generate_people(people_count, begin, seed)
+    rng = random.Random(seed + 1)
+    span_minutes = days * 24 * 60
+    moments = [begin + timedelta(minutes=rng.randrange(span_minutes)) for _ in range(queries)]
+    # 逐个查询谁在班时每次返回上千人，只取一部分时刻
+    point_moments = moments[: max(1, queries // 10)]
+
+    results = []
+    index = _timed(results, "建立索引", CoverageIndex, people, begin, end)
+    print(f"{people_count} 人，{days} 天，{index.shift_count} 个班次")
+    on_duty = _timed(
+        results,
+        f"逐个查询谁在班 x{len(point_moments)}",
+        lambda: [index.on_duty(moment) for moment in point_moments],
+    )
+    print(f"平均在班 {sum(map(len, on_duty)) / len(on_duty):.1f} 人")
+    _timed(results, f"批量查询在班人数 x{queries}", index.counts_at, moments)
+    month_gaps = _timed(
+        results, "一个月的人手不足时间段", index.gaps, min_staff, begin, begin + timedelta(days=30)
+    )
+    all_gaps = _timed(results, "全部范围的人手不足时间段", index.gaps, min_staff)
+    print(f"少于 {min_staff} 人：一个月 {len(month_gaps)} 段，全部范围 {len(all_gaps)} 段")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="多人排班覆盖索引的性能基准")
+    parser.add_argument("--people", type=int, default=5000, help="人数")
+    parser.add_argument("--days", type=int, default=365, help="规划范围（天）")
+    parser.add_argument("--queries", type=int, default=10000, help="查询的时刻数")
+    parser.add_argument(
+        "--min-staff",
+        type=int,
+        default=None,
+        help="人手不足的阈值，默认为人数的三分之一（接近平均在班人数）",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=DEFAULT_BUDGET,
+        help="建立索引与一个月的人手不足查询的总耗时预算（秒）",
+    )
+    args = parser.parse_args()
+
+    if roster.np is None:
+        print("未安装 NumPy，使用纯 Python 实现，耗时会明显增加")
+    min_staff = args.min_staff if args.min_staff is not None else args.people // 3
+    results = run_benchmark(args.people, args.days, args.queries, min_staff, args.seed)
+    for label, seconds in results:
+        print(f"{label:<24} {seconds * 1000:10.1f} ms")
+
+    timings = dict(results)
+    total = timings["建立索引"] + timings["一个月的人手不足时间段"]
+    print(f"建立索引 + 一个月的人手不足查询: {total:.3f}s（预算 {args.budget:.3f}s）")
+    if total > args.budget:
+        sys.exit(1)
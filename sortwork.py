@@ -1,51 +1,240 @@
-from datetime import datetime, timedelta
+"""
+轮班计算：按固定的上班/休息周期推算上下班时间。
+班次按周期取模直接计算，第 N 个班次、某一时刻所在的班次都是 O(1)；班次序列按需逐个生成，
+可以推算任意多年，并以 CSV 或 iCal 格式流式写出，不需要把所有班次放在内存里。
+安装了 NumPy 时可以对大量时刻（datetime64 数组）向量化判断是否在班。
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, NamedTuple, TextIO
 
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
 
-def calculate_schedule(start_time, work_hours=12, rest_hours=24):
+# 输入输出使用的时间格式
+TIME_FORMAT = "%Y-%m-%d %H:%M"
+# iCal 中的本地时间格式（不带时区）
+_ICAL_TIME_FORMAT = "%Y%m%dT%H%M%S"
+
+
+class Shift(NamedTuple):
+    index: int  # 班次序号，0 为起始下班时间之后的第一个班次，之前的班次为负数
+    start: datetime  # 上班时间
+    end: datetime  # 下班时间
+
+
+def parse_time(value) -> datetime:
+    """
+    把 "YYYY-MM-DD HH:MM" 格式的字符串转换为 datetime，datetime 原样返回。
+    """
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, TIME_FORMAT)
+
+
+class ShiftSchedule:
+    """
+    固定周期的轮班：从某次下班开始，休息 rest_hours 小时后上班 work_hours 小时，如此循环。
+    周期向前后无限延伸，所有查询都按周期取模直接计算。
+    """
+
+    def __init__(self, start_time, work_hours: float = 12, rest_hours: float = 24):
+        """
+        :param start_time: 当前下班时间（字符串，格式为 "YYYY-MM-DD HH:MM"，或 datetime）
+        :param work_hours: 上班时长（小时）
+        :param rest_hours: 休息时长（小时）
+        """
+        self.work = timedelta(hours=work_hours)
+        self.rest = timedelta(hours=rest_hours)
+        self.period = self.work + self.rest
+        if self.work <= timedelta(0) or self.rest < timedelta(0):
+            raise ValueError("上班时长必须大于 0，休息时长不能小于 0")
+        # 第 0 个班次的上班时间，所有班次都由它加整数个周期得到
+        self.anchor = parse_time(start_time) + self.rest
+
+    def shift(self, index: int) -> Shift:
+        """
+        第 index 个班次。
+        """
+        start = self.anchor + index * self.period
+        return Shift(index, start, start + self.work)
+
+    def index_at(self, moment) -> int:
+        """
+        时刻所在周期的班次序号：该班次的上班时间不晚于 moment，下一个班次的上班时间晚于 moment。
+        """
+        return (parse_time(moment) - self.anchor) // self.period
+
+    def shift_at(self, moment) -> Shift | None:
+        """
+        覆盖该时刻的班次（上班时间 <= moment < 下班时间），休息时间内返回 None。
+        """
+        shift = self.shift(self.index_at(moment))
+        return shift if parse_time(moment) < shift.end else None
+
+    def is_on(self, moment) -> bool:
+        """
+        该时刻是否在班。
+        """
+        return (parse_time(moment) - self.anchor) % self.period < self.work
+
+    def shifts(self, first: int = 0) -> Iterator[Shift]:
+        """
+        从第 first 个班次开始无限地逐个生成班次，由调用方决定何时停止。
+        """
+        index = first
+        while True:
+            yield self.shift(index)
+            index += 1
+
+    def shifts_between(self, begin, end) -> Iterator[Shift]:
+        """
+        逐个生成与 [begin, end) 有重叠的班次。
+        """
+        begin, end = parse_time(begin), parse_time(end)
+        index = self.index_at(begin)
+        if self.shift(index).end <= begin:
+            index += 1
+        for shift in self.shifts(index):
+            if shift.start >= end:
+                break
+            yield shift
+
+    def on_duty(self, moments):
+        """
+        批量判断一组时刻是否在班。
+        :param moments: 时刻序列；安装了 NumPy 时可以直接传入 datetime64 数组
+        :return: 安装了 NumPy 时为布尔数组，否则为布尔值列表
+        """
+        if np is None:
+            return [self.is_on(moment) for moment in moments]
+        offsets = np.asarray(moments, dtype="datetime64[us]") - np.datetime64(self.anchor, "us")
+        return offsets % np.timedelta64(self.period) < np.timedelta64(self.work)
+
+    def indices_at(self, moments):
+        """
+        批量计算一组时刻所在周期的班次序号，含义同 index_at。
+        :return: 安装了 NumPy 时为整数数组，否则为整数列表
+        """
+        if np is None:
+            return [self.index_at(moment) for moment in moments]
+        offsets = np.asarray(moments, dtype="datetime64[us]") - np.datetime64(self.anchor, "us")
+        return offsets // np.timedelta64(self.period)
+
+
+def calculate_schedule(start_time, work_hours=12, rest_hours=24, count=5):
     """
     计算未来的上下班时间
     :param start_time: 当前下班时间（字符串，格式为 "YYYY-MM-DD HH:MM"）
     :param work_hours: 上班时长（小时）
     :param rest_hours: 休息时长（小时）
+    :param count: 计算的班次数
     :return: 返回一个列表，包含未来的上下班时间
     """
-    # 将输入的时间字符串转换为 datetime 对象
-    current_time = datetime.strptime(start_time, "%Y-%m-%d %H:%M")
+    schedule = ShiftSchedule(start_time, work_hours, rest_hours)
+    return [
+        {
+            "班次": shift.index + 1,
+            "上班时间": shift.start.strftime(TIME_FORMAT),
+            "下班时间": shift.end.strftime(TIME_FORMAT),
+        }
+        for shift in islice(schedule.shifts(), count)
+    ]
 
-    # 初始化结果列表
-    schedule = []
 
-    # 计算未来 5 个班次（可以根据需要调整）
-    for i in range(5):
-        # 当前班次的下班时间
-        off_time = current_time
-        # 当前班次的上班时间
-        on_time = off_time + timedelta(hours=rest_hours)
-        # 下一个班次的下班时间
-        next_off_time = on_time + timedelta(hours=work_hours)
+def write_csv(shifts: Iterable[Shift], file: TextIO) -> int:
+    """
+    以 CSV 格式逐行写出班次。
+    :return: 写出的班次数
+    """
+    writer = csv.writer(file)
+    writer.writerow(["班次", "上班时间", "下班时间"])
+    written = 0
+    for shift in shifts:
+        writer.writerow(
+            [shift.index + 1, shift.start.strftime(TIME_FORMAT), shift.end.strftime(TIME_FORMAT)]
+        )
+        written += 1
+    return written
 
-        # 将时间添加到结果列表
-        schedule.append({
-            "班次": i + 1,
-            "上班时间": on_time.strftime("%Y-%m-%d %H:%M"),
-            "下班时间": next_off_time.strftime("%Y-%m-%d %H:%M")
-        })
 
-        # 更新当前时间为下一个班次的下班时间
-        current_time = next_off_time
+def write_ical(shifts: Iterable[Shift], file: TextIO, summary: str = "上班") -> int:
+    """
+    以 iCalendar 格式逐个写出班次事件，时间为不带时区的本地时间。
+    :param summary: 事件标题
+    :return: 写出的班次数
+    """
+    stamp = datetime.now(timezone.utc).strftime(_ICAL_TIME_FORMAT) + "Z"
+    file.write("BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//ITools//sortwork//ZH\r\n")
+    written = 0
+    for shift in shifts:
+        start = shift.start.strftime(_ICAL_TIME_FORMAT)
+        file.write(
+            "BEGIN:VEVENT\r\n"
+            f"UID:shift-{start}-{shift.index}@itools\r\n"
+            f"DTSTAMP:{stamp}\r\n"
+            f"DTSTART:{start}\r\n"
+            f"DTEND:{shift.end.strftime(_ICAL_TIME_FORMAT)}\r\n"
+            f"SUMMARY:{summary}\r\n"
+            "END:VEVENT\r\n"
+        )
+        written += 1
+    file.write("END:VCALENDAR\r\n")
+    return written
 
-    return schedule
 
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="按上班/休息周期推算上下班时间")
+    parser.add_argument(
+        "--start", default="2025-10-04 8:00", help="当前下班时间，格式为 YYYY-MM-DD HH:MM"
+    )
+    parser.add_argument("--work-hours", type=float, default=12, help="上班时长（小时）")
+    parser.add_argument("--rest-hours", type=float, default=24, help="休息时长（小时）")
+    parser.add_argument("--count", type=int, default=5, help="输出的班次数")
+    parser.add_argument(
+        "--until", default=None, help="输出到该时间为止的所有班次（代替 --count），格式同 --start"
+    )
+    parser.add_argument(
+        "--format", choices=("text", "csv", "ical"), default="text", help="输出格式"
+    )
+    parser.add_argument("--output", default=None, help="输出文件，默认输出到标准输出")
+    parser.add_argument("--at", default=None, help="只查询该时刻是否在班，格式同 --start")
+    args = parser.parse_args()
 
-# 输入今天的下班时间
-start_time = "2025-10-04 8:00"  # 今天是六点下班
+    schedule = ShiftSchedule(args.start, args.work_hours, args.rest_hours)
+    if args.at:
+        shift = schedule.shift_at(args.at)
+        if shift is None:
+            following = schedule.shift(schedule.index_at(args.at) + 1)
+            print(f"{args.at} 不在班，下一个班次 {following.index + 1}: "
+                  f"{following.start:{TIME_FORMAT}} - {following.end:{TIME_FORMAT}}")
+        else:
+            print(f"{args.at} 在班，班次 {shift.index + 1}: "
+                  f"{shift.start:{TIME_FORMAT}} - {shift.end:{TIME_FORMAT}}")
+        sys.exit(0)
 
-# 计算未来的上下班时间
-schedule = calculate_schedule(start_time)
+    if args.until:
+        shifts = schedule.shifts_between(schedule.shift(0).start, args.until)
+    else:
+        shifts = islice(schedule.shifts(), args.count)
 
-# 打印结果
-print("未来的上下班时间：")
-for entry in schedule:
-    print(f"班次 {entry['班次']}:")
-    print(f"  上班时间: {entry['上班时间']}")
-    print(f"  下班时间: {entry['下班时间']}")
+    output = open(args.output, "w", encoding="utf-8", newline="") if args.output else sys.stdout
+    try:
+        if args.format == "csv":
+            write_csv(shifts, output)
+        elif args.format == "ical":
+            write_ical(shifts, output)
+        else:
+            print("未来的上下班时间：", file=output)
+            for shift in shifts:
+                print(f"班次 {shift.index + 1}:", file=output)
+                print(f"  上班时间: {shift.start:{TIME_FORMAT}}", file=output)
+                print(f"  下班时间: {shift.end:{TIME_FORMAT}}", file=output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
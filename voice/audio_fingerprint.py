@@ -0,0 +1,184 @@
+"""
+音频指纹：用于在耗时的提取/分割/音质提升之前找出内容相同的输入（同一录音的不同文件名、不同容器或重新编码的副本）。
+- FFmpeg 把音频解码为 8kHz 单声道 16bit PCM，通过管道流式读取，内存占用与文件大小无关
+- 每 0.25 秒一个块计算能量，相邻块能量的升降记为一位，得到一个位串；重新编码或换容器后位串基本不变
+- 两个指纹时长相近、位串的汉明距离（允许前后错开两个块）低于阈值即视为重复
+安装了 NumPy 时按块向量化计算能量，否则使用纯 Python 实现（结果相同，速度较慢）。
+"""
+import subprocess
+import sys
+from array import array
+from operator import mul
+from typing import NamedTuple
+
+from loguru import logger
+
+from ffmpeg_runner import StderrTail
+from ffmpeg_utils import current_ffmpeg_slots, ffmpeg_path
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+# 解码采样率和每块的采样数（0.25 秒）
+FINGERPRINT_SAMPLE_RATE = 8000
+BLOCK_SAMPLES = 2000
+# 位串不同的比例低于该值视为同一录音
+MAX_DISTANCE_RATIO = 0.1
+# 允许的时长差：块数相差不超过 1% 加 4 块（约 1 秒）
+BLOCK_COUNT_TOLERANCE = 0.01
+BLOCK_COUNT_SLACK = 4
+# 比较时尝试的最大错位块数（容器或编码器延迟造成的起点差异）
+MAX_SHIFT_BLOCKS = 2
+# 少于该块数（约 10 秒）或能量几乎不变（近乎静音）的音频信息量不足，不参与去重
+MIN_BLOCKS = 40
+MIN_SET_RATIO = 0.05
+
+_READ_SIZE = 1 << 16
+_BLOCK_BYTES = BLOCK_SAMPLES * 2
+
+
+class Fingerprint(NamedTuple):
+    blocks: int  # 能量块数，即位串长度加一
+    bits: int  # 第 i 位为 1 表示第 i+1 块的能量高于第 i 块
+
+    @property
+    def duration(self) -> float:
+        """
+        指纹覆盖的时长（秒）。
+        """
+        return self.blocks * BLOCK_SAMPLES / FINGERPRINT_SAMPLE_RATE
+
+    @property
+    def informative(self) -> bool:
+        """
+        是否有足够的信息用于去重：足够长，且不是静音或恒定的信号。
+        """
+        nbits = self.blocks - 1
+        return self.blocks >= MIN_BLOCKS and self.bits.bit_count() >= nbits * MIN_SET_RATIO
+
+    def to_bytes(self) -> bytes:
+        return self.bits.to_bytes((max(self.blocks - 1, 0) + 7) // 8, "little")
+
+    @classmethod
+    def from_bytes(cls, blocks: int, data: bytes) -> "Fingerprint":
+        return cls(blocks, int.from_bytes(data, "little"))
+
+
+def _block_energies(data: bytes) -> list:
+    """
+    计算若干完整块（s16le）的平均能量。
+    """
+    if np is not None:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float64)
+        return np.square(samples).reshape(-1, BLOCK_SAMPLES).mean(axis=1).tolist()
+    samples = array("h", data)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return [
+        sum(map(mul, block, block)) / BLOCK_SAMPLES
+        for block in (
+            samples[offset : offset + BLOCK_SAMPLES]
+            for offset in range(0, len(samples), BLOCK_SAMPLES)
+        )
+    ]
+
+
+def _energy_bits(energies: list) -> int:
+    """
+    相邻块能量的升降位串。
+    """
+    bits = 0
+    for index in range(len(energies) - 1):
+        if energies[index + 1] > energies[index]:
+            bits |= 1 << index
+    return bits
+
+
+def compute_fingerprint(input_path: str) -> Fingerprint | None:
+    """
+    解码输入的第一条音轨并计算指纹，占用一个全局 FFmpeg 名额。
+    :param input_path: 音频或视频文件路径
+    :return: Fingerprint，没有音轨或解码失败时返回 None
+    """
+    command = [
+        ffmpeg_path(),
+        "-nostdin",
+        "-v",
+        "error",
+        "-i",
+        input_path,
+        "-map",
+        "0:a:0",
+        "-ac",
+        "1",
+        "-ar",
+        str(FINGERPRINT_SAMPLE_RATE),
+        "-f",
+        "s16le",
+        "pipe:1",
+    ]
+    energies = []
+    pending = b""
+    with current_ffmpeg_slots():
+        process = subprocess.Popen(
+            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, stdin=subprocess.DEVNULL
+        )
+        stderr_tail = StderrTail(process.stderr)
+        try:
+            # 只保留不足一块的余数，内存占用固定
+            for chunk in iter(lambda: process.stdout.read(_READ_SIZE), b""):
+                pending += chunk
+                usable = len(pending) - len(pending) % _BLOCK_BYTES
+                if usable:
+                    energies.extend(_block_energies(pending[:usable]))
+                    pending = pending[usable:]
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            stderr = stderr_tail.text()
+            process.stderr.close()
+    if returncode != 0:
+        logger.warning(
+            f"计算音频指纹失败: {input_path}，错误信息: {stderr.strip()}"
+        )
+        return None
+    return Fingerprint(len(energies), _energy_bits(energies))
+
+
+def distance_ratio(a: Fingerprint, b: Fingerprint) -> float:
+    """
+    两个指纹位串不同的比例，在 ±MAX_SHIFT_BLOCKS 的错位中取最小值；时长相差过大时返回 1.0。
+    """
+    tolerance = max(a.blocks, b.blocks) * BLOCK_COUNT_TOLERANCE + BLOCK_COUNT_SLACK
+    if abs(a.blocks - b.blocks) > tolerance:
+        return 1.0
+    best = 1.0
+    for shift in range(-MAX_SHIFT_BLOCKS, MAX_SHIFT_BLOCKS + 1):
+        bits_a, bits_b = a.bits, b.bits
+        if shift > 0:
+            bits_a >>= shift  # a 开头比 b 多出 shift 块
+        elif shift < 0:
+            bits_b >>= -shift
+        length = min(a.blocks - 1 - max(shift, 0), b.blocks - 1 - max(-shift, 0))
+        if length <= 0:
+            continue
+        mask = (1 << length) - 1
+        best = min(best, ((bits_a ^ bits_b) & mask).bit_count() / length)
+    return best
+
+
+def candidate_range(fingerprint: Fingerprint) -> tuple:
+    """
+    可能与该指纹重复的块数范围，用于在索引中筛选候选。
+    """
+    tolerance = int(fingerprint.blocks * BLOCK_COUNT_TOLERANCE) + BLOCK_COUNT_SLACK
+    return fingerprint.blocks - tolerance, fingerprint.blocks + tolerance
+
+
+def is_duplicate(a: Fingerprint, b: Fingerprint) -> bool:
+    """
+    两个指纹是否来自同一段录音。
+    """
+    return a.informative and b.informative and distance_ratio(a, b) < MAX_DISTANCE_RATIO
@@ -0,0 +1,319 @@
+"""
+voice/ 工具的性能基准：离线生成确定性的测试输入（FFmpeg lavfi 正弦波 + 噪声，封装为 mp4/mkv/mp3/flac/wav），
+以不同的工作者数量运行各个入口（to_hires、to_mp3、视频流水线），统计吞吐、峰值内存和写入磁盘的字节数。
+结果可以保存为基线，之后的运行与基线比较，超过阈值的退化会被标记出来并以非零状态退出。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from loguru import logger
+
+from ffmpeg_utils import ffmpeg_path
+from metrics import REPORT_FILENAME
+
+# 生成输入的默认时长（秒）
+DEFAULT_DURATIONS = (30, 150, 600)
+
+# 默认测试的工作者数量
+DEFAULT_WORKERS = (1, 2, 4)
+
+# 吞吐下降或内存、磁盘增长超过该比例视为退化
+DEFAULT_THRESHOLD = 0.10
+
+DEFAULT_BASELINE_PATH = "benchmark_baseline.json"
+
+_SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每种容器的编码参数，全部使用 FFmpeg 内置编码器（mp3 除外）；先写入临时文件，所以显式指定封装格式
+_CONTAINER_ARGS = {
+    "mp4": ["-c:v", "mpeg4", "-c:a", "aac", "-b:a", "192k", "-f", "mp4"],
+    "mkv": ["-c:v", "mpeg4", "-c:a", "flac", "-f", "matroska"],
+    "mp3": ["-c:a", "mp3", "-b:a", "192k", "-f", "mp3"],
+    "flac": ["-c:a", "flac", "-f", "flac"],
+    "wav": ["-c:a", "pcm_s16le", "-f", "wav"],
+}
+_VIDEO_CONTAINERS = ("mp4", "mkv")
+
+# 各入口使用的输入格式：音频工具只扫描 .mp3/.wav
+ENTRY_POINTS = {
+    "to_hires": ("to_hires.py", ("mp3", "wav")),
+    "to_mp3": ("to_mp3.py", ("mp3", "wav")),
+    "video": ("convert_video_to_hires_audio.py", ("mp4", "mkv", "mp3", "flac")),
+}
+
+
+def generate_input(path: str, container: str, duration: int) -> None:
+    """
+    用 lavfi 合成一个确定性的测试文件：440Hz 正弦波叠加固定种子的粉红噪声，视频容器附带极小的测试画面。
+    :param path: 输出路径
+    :param container: 容器格式，见 _CONTAINER_ARGS
+    :param duration: 时长（秒）
+    """
+    command = [
+        ffmpeg_path(),
+        "-nostdin",
+        "-v",
+        "error",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-f",
+        "lavfi",
+        "-i",
+        f"anoisesrc=color=pink:seed=42:amplitude=0.1:sample_rate=48000:duration={duration}",
+    ]
+    if container in _VIDEO_CONTAINERS:
+        command += ["-f", "lavfi", "-i", f"testsrc=size=64x48:rate=1:duration={duration}"]
+    command += [
+        "-filter_complex",
+        "[0:a][1:a]amix=inputs=2,aformat=channel_layouts=stereo[a]",
+        "-map",
+        "[a]",
+    ]
+    if container in _VIDEO_CONTAINERS:
+        command += ["-map", "2:v"]
+    # 去掉随 FFmpeg 版本变化的元数据，保证同一版本多次生成的文件完全一致
+    command += [
+        "-map_metadata",
+        "-1",
+        "-fflags",
+        "+bitexact",
+        "-flags:a",
+        "+bitexact",
+        *_CONTAINER_ARGS[container],
+        path,
+    ]
+    subprocess.run(command, check=True)
+
+
+def prepare_inputs(work_dir: str, durations) -> dict:
+    """
+    为每个入口准备输入目录，已生成的文件直接复用（多次运行之间只需生成一次）。
+    :return: {入口名称: (输入目录, 音频总时长秒数, 输入总字节数)}
+    """
+    media_dir = os.path.join(work_dir, "media")
+    os.makedirs(media_dir, exist_ok=True)
+    inputs = {}
+    for entry, (_, containers) in ENTRY_POINTS.items():
+        input_dir = os.path.join(work_dir, "inputs", entry)
+        os.makedirs(input_dir, exist_ok=True)
+        audio_seconds = input_bytes = 0
+        for duration in durations:
+            for container in containers:
+                filename = f"bench_{duration}s.{container}"
+                media_path = os.path.join(media_dir, filename)
+                if not os.path.exists(media_path):
+                    logger.info(f"生成测试输入: {media_path}")
+                    generate_input(media_path + ".tmp", container, duration)
+                    os.replace(media_path + ".tmp", media_path)
+                link_path = os.path.join(input_dir, filename)
+                if not os.path.exists(link_path):
+                    os.link(media_path, link_path)
+                audio_seconds += duration
+                input_bytes += os.path.getsize(media_path)
+        inputs[entry] = (input_dir, audio_seconds, input_bytes)
+    return inputs
+
+
+def _tree_bytes(path: str) -> int:
+    """
+    统计目录下所有文件的总字节数。
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for filename in files:
+            total += os.path.getsize(os.path.join(root, filename))
+    return total
+
+
+def run_once(entry: str, input_dir: str, output_dir: str, workers: int) -> dict:
+    """
+    在子进程中运行一次入口脚本（关闭缓存，使用全新的输出目录）。
+    峰值内存取 wait4 返回的 ru_maxrss，包含脚本启动的所有 FFmpeg 子进程中最大的一个。
+    :return: 本次运行的 wall_seconds、peak_rss_bytes、disk_bytes 和各阶段统计
+    """
+    script = os.path.join(_SCRIPT_DIR, ENTRY_POINTS[entry][0])
+    metrics_dir = output_dir + "_metrics"
+    command = [
+        sys.executable,
+        script,
+        "--input",
+        input_dir,
+        "--output",
+        output_dir,
+        "--workers",
+        str(workers),
+        "--no-cache",
+        "--metrics-dir",
+        metrics_dir,
+    ]
+    if entry == "video":
+        command += ["--max-ffmpeg", str(workers)]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=_SCRIPT_DIR
+    )
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"{entry} 运行失败，退出码 {process.returncode}")
+
+    with open(os.path.join(metrics_dir, REPORT_FILENAME), encoding="utf-8") as f:
+        stages = json.load(f)["stages"]
+    return {
+        "wall_seconds": wall,
+        "peak_rss_bytes": usage.ru_maxrss * 1024,  # Linux 上 ru_maxrss 的单位是 KB
+        "disk_bytes": _tree_bytes(output_dir),
+        "stages": stages,
+    }
+
+
+def run_benchmarks(
+    work_dir: str, durations, workers_list, repeat: int = 1, entries=None
+) -> dict:
+    """
+    运行所有入口和工作者数量的组合，重复多次时取墙钟时间的中位数。
+    :return: {"entry/workers=N": 结果}
+    """
+    inputs = prepare_inputs(work_dir, durations)
+    cache_dir = tempfile.mkdtemp(prefix="itools-bench-cache-")
+    os.environ["ITOOLS_CACHE_DIR"] = cache_dir  # 不污染用户的转换缓存
+    results = {}
+    try:
+        for entry in entries or ENTRY_POINTS:
+            input_dir, audio_seconds, input_bytes = inputs[entry]
+            for workers in workers_list:
+                runs = []
+                for index in range(repeat):
+                    output_dir = os.path.join(work_dir, "outputs", f"{entry}_{workers}_{index}")
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                    shutil.rmtree(output_dir + "_metrics", ignore_errors=True)
+                    runs.append(run_once(entry, input_dir, output_dir, workers))
+                    shutil.rmtree(output_dir, ignore_errors=True)
+                wall = statistics.median(run["wall_seconds"] for run in runs)
+                name = f"{entry}/workers={workers}"
+                results[name] = {
+                    "entry": entry,
+                    "workers": workers,
+                    "wall_seconds": wall,
+                    "audio_seconds_per_second": audio_seconds / wall,
+                    "input_mb_per_second": input_bytes / wall / (1 << 20),
+                    "peak_rss_bytes": max(run["peak_rss_bytes"] for run in runs),
+                    "disk_bytes": max(run["disk_bytes"] for run in runs),
+                    "stages": runs[-1]["stages"],
+                }
+                logger.info(
+                    f"{name}: {wall:.2f}s，{audio_seconds / wall:.1f}x 实时，"
+                    f"峰值内存 {results[name]['peak_rss_bytes'] / (1 << 20):.1f} MB，"
+                    f"写入 {results[name]['disk_bytes'] / (1 << 20):.1f} MB"
+                )
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return results
+
+
+def compare_with_baseline(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    与基线比较：吞吐下降、峰值内存或磁盘写入增长超过阈值时视为退化。
+    :return: 退化描述列表
+    """
+    regressions = []
+    checks = (
+        ("audio_seconds_per_second", -1, "吞吐"),
+        ("peak_rss_bytes", 1, "峰值内存"),
+        ("disk_bytes", 1, "磁盘写入"),
+    )
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key, direction, label in checks:
+            if not base[key]:
+                continue
+            change = (result[key] - base[key]) / base[key]
+            if change * direction > threshold:
+                regressions.append(
+                    f"{name} {label}: {base[key]:.4g} -> {result[key]:.4g} ({change:+.1%})"
+                )
+    return regressions
+
+
+def _parse_int_list(value: str) -> list:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="voice 工具性能基准")
+    parser.add_argument(
+        "--work-dir",
+        default=os.path.join(tempfile.gettempdir(), "itools-bench"),
+        help="测试输入与输出的工作目录，生成的输入会被复用",
+    )
+    parser.add_argument(
+        "--durations",
+        type=_parse_int_list,
+        default=list(DEFAULT_DURATIONS),
+        help="测试输入的时长（秒），逗号分隔",
+    )
+    parser.add_argument(
+        "--workers",
+        type=_parse_int_list,
+        default=list(DEFAULT_WORKERS),
+        help="测试的工作者数量，逗号分隔",
+    )
+    parser.add_argument(
+        "--entries",
+        nargs="+",
+        choices=tuple(ENTRY_POINTS),
+        default=None,
+        help="只测试指定的入口",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="每个组合的重复次数")
+    parser.add_argument("--output", default=None, help="将本次结果保存为 JSON")
+    parser.add_argument(
+        "--baseline", default=DEFAULT_BASELINE_PATH, help="基线结果文件"
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="将本次结果保存为新的基线"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="退化阈值（比例），如 0.1 表示 10%%",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        args.work_dir, args.durations, args.workers, args.repeat, args.entries
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        logger.info(f"基线已保存至: {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.threshold)
+        if regressions:
+            for regression in regressions:
+                logger.error(f"性能退化: {regression}")
+            sys.exit(1)
+        logger.info(f"与基线相比没有超过 {args.threshold:.0%} 的退化")
+    else:
+        logger.warning(f"基线文件不存在: {args.baseline}，使用 --save-baseline 创建")
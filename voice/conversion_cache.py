@@ -0,0 +1,257 @@
+"""
+基于内容哈希的转换缓存：以输入文件内容（size+mtime 快速路径）和 FFmpeg 参数作为键，
+记录上一次转换得到的产物。再次运行时命中缓存即可跳过转换，或将已有产物硬链接到新的输出位置。
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+# 默认缓存位置，可通过环境变量 ITOOLS_CACHE_DIR 修改
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ITOOLS_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "itools")
+)
+DEFAULT_CACHE_PATH = os.path.join(DEFAULT_CACHE_DIR, "conversions.sqlite3")
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+class ConversionCache:
+    """
+    持久化的转换缓存，使用 SQLite 保存，可在线程间共享。
+    files 表记录每个输入文件的 (size, mtime_ns) -> sha256，artifacts 表记录缓存键 -> 产物列表，
+    probes 表记录每个输入文件的 ffprobe 结果（同样以 size、mtime_ns 判断是否过期），
+    fingerprints 表记录每个输入文件的音频指纹（块数 + 位串），按块数建索引以查找时长相近的候选。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "key TEXT PRIMARY KEY, outputs TEXT, created REAL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS probes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, info TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, blocks INTEGER, bits BLOB)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS fingerprints_blocks ON fingerprints (blocks)"
+            )
+
+    def file_digest(self, path: str) -> str:
+        """
+        计算文件内容的 sha256；大小与修改时间未变化时直接复用上次的结果。
+        :param path: 文件路径
+        :return: 十六进制摘要
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, digest FROM files WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        sha256 = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+        digest = sha256.hexdigest()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, digest),
+            )
+        return digest
+
+    def make_key(self, input_path: str, params) -> str:
+        """
+        根据输入内容和转换参数生成缓存键，参数任何变化都会得到不同的键。
+        :param input_path: 输入文件路径
+        :param params: 可 JSON 序列化的转换参数，如 FFmpeg 输出参数列表
+        """
+        payload = json.dumps([self.file_digest(input_path), params], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup_probe(self, path: str) -> dict | None:
+        """
+        查询文件的 ffprobe 结果，文件大小或修改时间变化时视为未命中。
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, info FROM probes WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return json.loads(row[2])
+        return None
+
+    def store_probe(self, path: str, info: dict) -> None:
+        """
+        记录文件的 ffprobe 结果。
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, json.dumps(info)),
+            )
+
+    def lookup_fingerprint(self, path: str) -> tuple | None:
+        """
+        查询文件的音频指纹，文件大小或修改时间变化时视为未命中。
+        :return: (块数, 位串字节)
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT size, mtime_ns, blocks, bits FROM fingerprints WHERE path = ?", (path,)
+            ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2], row[3]
+        return None
+
+    def store_fingerprint(self, path: str, blocks: int, bits: bytes) -> None:
+        """
+        记录文件的音频指纹。
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?, ?, ?)",
+                (path, stat.st_size, stat.st_mtime_ns, blocks, bits),
+            )
+
+    def fingerprint_candidates(self, min_blocks: int, max_blocks: int) -> list:
+        """
+        块数在 [min_blocks, max_blocks] 之间、且文件未变化的指纹。
+        :return: (路径, 块数, 位串字节) 列表
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT path, size, mtime_ns, blocks, bits FROM fingerprints"
+                " WHERE blocks BETWEEN ? AND ?",
+                (min_blocks, max_blocks),
+            ).fetchall()
+        candidates = []
+        for path, size, mtime_ns, blocks, bits in rows:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_size == size and stat.st_mtime_ns == mtime_ns:
+                candidates.append((path, blocks, bits))
+        return candidates
+
+    def lookup(self, key: str) -> list | None:
+        """
+        查询缓存的产物列表，任意产物丢失时视为未命中并删除该条目。
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT outputs FROM artifacts WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        outputs = json.loads(row[0])
+        if all(os.path.isfile(path) for path in outputs):
+            return outputs
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM artifacts WHERE key = ?", (key,))
+        return None
+
+    def store(self, key: str, outputs: list) -> None:
+        """
+        记录一次成功转换的产物。
+        """
+        outputs = [os.path.abspath(path) for path in outputs]
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?)",
+                (key, json.dumps(outputs, ensure_ascii=False), time.time()),
+            )
+
+    def restore(self, key: str, output_path: str) -> bool:
+        """
+        命中缓存时让 output_path 指向缓存的产物：已经是同一个文件则直接跳过，否则硬链接（跨设备时复制）。
+        :param key: 缓存键
+        :param output_path: 期望的输出路径
+        :return: True 表示命中缓存，无需再转换
+        """
+        outputs = self.lookup(key)
+        if not outputs:
+            return False
+        _link_artifact(outputs[0], output_path)
+        return True
+
+    def restore_into(self, key: str, output_dir: str) -> list | None:
+        """
+        多产物版本的 restore：将缓存的所有产物按原文件名放入 output_dir。
+        :return: 输出目录中的产物路径列表，未命中时返回 None
+        """
+        outputs = self.lookup(key)
+        if not outputs:
+            return None
+        return link_outputs(outputs, output_dir)
+
+
+def link_outputs(outputs: list, output_dir: str) -> list:
+    """
+    将一组已有产物按原文件名硬链接（跨设备时复制）到 output_dir。
+    :return: 输出目录中的产物路径列表
+    """
+    linked = []
+    for artifact in outputs:
+        output_path = os.path.join(output_dir, os.path.basename(artifact))
+        _link_artifact(artifact, output_path)
+        linked.append(output_path)
+    return linked
+
+
+def _link_artifact(artifact: str, output_path: str) -> None:
+    """
+    让 output_path 与缓存产物指向同一份数据，已经是同一个文件时不做任何操作。
+    """
+    if os.path.exists(output_path) and os.path.samefile(artifact, output_path):
+        return
+    temp_path = f"{output_path}.cache-link"
+    try:
+        os.link(artifact, temp_path)
+    except OSError:
+        shutil.copy2(artifact, temp_path)
+    os.replace(temp_path, output_path)
+
+
+def open_cache(db_path: str = DEFAULT_CACHE_PATH) -> ConversionCache:
+    """
+    获取当前进程内共享的缓存实例（进程池中的每个子进程各自打开连接）。
+    """
+    key = (os.getpid(), os.path.abspath(db_path))
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = ConversionCache(db_path)
+        return _caches[key]
@@ -1,282 +1,866 @@
+import argparse
 import os
-import random
+import queue
 import subprocess
-import sys
-import platform
+import threading
+import time
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from loguru import logger
-from pydub import AudioSegment
 
-from ToHiRes import (
+from audio_fingerprint import (
+    Fingerprint,
+    candidate_range,
+    compute_fingerprint,
+    is_duplicate,
+)
+from conversion_cache import DEFAULT_CACHE_PATH, link_outputs, open_cache
+from ffmpeg_runner import run_ffmpeg
+from ffmpeg_utils import (
+    DEFAULT_FFMPEG_LIMIT,
+    ensure_ffmpeg,
+    ffmpeg_path,
+    init_ffmpeg_slots,
+    set_ffmpeg_limit,
+)
+from job_journal import (
+    JOURNAL_FILENAME,
+    commit_partial,
+    discard_partial,
+    open_journal,
+    partial_path,
+    partial_suffix,
+    unit_id,
+)
+from media_scanner import ScannedFile, add_scan_arguments, iter_media_files
+from metrics import add_records, drain_records, export_report, measure
+from to_hires import (
+    HIRES_OUTPUT_ARGS,
+    convert_segment,
     process_directory as enhance_audio_quality,
 )  # 导入hires模块的音质提升方法
+from segment_names import UniqueNames, unique_names
+from segmenter import (
+    COPY_SEGMENT_FORMATS,
+    MAX_SEGMENT_MS,
+    MIN_SEGMENT_MS,
+    copy_segment_audio,
+    iter_cut_audio,
+    plan_segment_times,
+    probe_duration_ms,
+    segment_muxer_args,
+)
 
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv")
+AUDIO_EXTENSIONS = (".wav", ".mp3", ".flac", ".aac")
 
-def check_ffmpeg_installed() -> bool:
+# 单遍模式下 FFmpeg segment 复用器输出的临时文件名，全部完成后再重命名为随机中文名
+FUSED_SEGMENT_PATTERN = "fused_%04d.wav"
+
+
+def extract_audio_from_video(video_path: str, output_dir: str) -> str | None:
+    """
+    从视频文件提取音频并保存为 WAV 格式。
+    :param video_path: 输入视频文件的路径
+    :param output_dir: 提取的音频存放目录
+    :return: 提取的音频文件路径
+    """
+    audio_output_path = os.path.join(
+        output_dir, f"{os.path.splitext(os.path.basename(video_path))[0]}.wav"
+    )
+    command = [
+        ffmpeg_path(),
+        "-nostdin",
+        "-i",
+        video_path,
+        "-q:a",
+        "0",
+        "-map",
+        "a",
+        "-f",
+        "wav",
+        partial_path(audio_output_path),  # 先写入 .part 临时文件
+        "-y",
+    ]
+    with measure("extract_audio", video_path) as stage:
+        result = run_ffmpeg(command)
+        if not result.ok:
+            stage.fail()
+            discard_partial(audio_output_path)
+            logger.error(
+                f"提取音频失败: {video_path}，错误信息: {result.error}\n{result.stderr}"
+            )
+            return None
+        commit_partial(audio_output_path)
+        stage.outputs.append(audio_output_path)
+    logger.info(f"提取音频完成: {audio_output_path}")
+    return audio_output_path
+
+
+def cut_audio(audio_path: str, output_dir: str, silence_cuts: bool = False) -> list:
+    """
+    将音频文件流式分割成多个随机时长的片段，并返回所有片段的路径列表。
+    按块读取 PCM 数据（WAV 输入使用 mmap），每个片段的帧到齐后立即写出，内存占用不随输入时长增长。
+    :param audio_path: 输入音频文件的路径
+    :param output_dir: 分割后音频片段的存放目录
+    :param silence_cuts: 在 70-75 秒的窗口内选择最安静的位置切分，而不是随机时长
+    :return: 包含所有音频片段路径的列表
+    """
+    audio_segment_paths = []
+    with measure("cut_audio", audio_path) as stage:
+        try:
+            for audio_output_path in iter_cut_audio(
+                audio_path, output_dir, unique_names(output_dir), snap_to_silence=silence_cuts
+            ):
+                logger.info(f"剪切音频片段完成: {audio_output_path}")
+                audio_segment_paths.append(audio_output_path)
+        except Exception as e:
+            stage.fail()
+            logger.error(f"音频分割失败: {audio_path}，错误信息: {e}")
+            return []
+        stage.outputs.extend(audio_segment_paths)
+    return audio_segment_paths
+
+
+def copy_cut_audio(audio_path: str, output_dir: str) -> list:
     """
-    检测系统是否安装了 FFmpeg
-    :return: True 如果 FFmpeg 可用，否则 False
+    不解码，直接流复制切分已压缩的音频（mp3/aac/flac），片段保持原格式，
+    实际切分点记录在片段目录的 segments.json 中，解码只在音质提升阶段发生一次。
+    :param audio_path: 输入音频文件的路径
+    :param output_dir: 分割后音频片段的存放目录
+    :return: 包含所有音频片段路径的列表
     """
+    with measure("copy_cut_audio", audio_path) as stage:
+        try:
+            segment_paths = copy_segment_audio(
+                audio_path, output_dir, unique_names(output_dir)
+            )
+        except (RuntimeError, OSError, ValueError, subprocess.CalledProcessError) as e:
+            stage.fail()
+            logger.error(f"音频流复制分割失败: {audio_path}，错误信息: {e}")
+            return []
+        stage.outputs.extend(segment_paths)
+    for segment_path in segment_paths:
+        logger.info(f"流复制分割片段完成: {segment_path}")
+    return segment_paths
+
+
+def fused_extract_and_enhance(
+    input_path: str,
+    enhanced_audio_dir: str,
+    extracted_audio_dir: str | None = None,
+    audio_output_dir: str | None = None,
+) -> list:
+    """
+    单次 FFmpeg 调用完成提取、分割和音质提升：直接从输入解码一次，重采样为 96kHz/32bit 后交给 segment 复用器输出最终片段。
+    仅在传入中间目录时额外输出提取的原始音频和未提升的片段（同一次解码的多路输出）。
+    :param input_path: 输入视频或音频文件的路径
+    :param enhanced_audio_dir: 音质提升后片段的存放目录
+    :param extracted_audio_dir: 提取音频的存放目录，为 None 时不输出
+    :param audio_output_dir: 原始片段的存放目录，为 None 时不输出
+    :return: 音质提升后片段的路径列表
+    """
+    name = os.path.splitext(os.path.basename(input_path))[0]
     try:
-        result = subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=5,
+        duration_ms = probe_duration_ms(input_path)
+    except (subprocess.CalledProcessError, ValueError) as e:
+        logger.error(f"获取时长失败: {input_path}，错误信息: {e}")
+        return []
+    segment_times = plan_segment_times(duration_ms)
+    segment_pattern = FUSED_SEGMENT_PATTERN + partial_suffix()
+
+    command = [ffmpeg_path(), "-nostdin", "-v", "error", "-y", "-i", input_path]
+    if extracted_audio_dir:
+        extracted_path = os.path.join(extracted_audio_dir, f"{name}.wav")
+        command += ["-map", "0:a:0", "-q:a", "0", "-f", "wav"]
+        command += [partial_path(extracted_path)]
+    if audio_output_dir:
+        raw_pattern = os.path.join(audio_output_dir, segment_pattern)
+        # 临时文件名以 .part 结尾，FFmpeg 无法据此推断编码器，需要显式指定（与提取的音频相同）
+        command += ["-map", "0:a:0", "-acodec", "pcm_s16le"]
+        command += segment_muxer_args(segment_times, duration_ms, raw_pattern)
+    enhanced_pattern = os.path.join(enhanced_audio_dir, segment_pattern)
+    command += ["-map", "0:a:0", *HIRES_OUTPUT_ARGS]
+    command += segment_muxer_args(segment_times, duration_ms, enhanced_pattern)
+
+    with measure("fused_extract_and_enhance", input_path) as stage:
+        result = run_ffmpeg(command)
+        stage.audio_seconds = duration_ms / 1000
+        if not result.ok:
+            stage.fail()
+            logger.error(
+                f"单遍处理失败: {input_path}，错误信息: {result.error}\n{result.stderr}"
+            )
+            return []
+        stage.outputs.extend(
+            os.path.join(enhanced_audio_dir, segment_pattern % index)
+            for index in range(len(segment_times) + 1)
         )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+
+    if extracted_audio_dir:
+        commit_partial(extracted_path)
+
+    # 按顺序将临时片段重命名为随机中文名，原始片段与提升后的片段使用相同的名字
+    names = unique_names(enhanced_audio_dir, *filter(None, [audio_output_dir]))
+    enhanced_paths = []
+    for index in range(len(segment_times) + 1):
+        temp_filename = segment_pattern % index
+        temp_path = os.path.join(enhanced_audio_dir, temp_filename)
+        if not os.path.exists(temp_path):
+            break
+        segment_filename = f"{names()}.wav"
+        enhanced_path = os.path.join(enhanced_audio_dir, segment_filename)
+        os.replace(temp_path, enhanced_path)
+        if audio_output_dir and os.path.exists(
+            os.path.join(audio_output_dir, temp_filename)
+        ):
+            os.replace(
+                os.path.join(audio_output_dir, temp_filename),
+                os.path.join(audio_output_dir, segment_filename),
+            )
+        logger.info(f"单遍输出片段完成: {enhanced_path}")
+        enhanced_paths.append(enhanced_path)
+    return enhanced_paths
 
 
-def install_ffmpeg() -> bool:
+class _FileJob:
     """
-    根据操作系统自动安装 FFmpeg
-    :return: True 如果安装成功，否则 False
+    单个输入文件的处理上下文：各阶段的输出目录、任务日志、缓存键和上次运行的状态。
     """
-    system = platform.system().lower()
-    logger.info(f"检测到操作系统: {system}")
 
-    try:
-        if system == "linux":
-            # 检测 Linux 发行版
-            if os.path.exists("/etc/debian_version"):
-                logger.info("使用 apt 安装 FFmpeg...")
-                subprocess.run(["sudo", "apt-get", "update"], check=True)
-                subprocess.run(
-                    ["sudo", "apt-get", "install", "-y", "ffmpeg"], check=True
-                )
-            elif os.path.exists("/etc/redhat-release"):
-                logger.info("使用 yum 安装 FFmpeg...")
-                subprocess.run(["sudo", "yum", "install", "-y", "ffmpeg"], check=True)
-            elif os.path.exists("/etc/arch-release"):
-                logger.info("使用 pacman 安装 FFmpeg...")
-                subprocess.run(
-                    ["sudo", "pacman", "-S", "--noconfirm", "ffmpeg"], check=True
-                )
-            else:
-                logger.error("未识别的 Linux 发行版，请手动安装 FFmpeg")
-                return False
-
-        elif system == "darwin":  # macOS
-            logger.info("使用 Homebrew 安装 FFmpeg...")
-            # 先检查是否安装了 Homebrew
-            brew_check = subprocess.run(["which", "brew"], capture_output=True)
-            if brew_check.returncode != 0:
-                logger.error(
-                    '未安装 Homebrew，请先安装: /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"'
-                )
-                return False
-            subprocess.run(["brew", "install", "ffmpeg"], check=True)
-
-        elif system == "windows":
-            logger.warning("Windows 系统暂不支持自动安装")
-            logger.info("请访问 https://ffmpeg.org/download.html 下载 FFmpeg")
-            logger.info("或使用 Chocolatey 安装: choco install ffmpeg")
-            return False
+    def __init__(self, input_path: str, output_base_dir: str, relative_dir: str = ""):
+        self.input_path = input_path
+        self.name, ext = os.path.splitext(os.path.basename(input_path))
+        self.ext = ext.lower()
+        # 输入位于子目录中时，各阶段的输出目录镜像同样的相对路径
+        self.extracted_audio_dir = os.path.join(
+            output_base_dir, "extracted_audio", relative_dir, self.name
+        )
+        self.audio_output_dir = os.path.join(
+            output_base_dir, "audio_segments", relative_dir, self.name
+        )
+        self.enhanced_audio_dir = os.path.join(
+            output_base_dir, "enhanced_audio", relative_dir, self.name
+        )
+        self.journal_path = os.path.join(output_base_dir, JOURNAL_FILENAME)
+        self.journal = open_journal(self.journal_path)
+        self.unit = unit_id("video", input_path)
+        self.cache = None
+        self.cache_key = None
+        self.previous = None
+        self.silence_cuts = False
 
-        else:
-            logger.error(f"不支持的操作系统: {system}")
-            return False
+    def enhanced_path(self, segment_path: str) -> str:
+        """
+        片段音质提升后的输出路径。
+        """
+        segment_name = os.path.splitext(os.path.basename(segment_path))[0]
+        return os.path.join(self.enhanced_audio_dir, f"{segment_name}.wav")
+
+    def segment_names(self) -> UniqueNames:
+        """
+        片段名称分配器：名字在片段目录和音质提升目录中都不重复。
+        """
+        return unique_names(self.audio_output_dir, self.enhanced_audio_dir)
 
-        # 验证安装是否成功
-        if check_ffmpeg_installed():
-            logger.info("FFmpeg 安装成功！")
-            return True
+    def reusable_segments(self) -> list | None:
+        """
+        上次运行已经完成分割且片段都还存在时返回这些片段，否则返回 None。
+        """
+        previous = self.previous
+        if previous and previous["state"] == "cut" and all(
+            os.path.isfile(path) for path in previous["segments"]
+        ):
+            return previous["segments"]
+        return None
+
+    def clear_leftover_segments(self) -> None:
+        """
+        重新分割前清空片段目录：上次运行（中断或已完成）留下的片段会被目录级的音质提升重复处理，
+        并且每次运行都会在目录中累积一批新的随机名片段。
+        """
+        if not os.path.isdir(self.audio_output_dir):
+            return
+        for leftover in os.listdir(self.audio_output_dir):
+            path = os.path.join(self.audio_output_dir, leftover)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def _remove_stale_outputs(self, enhanced_paths: list) -> None:
+        """
+        删除音质提升目录中不属于本次运行的片段（之前运行使用另一批随机名字生成的输出）。
+        """
+        current = set(enhanced_paths)
+        for filename in os.listdir(self.enhanced_audio_dir):
+            path = os.path.abspath(os.path.join(self.enhanced_audio_dir, filename))
+            if filename.lower().endswith(".wav") and path not in current:
+                os.remove(path)
+
+    def finish(self, enhanced_paths: list) -> None:
+        """
+        所有片段处理完后记录结果：全部输出存在时写入缓存并标记完成，否则标记失败。
+        """
+        if enhanced_paths and all(os.path.isfile(path) for path in enhanced_paths):
+            enhanced_paths = [os.path.abspath(path) for path in enhanced_paths]
+            self._remove_stale_outputs(enhanced_paths)
+            if self.cache is not None:
+                self.cache.store(self.cache_key, enhanced_paths)
+            self.journal.record(self.unit, "done", outputs=enhanced_paths)
         else:
-            logger.error("FFmpeg 安装失败，请手动安装")
-            return False
+            self.journal.record(self.unit, "failed")
+        logger.info(f"{self.name} 的处理完成，音质提升已保存至: {self.enhanced_audio_dir}")
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"安装 FFmpeg 时出错: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"未知错误: {e}")
-        return False
 
+def _start_file_job(
+    input_path: str,
+    output_base_dir: str,
+    fused: bool,
+    use_cache: bool,
+    cache_path: str,
+    resume: bool,
+    copy_segments: bool,
+    relative_dir: str = "",
+    silence_cuts: bool = False,
+) -> _FileJob | None:
+    """
+    检查文件类型、任务日志和缓存，需要处理时记录开始状态并返回处理上下文。
+    :param relative_dir: 输入文件相对输入根目录的子目录，输出目录镜像该结构
+    :param silence_cuts: 解码分割时是否在最安静的位置切分（单遍模式和流复制切分不适用）
+    :return: _FileJob，不支持的文件、上次已完成或命中缓存时返回 None
+    """
+    job = _FileJob(input_path, output_base_dir, relative_dir)
+    if job.ext not in VIDEO_EXTENSIONS + AUDIO_EXTENSIONS:
+        logger.warning(f"不支持的文件类型: {input_path}")
+        return None
+    copy_cut = copy_segments and job.ext in COPY_SEGMENT_FORMATS
+    job.silence_cuts = silence_cuts and not fused and not copy_cut
+
+    os.makedirs(job.enhanced_audio_dir, exist_ok=True)
 
-def ensure_ffmpeg() -> None:
+    if resume and job.journal.is_done(job.unit):
+        logger.info(f"上次运行中已完成，跳过: {input_path}")
+        return None
+
+    if use_cache:
+        job.cache = open_cache(cache_path)
+        cache_params = [
+            "video",
+            fused,
+            copy_cut,
+            HIRES_OUTPUT_ARGS,
+            [MIN_SEGMENT_MS, MAX_SEGMENT_MS],
+        ] + (["silence"] if job.silence_cuts else [])
+        job.cache_key = job.cache.make_key(input_path, cache_params)
+        restored = job.cache.restore_into(job.cache_key, job.enhanced_audio_dir)
+        if restored is not None:
+            job.journal.record(job.unit, "done", outputs=restored)
+            logger.info(f"命中缓存，跳过: {input_path}")
+            return None
+
+    job.previous = job.journal.get(job.unit) if resume else None
+    job.journal.record(job.unit, "started")
+    return job
+
+
+def process_file(
+    input_path: str,
+    output_base_dir: str,
+    fused: bool = False,
+    keep_intermediates: bool = False,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    copy_segments: bool = False,
+    relative_dir: str = "",
+    silence_cuts: bool = False,
+) -> None:
     """
-    确保 FFmpeg 可用，如果不可用则尝试安装
+    根据输入文件类型（音频或视频）进行处理。
+    :param input_path: 输入文件的路径
+    :param output_base_dir: 输出的基础目录
+    :param fused: 是否使用单遍模式（一次 FFmpeg 调用直接输出音质提升后的片段）
+    :param keep_intermediates: 单遍模式下是否同时保留提取的音频和原始片段，便于调试
+    :param use_cache: 是否使用转换缓存跳过内容和参数都未变化的输入
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否根据任务日志续跑：跳过已完成的文件，已完成分割的文件只补做未完成的片段
+    :param copy_segments: 已压缩的音频输入（mp3/aac/flac）不解码，直接流复制切分
+    :param relative_dir: 输入文件相对输入根目录的子目录，输出目录镜像该结构
+    :param silence_cuts: 解码分割时在 70-75 秒的窗口内选择最安静的位置切分
     """
-    if check_ffmpeg_installed():
-        logger.info("FFmpeg 已安装 ✓")
+    job = _start_file_job(
+        input_path,
+        output_base_dir,
+        fused,
+        use_cache,
+        cache_path,
+        resume,
+        copy_segments,
+        relative_dir,
+        silence_cuts,
+    )
+    if job is None:
         return
 
-    logger.warning("未检测到 FFmpeg，准备自动安装...")
-    if not install_ffmpeg():
-        logger.error("FFmpeg 安装失败，程序无法继续运行")
-        sys.exit(1)
-
-
-def weighted_choice(choices):
-    """
-    根据加权概率随机选择一个元素。
-    :param choices: 元素和权重的列表 [(元素, 权重), ...]
-    :return: 随机选择的元素
-    """
-    total = sum(weight for _, weight in choices)
-    r = random.uniform(0, total)
-    upto = 0
-    for item, weight in choices:
-        if upto + weight >= r:
-            return item
-        upto += weight
-    return choices[-1][0]  # 如果没有命中，返回最后一个
-
-
-def generate_chinese_name() -> str:
-    """
-    随机生成一个三字中文歌曲名称，增强随机性。
-    :return: 三字中文歌曲名称
-    """
-    words = [
-        ("巍峨", 2),
-        ("峻峭", 1.9),
-        ("雄浑", 1.8),
-        ("广袤", 1.7),
-        ("缥缈", 1.9),
-        ("阴森", 1.6),
-        ("浩渺", 1.8),
-        ("幽僻", 1.5),
-        ("峰峦", 1.7),
-        ("山涧", 1.6),
-        ("湖泊", 1.7),
-        ("溪流", 1.6),
-        ("沼泽", 1.5),
-        ("旷野", 1.4),
-        ("山岗", 1.3),
-        ("山巅", 1.4),
-        ("险嶂", 1.3),
-        ("洼地", 1.2),
-        ("深渊", 1.1),
-        ("礁石", 1.0),
-        ("霹雳", 1.6),
-        ("暴雪", 1.5),
-        ("晨霜", 1.4),
-        ("朝露", 1.3),
-        ("暮霭", 1.2),
-        ("惊澜", 1.5),
-        ("涟漪", 1.4),
-        ("沙砾", 1.1),
-        ("峭壁", 1.2),
-    ]
+    extracted_audio_dir = job.extracted_audio_dir
+    audio_output_dir = job.audio_output_dir
+    enhanced_audio_dir = job.enhanced_audio_dir
+    if fused:
+        logger.info(f"单遍处理文件: {input_path}")
+        if keep_intermediates:
+            os.makedirs(extracted_audio_dir, exist_ok=True)
+            os.makedirs(audio_output_dir, exist_ok=True)
+        else:
+            extracted_audio_dir = audio_output_dir = None
+        enhanced_paths = fused_extract_and_enhance(
+            input_path, enhanced_audio_dir, extracted_audio_dir, audio_output_dir
+        )
+    else:
+        os.makedirs(extracted_audio_dir, exist_ok=True)
+        os.makedirs(audio_output_dir, exist_ok=True)
 
-    # 使用加权选择
-    first_char = weighted_choice(words)
-    second_char, third_char = random.sample([w for w, _ in words], 2)  # 防止重复
+        # 上次运行已经完成分割时直接复用片段，只补做未完成的音质提升
+        segment_paths = job.reusable_segments()
+        if segment_paths is not None:
+            logger.info(f"复用上次运行的分割结果: {input_path}")
+        else:
+            job.clear_leftover_segments()
+            segment_paths = []
+            if job.ext in VIDEO_EXTENSIONS:
+                logger.info(f"处理视频文件: {input_path}")
+                audio_path = extract_audio_from_video(input_path, extracted_audio_dir)
+                if audio_path:
+                    segment_paths = cut_audio(
+                        audio_path, audio_output_dir, job.silence_cuts
+                    )
+            elif copy_segments and job.ext in COPY_SEGMENT_FORMATS:
+                logger.info(f"流复制分割音频文件: {input_path}")
+                segment_paths = copy_cut_audio(input_path, audio_output_dir)
+            else:
+                logger.info(f"处理音频文件: {input_path}")
+                segment_paths = cut_audio(input_path, audio_output_dir, job.silence_cuts)
+            segment_paths = [os.path.abspath(path) for path in segment_paths]
+            job.journal.record(job.unit, "cut", segments=segment_paths)
 
-    # 随机选择格式
-    patterns = [
-        f"{first_char}{second_char}的{third_char}",
-        f"{first_char}与{second_char}{third_char}",
-        f"{second_char}中{second_char}{third_char}",
-        f"{first_char}{second_char}{third_char}",
-    ]
-    return random.choice(patterns)
+        # 片段文件名是随机生成的，不走逐文件缓存；片段级进度记录在同一个任务日志中
+        enhance_audio_quality(
+            audio_output_dir,
+            enhanced_audio_dir,
+            use_cache=False,
+            resume=resume,
+            journal_path=job.journal_path,
+            extensions=AUDIO_EXTENSIONS,
+            plan=False,  # 片段时长都在 70-75 秒之间，不需要排序
+        )
+        enhanced_paths = [job.enhanced_path(path) for path in segment_paths]
 
+    job.finish(enhanced_paths)
 
-def extract_audio_from_video(video_path: str, output_dir: str) -> str | None:
+
+class _SegmentTracker:
     """
-    从视频文件提取音频并保存为 WAV 格式。
-    :param video_path: 输入视频文件的路径
-    :param output_dir: 提取的音频存放目录
-    :return: 提取的音频文件路径
+    流水线中跟踪一个文件的片段：分割结束且所有片段都完成音质提升后，记录整个文件的结果。
     """
-    audio_output_path = os.path.join(
-        output_dir, f"{os.path.splitext(os.path.basename(video_path))[0]}.wav"
-    )
-    try:
-        command = [
-            "ffmpeg",
-            "-i",
-            video_path,
-            "-q:a",
-            "0",
-            "-map",
-            "a",
-            audio_output_path,
-            "-y",
-        ]
-        subprocess.run(command, check=True)
-        logger.info(f"提取音频完成: {audio_output_path}")
-        return audio_output_path
-    except subprocess.CalledProcessError as e:
-        logger.error(f"提取音频失败: {video_path}，错误信息: {e}")
-        return None
 
+    def __init__(self, job: _FileJob):
+        self.job = job
+        self.segments = []
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._cutting = True
+        self._failed = False
+
+    def add(self, segment_path: str) -> None:
+        with self._lock:
+            self.segments.append(segment_path)
+            self._pending += 1
+
+    def segment_done(self, ok: bool) -> None:
+        with self._lock:
+            self._pending -= 1
+            self._failed |= not ok
+            finished = not self._cutting and self._pending == 0
+        if finished:
+            self._finish()
+
+    def cutting_done(self, ok: bool) -> None:
+        with self._lock:
+            self._cutting = False
+            self._failed |= not ok
+            finished = self._pending == 0
+        if finished:
+            self._finish()
 
-def cut_audio(audio_path: str, output_dir: str) -> list:
+    def _finish(self) -> None:
+        if self._failed:
+            self.job.finish([])
+        else:
+            self.job.finish([self.job.enhanced_path(path) for path in self.segments])
+
+
+def _pipeline_extract(
+    files, output_base_dir: str, options: dict, cut_queue, started: list
+) -> None:
     """
-    使用 pydub 将音频文件分割成多个随机时长的片段，并返回所有片段的路径列表。
-    :param audio_path: 输入音频文件的路径
-    :param output_dir: 分割后音频片段的存放目录
-    :return: 包含所有音频片段路径的列表
+    流水线第一阶段：逐个文件检查缓存和任务日志，视频先提取音频，然后交给分割阶段。
+    cut_queue 有界，分割阶段跟不上时在这里阻塞，待分割的中间音频最多只有一个。
+    files 可以是边扫描边产出的迭代器，遇到的文件依次记录在 started 中。
+    """
+    for item in files:
+        if isinstance(item, ScannedFile):
+            input_path, relative_dir = item.path, item.relative_dir
+        else:
+            input_path, relative_dir = item, ""
+        started.append(input_path)
+        try:
+            job = _start_file_job(
+                input_path, output_base_dir, False, **options, relative_dir=relative_dir
+            )
+            if job is None:
+                continue
+            os.makedirs(job.extracted_audio_dir, exist_ok=True)
+            os.makedirs(job.audio_output_dir, exist_ok=True)
+
+            segment_paths = job.reusable_segments()
+            if segment_paths is not None:
+                logger.info(f"复用上次运行的分割结果: {input_path}")
+                cut_queue.put((job, None, segment_paths))
+                continue
+            job.clear_leftover_segments()
+            if job.ext in VIDEO_EXTENSIONS:
+                logger.info(f"处理视频文件: {input_path}")
+                audio_path = extract_audio_from_video(input_path, job.extracted_audio_dir)
+                if audio_path is None:
+                    job.finish([])
+                    continue
+            else:
+                logger.info(f"处理音频文件: {input_path}")
+                audio_path = input_path
+            cut_queue.put((job, audio_path, None))
+        except Exception as e:
+            logger.error(f"处理文件失败: {input_path}，错误信息: {e}")
+    cut_queue.put(None)
+
+
+def _pipeline_cut(cut_queue, enhance_queue, copy_segments: bool, workers: int) -> None:
+    """
+    流水线第二阶段：流式分割音频，每个片段写完立即交给音质提升工作者。
+    enhance_queue 有界，下游跟不上时在这里阻塞，磁盘上待处理的片段数量因此受限。
+    管道解码不占用全局 FFmpeg 名额：它阻塞在队列上时不消耗 CPU，而占着名额会让下游永远拿不到名额而死锁。
     """
     try:
-        audio = AudioSegment.from_file(audio_path)
-        duration = len(audio)
-
-        audio_segment_paths = []
-        start = 0
-        while start < duration:
-            segment_duration = random.randint(70 * 1000, 75 * 1000)
-            end = min(start + segment_duration, duration)
-            audio_segment = audio[start:end]
-
-            segment_filename = f"{generate_chinese_name()}.wav"
-            audio_output_path = os.path.join(output_dir, segment_filename)
-            audio_segment.export(audio_output_path, format="wav")
-            logger.info(f"剪切音频片段完成: {audio_output_path}")
-
-            audio_segment_paths.append(audio_output_path)
-            start = end
-
-        return audio_segment_paths
-    except Exception as e:
-        logger.error(f"音频分割失败: {audio_path}，错误信息: {e}")
-        return []
+        while True:
+            item = cut_queue.get()
+            if item is None:
+                break
+            try:
+                _cut_into_queue(*item, enhance_queue, copy_segments)
+            except Exception as e:
+                logger.error(f"处理文件失败: {item[0].input_path}，错误信息: {e}")
+    finally:
+        # 无论如何都要通知工作者退出，否则流水线无法结束
+        for _ in range(workers):
+            enhance_queue.put(None)
 
 
-def process_file(input_path: str, output_base_dir: str) -> None:
+def _cut_into_queue(
+    job: _FileJob,
+    audio_path: str | None,
+    segment_paths: list | None,
+    enhance_queue,
+    copy_segments: bool,
+) -> None:
     """
-    根据输入文件类型（音频或视频）进行处理。
-    :param input_path: 输入文件的路径
-    :param output_base_dir: 输出的基础目录
+    分割一个文件并把片段逐个放入队列；segment_paths 不为 None 时直接复用上次的分割结果。
     """
-    filename = os.path.basename(input_path)
-    name, ext = os.path.splitext(filename)
-    ext = ext.lower()
-
-    extracted_audio_dir = os.path.join(output_base_dir, "extracted_audio", name)
-    audio_output_dir = os.path.join(output_base_dir, "audio_segments", name)
-    enhanced_audio_dir = os.path.join(output_base_dir, "enhanced_audio", name)
-
-    os.makedirs(extracted_audio_dir, exist_ok=True)
-    os.makedirs(audio_output_dir, exist_ok=True)
-    os.makedirs(enhanced_audio_dir, exist_ok=True)
-
-    if ext in (".mp4", ".avi", ".mov", ".mkv"):
-        logger.info(f"处理视频文件: {input_path}")
-        audio_path = extract_audio_from_video(input_path, extracted_audio_dir)
-        if audio_path:
-            cut_audio(audio_path, audio_output_dir)
-    elif ext in (".wav", ".mp3", ".flac", ".aac"):
-        logger.info(f"处理音频文件: {input_path}")
-        cut_audio(input_path, audio_output_dir)
+    tracker = _SegmentTracker(job)
+    ok = True
+    if segment_paths is not None:
+        for segment_path in segment_paths:
+            tracker.add(segment_path)
+            enhance_queue.put((tracker, segment_path))
     else:
-        logger.warning(f"不支持的文件类型: {input_path}")
-        return
+        # 统计的耗时包含等待下游的时间
+        with measure("cut_audio", audio_path) as stage:
+            try:
+                if copy_segments and job.ext in COPY_SEGMENT_FORMATS:
+                    segments = copy_segment_audio(
+                        audio_path, job.audio_output_dir, job.segment_names()
+                    )
+                else:
+                    segments = iter_cut_audio(
+                        audio_path,
+                        job.audio_output_dir,
+                        job.segment_names(),
+                        hold_slot=False,
+                        snap_to_silence=job.silence_cuts,
+                    )
+                for segment_path in segments:
+                    segment_path = os.path.abspath(segment_path)
+                    logger.info(f"剪切音频片段完成: {segment_path}")
+                    stage.outputs.append(segment_path)
+                    tracker.add(segment_path)
+                    enhance_queue.put((tracker, segment_path))
+            except Exception as e:
+                stage.fail()
+                ok = False
+                logger.error(f"音频分割失败: {audio_path}，错误信息: {e}")
+        if ok:
+            job.journal.record(job.unit, "cut", segments=tracker.segments)
+    tracker.cutting_done(ok)
+
+
+def _pipeline_enhance(enhance_queue, resume: bool) -> None:
+    """
+    流水线第三阶段：音质提升工作者，逐个处理分割好的片段。
+    """
+    while True:
+        item = enhance_queue.get()
+        if item is None:
+            break
+        tracker, segment_path = item
+        try:
+            ok = convert_segment(
+                segment_path,
+                tracker.job.enhanced_path(segment_path),
+                tracker.job.journal,
+                resume=resume,
+            )
+        except Exception as e:
+            logger.error(f"音质提升失败: {segment_path}，错误信息: {e}")
+            ok = False
+        tracker.segment_done(ok)
+
+
+def run_pipeline(
+    files,
+    output_base_dir: str,
+    enhance_workers: int,
+    queue_size: int | None = None,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    copy_segments: bool = False,
+    silence_cuts: bool = False,
+) -> list:
+    """
+    以生产者/消费者流水线处理一批文件：提取 -> 分割 -> 音质提升，各阶段之间使用有界队列。
+    片段分割完成即开始音质提升，下一个文件的提取与当前文件的分割、提升并行进行；
+    队列满时上游阻塞（背压），磁盘上待处理的中间文件数量因此有上限。
+    :param files: 输入文件路径（或 ScannedFile）的可迭代对象，可以是边扫描边产出的迭代器
+    :param output_base_dir: 输出目录
+    :param enhance_workers: 音质提升工作者数量
+    :param queue_size: 待提升片段队列的容量，默认为工作者数量的两倍
+    :param use_cache: 是否使用转换缓存
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否根据任务日志从上次中断处继续
+    :param copy_segments: 已压缩的音频输入不解码，直接流复制切分
+    :param silence_cuts: 解码分割时在 70-75 秒的窗口内选择最安静的位置切分
+    :return: 处理失败的文件名列表
+    """
+    enhance_workers = max(1, enhance_workers)
+    cut_queue = queue.Queue(maxsize=1)
+    enhance_queue = queue.Queue(maxsize=queue_size or 2 * enhance_workers)
+    options = {
+        "use_cache": use_cache,
+        "cache_path": cache_path,
+        "resume": resume,
+        "copy_segments": copy_segments,
+        "silence_cuts": silence_cuts,
+    }
+    started = []
+    threads = [
+        threading.Thread(
+            target=_pipeline_extract,
+            args=(files, output_base_dir, options, cut_queue, started),
+            name="pipeline-extract",
+        ),
+        threading.Thread(
+            target=_pipeline_cut,
+            args=(cut_queue, enhance_queue, copy_segments, enhance_workers),
+            name="pipeline-cut",
+        ),
+    ]
+    threads += [
+        threading.Thread(
+            target=_pipeline_enhance,
+            args=(enhance_queue, resume),
+            name=f"pipeline-enhance-{index}",
+        )
+        for index in range(enhance_workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # 以任务日志中的最终状态为准（不支持的文件没有记录）
+    journal = open_journal(os.path.join(output_base_dir, JOURNAL_FILENAME))
+    failed = []
+    for input_path in started:
+        entry = journal.get(unit_id("video", input_path))
+        if entry is not None and entry["state"] != "done":
+            failed.append(os.path.basename(input_path))
+    return failed
+
+
+def _process_file_in_worker(*args) -> list:
+    """
+    进程池中执行 process_file，并把子进程内的性能记录带回主进程。
+    """
+    process_file(*args)
+    return drain_records()
+
+
+def _create_executor(executor: str, max_workers: int, max_ffmpeg: int):
+    """
+    创建文件级的工作池，并让所有工作者共享同一个 FFmpeg 并发上限。
+    :param executor: "thread" 或 "process"
+    :param max_workers: 同时处理的文件数
+    :param max_ffmpeg: 全局同时运行的 FFmpeg 进程上限
+    """
+    if executor == "process":
+        semaphore = multiprocessing.get_context().BoundedSemaphore(max_ffmpeg)
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=init_ffmpeg_slots,
+            initargs=(semaphore,),
+        )
+    if executor == "thread":
+        set_ffmpeg_limit(max_ffmpeg)
+        return ThreadPoolExecutor(max_workers=max_workers)
+    raise ValueError(f"不支持的执行器类型: {executor}")
+
 
-    enhance_audio_quality(audio_output_dir, enhanced_audio_dir)
-    logger.info(f"{name} 的处理完成，音质提升已保存至: {enhanced_audio_dir}")
+def _fingerprint(input_path: str, cache) -> Fingerprint | None:
+    """
+    获取文件的音频指纹：文件未变化时使用索引中的结果，否则解码计算并写入索引。
+    """
+    stored = cache.lookup_fingerprint(input_path)
+    if stored is not None:
+        return Fingerprint.from_bytes(*stored)
+    with measure("fingerprint", input_path) as stage:
+        fingerprint = compute_fingerprint(input_path)
+        if fingerprint is None:
+            stage.fail()
+            return None
+        stage.audio_seconds = fingerprint.duration
+    cache.store_fingerprint(input_path, fingerprint.blocks, fingerprint.to_bytes())
+    return fingerprint
+
+
+def _fingerprint_ahead(files, cache, workers: int):
+    """
+    按扫描顺序产出 (文件, 指纹)，后台同时为最多 workers * 2 个文件计算指纹。
+    """
+    window = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for scanned in files:
+            window.append((scanned, pool.submit(_fingerprint, scanned.path, cache)))
+            if len(window) >= workers * 2:
+                scanned, future = window.popleft()
+                yield scanned, future.result()
+        while window:
+            scanned, future = window.popleft()
+            yield scanned, future.result()
 
 
-def process_directory(input_dir: str, output_base_dir: str) -> None:
+def _link_duplicate(scanned: ScannedFile, original_path: str, output_base_dir: str) -> bool:
+    """
+    原文件已处理完成时，把它的最终片段链接到重复文件的输出目录，并在任务日志中记为完成。
+    :return: 是否已链接
+    """
+    job = _FileJob(scanned.path, output_base_dir, scanned.relative_dir)
+    original = job.journal.get(unit_id("video", original_path))
+    if not job.journal.is_done(unit_id("video", original_path)) or not original.get("outputs"):
+        return False
+    os.makedirs(job.enhanced_audio_dir, exist_ok=True)
+    outputs = link_outputs(original["outputs"], job.enhanced_audio_dir)
+    job.journal.record(
+        job.unit,
+        "done",
+        outputs=[os.path.abspath(path) for path in outputs],
+        duplicate_of=original_path,
+    )
+    logger.info(f"与已处理的文件内容相同，链接已有结果: {scanned.path} -> {original_path}")
+    return True
+
+
+def _skip_duplicates(files, output_base_dir: str, cache_path: str, workers: int, deferred: list):
+    """
+    去重预处理：为每个文件计算音频指纹，只产出内容没有出现过的文件。
+    与之前已处理完成的文件重复时直接链接已有结果；与本批次中较早的文件重复时记入 deferred，
+    等本批次处理完成后再链接。
+    :param deferred: 收集 (重复文件, 本批次中的原文件路径)
+    """
+    cache = open_cache(cache_path)
+    batch = set()
+    for scanned, fingerprint in _fingerprint_ahead(files, cache, workers):
+        input_path = os.path.abspath(scanned.path)
+        if fingerprint is not None and fingerprint.informative:
+            duplicate = False
+            for path, blocks, bits in cache.fingerprint_candidates(*candidate_range(fingerprint)):
+                if path == input_path or not is_duplicate(
+                    fingerprint, Fingerprint.from_bytes(blocks, bits)
+                ):
+                    continue
+                if path in batch:
+                    logger.info(f"与本批次中的文件内容相同，稍后链接结果: {scanned.path} -> {path}")
+                    deferred.append((scanned, path))
+                    duplicate = True
+                    break
+                if _link_duplicate(scanned, path, output_base_dir):
+                    duplicate = True
+                    break
+            if duplicate:
+                continue
+        batch.add(input_path)
+        yield scanned
+
+
+def process_directory(
+    input_dir: str,
+    output_base_dir: str,
+    fused: bool = False,
+    keep_intermediates: bool = False,
+    max_workers: int = 1,
+    executor: str = "thread",
+    max_ffmpeg: int = DEFAULT_FFMPEG_LIMIT,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    metrics_dir: str | None = None,
+    copy_segments: bool = False,
+    pipeline: bool = False,
+    queue_size: int | None = None,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    dedupe: bool = False,
+    silence_cuts: bool = False,
+) -> None:
     """
     遍历目录，处理所有音频和视频文件。
     :param input_dir: 输入目录
     :param output_base_dir: 输出目录
+    :param fused: 是否使用单遍模式
+    :param keep_intermediates: 单遍模式下是否保留中间目录
+    :param max_workers: 同时处理的文件数
+    :param executor: 文件级工作池类型，"thread" 或 "process"
+    :param max_ffmpeg: 全局同时运行的 FFmpeg 进程上限（文件级与片段级并发共享）
+    :param use_cache: 是否使用转换缓存跳过内容和参数都未变化的输入
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否根据输出目录下的任务日志从上次中断处继续
+    :param metrics_dir: 性能报告的导出目录（run_report.json 与 itools.prom），None 表示不导出
+    :param copy_segments: 已压缩的音频输入不解码，直接流复制切分
+    :param pipeline: 使用流水线模式（提取、分割、音质提升并行进行），此时 max_ffmpeg 即音质提升工作者数量
+    :param queue_size: 流水线模式下待提升片段队列的容量
+    :param recursive: 是否递归扫描子目录，子目录结构镜像到各阶段的输出目录
+    :param include: 只处理匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :param dedupe: 处理前计算音频指纹，内容相同的文件（不同文件名、容器或编码）只处理一次，其余链接已有结果
+    :param silence_cuts: 解码分割时在 70-75 秒的窗口内选择最安静的位置切分，而不是随机时长
     """
     # 检查输入目录是否存在
     if not os.path.exists(input_dir):
@@ -290,27 +874,210 @@ def process_directory(input_dir: str, output_base_dir: str) -> None:
 
     os.makedirs(output_base_dir, exist_ok=True)
 
-    files = [
-        f for f in os.listdir(input_dir) if os.path.isfile(os.path.join(input_dir, f))
-    ]
-    if not files:
-        logger.warning(f"输入目录中没有文件: {input_dir}")
-        return
+    # 递归扫描支持的音视频文件，边发现边交给工作池，子目录结构镜像到输出目录
+    files = iter_media_files(
+        input_dir,
+        VIDEO_EXTENSIONS + AUDIO_EXTENSIONS,
+        include,
+        exclude,
+        recursive,
+        skip_dirs=[output_base_dir],
+    )
+    logger.info(
+        f"开始边扫描边处理: {input_dir}（{max_workers} 个工作者，FFmpeg 上限 {max_ffmpeg}）..."
+    )
+
+    found = []
 
-    logger.info(f"找到 {len(files)} 个文件，开始处理...")
+    def iter_files():
+        for scanned in files:
+            found.append(scanned.path)
+            yield scanned
 
-    for file in files:
-        file_path = os.path.join(input_dir, file)
-        if os.path.isfile(file_path):
-            process_file(file_path, output_base_dir)
+    # 去重预处理与处理并行：指纹算完一个就决定一个，不需要等整个目录
+    deferred = []
+    source = iter_files()
+    if dedupe:
+        source = _skip_duplicates(source, output_base_dir, cache_path, max_ffmpeg, deferred)
 
+    if fused and silence_cuts:
+        logger.warning("单遍模式按预先计算的时间点切分，忽略 --silence-cuts")
+
+    run_start = time.perf_counter()
+    if pipeline and not fused:
+        set_ffmpeg_limit(max_ffmpeg)
+        failed = run_pipeline(
+            source,
+            output_base_dir,
+            max_ffmpeg,
+            queue_size,
+            use_cache,
+            cache_path,
+            resume,
+            copy_segments,
+            silence_cuts,
+        )
+    else:
+        if pipeline:
+            logger.warning("单遍模式不需要流水线，忽略 --pipeline")
+        worker = _process_file_in_worker if executor == "process" else process_file
+        with _create_executor(executor, max_workers, max_ffmpeg) as pool:
+            futures = {
+                pool.submit(
+                    worker,
+                    scanned.path,
+                    output_base_dir,
+                    fused,
+                    keep_intermediates,
+                    use_cache,
+                    cache_path,
+                    resume,
+                    copy_segments,
+                    scanned.relative_dir,
+                    silence_cuts,
+                ): scanned.relative_path
+                for scanned in source
+            }
+            failed = []
+            for future, file in futures.items():
+                try:
+                    records = future.result()
+                except Exception as e:
+                    logger.error(f"处理文件失败: {file}，错误信息: {e}")
+                    failed.append(file)
+                    continue
+                if records:
+                    add_records(records)
+
+    if not found:
+        logger.warning(f"输入目录中没有支持的音视频文件: {input_dir}")
+        return
+    if deferred:
+        # 进程池的子进程各自写入任务日志，本进程缓存的实例看不到它们的完成记录
+        open_journal(os.path.join(output_base_dir, JOURNAL_FILENAME)).reload()
+    linked = 0
+    for scanned, original_path in deferred:
+        if _link_duplicate(scanned, original_path, output_base_dir):
+            linked += 1
+        else:
+            # 原文件处理失败，重复文件单独处理一次
+            logger.warning(f"原文件没有成功处理，单独处理重复文件: {scanned.path}")
+            process_file(
+                scanned.path,
+                output_base_dir,
+                fused,
+                keep_intermediates,
+                use_cache,
+                cache_path,
+                resume,
+                copy_segments,
+                scanned.relative_dir,
+                silence_cuts,
+            )
+            if not _FileJob(scanned.path, output_base_dir).journal.is_done(
+                unit_id("video", scanned.path)
+            ):
+                failed.append(scanned.relative_path)
+    if linked:
+        logger.info(f"{linked} 个文件与本批次中的其他文件内容相同，已链接结果")
+    if failed:
+        logger.warning(f"{len(failed)} 个文件处理失败: {failed}")
     logger.info("所有文件处理完成！")
+    if metrics_dir:
+        report = export_report(
+            metrics_dir, "convert_video_to_hires_audio", time.perf_counter() - run_start
+        )
+        for stage, summary in report["stages"].items():
+            logger.info(
+                f"{stage}: {summary['jobs']} 次，耗时 {summary['wall_seconds']:.1f}s，"
+                f"实时倍率 {summary['realtime_factor'] or 0:.1f}x"
+            )
+        logger.info(f"性能报告已导出至: {metrics_dir}")
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="视频/音频转高清音频片段")
+    parser.add_argument("--input", default=r"./data", help="输入文件所在目录")
+    parser.add_argument("--output", default=r"./output", help="处理后的文件存放目录")
+    parser.add_argument(
+        "--fused", action="store_true", help="单遍模式：一次 FFmpeg 调用直接输出最终片段"
+    )
+    parser.add_argument(
+        "--keep-intermediates",
+        action="store_true",
+        help="单遍模式下保留 extracted_audio/ 和 audio_segments/ 中间结果（调试用）",
+    )
+    parser.add_argument("--workers", type=int, default=1, help="同时处理的文件数")
+    parser.add_argument(
+        "--executor",
+        choices=("thread", "process"),
+        default="thread",
+        help="文件级工作池类型",
+    )
+    parser.add_argument(
+        "--max-ffmpeg",
+        type=int,
+        default=DEFAULT_FFMPEG_LIMIT,
+        help="全局同时运行的 FFmpeg 进程上限",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不使用转换缓存，强制重新处理所有文件"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="根据任务日志从上次中断处继续"
+    )
+    parser.add_argument(
+        "--copy-segments",
+        action="store_true",
+        help="mp3/aac/flac 输入不解码，直接流复制切分（切分点记录在 segments.json 中）",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="流水线模式：片段分割完成即开始音质提升，下一个文件的提取与当前文件并行",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=None,
+        help="流水线模式下待提升片段队列的容量（默认为 --max-ffmpeg 的两倍）",
+    )
+    parser.add_argument(
+        "--metrics-dir", default=None, help="导出性能报告（JSON 与 Prometheus textfile）的目录"
+    )
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="处理前计算音频指纹，内容相同的文件（不同文件名、容器或编码）只处理一次，其余链接已有结果",
+    )
+    parser.add_argument(
+        "--silence-cuts",
+        action="store_true",
+        help="在 70-75 秒的窗口内选择最安静的位置切分，避免切断字词或音符（单遍模式和流复制切分不适用）",
+    )
+    add_scan_arguments(parser)
+    args = parser.parse_args()
+
     # 首先检测并确保 FFmpeg 已安装
     ensure_ffmpeg()
 
-    input_dir = r"./data"  # 输入文件所在目录
-    output_dir = r"./output"  # 处理后的文件存放目录
-    process_directory(input_dir, output_dir)
+    process_directory(
+        args.input,
+        args.output,
+        args.fused,
+        args.keep_intermediates,
+        max_workers=args.workers,
+        executor=args.executor,
+        max_ffmpeg=args.max_ffmpeg,
+        use_cache=not args.no_cache,
+        resume=args.resume,
+        metrics_dir=args.metrics_dir,
+        copy_segments=args.copy_segments,
+        pipeline=args.pipeline,
+        queue_size=args.queue_size,
+        recursive=not args.no_recursive,
+        include=args.include,
+        exclude=args.exclude,
+        dedupe=args.dedupe,
+        silence_cuts=args.silence_cuts,
+    )
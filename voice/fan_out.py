@@ -0,0 +1,330 @@
+"""
+多目标转换：每个输入只调用一次 FFmpeg，解码一次后同时输出多个目标（如 96kHz/32bit WAV 和 -q:a 2 MP3），
+代替先后运行 to_hires 和 to_mp3 时的两次解码和两次读盘。
+各目标的缓存键和任务日志与单独运行对应工具时完全一致，两种方式的结果可以互相复用。
+"""
+import argparse
+import os
+from functools import partial
+from typing import NamedTuple
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH, open_cache
+from ffmpeg_runner import (
+    DEFAULT_STALL_TIMEOUT,
+    FFmpegResult,
+    run_ffmpeg_async,
+)
+from ffmpeg_utils import (
+    DEFAULT_FFMPEG_LIMIT,
+    ensure_ffmpeg,
+    ffmpeg_path,
+    get_ffmpeg_capabilities,
+)
+from job_journal import (
+    JOURNAL_FILENAME,
+    commit_partial,
+    discard_partial,
+    open_journal,
+    partial_path,
+    unit_id,
+)
+from media_scanner import add_scan_arguments, mirror_output_path
+from metrics import measure
+from planner import (
+    DEFAULT_REALTIME_FACTORS,
+    ESTIMATED_BYTES_PER_SECOND,
+    run_batch,
+)
+from to_hires import HIRES_OUTPUT_ARGS
+from to_mp3 import AUDIO_EXTENSIONS, MP3_OUTPUT_ARGS
+
+
+class FanOutTarget(NamedTuple):
+    tool: str  # 对应的单目标工具名，用于缓存键和任务日志
+    extension: str
+    output_args: list  # 编码参数，同时作为缓存键的一部分
+    muxer: str  # 输出先写入 .part 临时文件，需要显式指定封装格式
+
+
+# 可用的输出目标，新增目标只需在这里登记
+TARGETS = {
+    "hires": FanOutTarget("to_hires", ".wav", HIRES_OUTPUT_ARGS, "wav"),
+    "mp3": FanOutTarget("to_mp3", ".mp3", MP3_OUTPUT_ARGS, "mp3"),
+}
+
+
+def build_fan_out_command(input_path: str, outputs: list) -> list:
+    """
+    生成一次解码、多路输出的 FFmpeg 命令，每一路都先写入 .part 临时文件。
+    :param input_path: 输入文件路径
+    :param outputs: [(目标名称, 输出路径), ...]
+    """
+    command = [ffmpeg_path(), "-nostdin", "-y", "-i", input_path]
+    for name, output_path in outputs:
+        target = TARGETS[name]
+        command += [
+            "-map",
+            "0:a:0",
+            *target.output_args,
+            "-f",
+            target.muxer,
+            partial_path(output_path),
+        ]
+    return command
+
+
+async def convert_fan_out_async(
+    input_path: str,
+    outputs: list,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> FFmpegResult:
+    """
+    将一个输入同时转换为多个目标，任意一路失败时丢弃所有临时文件。
+    :param input_path: 输入文件路径
+    :param outputs: [(目标名称, 输出路径), ...]
+    :param timeout: 单个任务的墙钟时间预算（秒）
+    :param stall_timeout: 没有进度多长时间视为卡住（秒）
+    """
+    result = await run_ffmpeg_async(
+        build_fan_out_command(input_path, outputs),
+        timeout=timeout,
+        stall_timeout=stall_timeout,
+    )
+    for _, output_path in outputs:
+        if result.ok:
+            commit_partial(output_path)
+            logger.info(f"转换完成: {output_path}")
+        else:
+            discard_partial(output_path)
+    if not result.ok:
+        logger.error(
+            f"FFmpeg 转换失败: {input_path}，错误信息: {result.error}\n{result.stderr}"
+        )
+    return result
+
+
+async def _convert_one(
+    input_path: str, outputs: list, cache, keys, journals, timeout, stall_timeout
+) -> FFmpegResult:
+    """
+    转换单个文件的所有待输出目标，成功后分别写入缓存和各目标的任务日志。
+    """
+    units = {name: unit_id(TARGETS[name].tool, input_path) for name, _ in outputs}
+    for name, _ in outputs:
+        journals[name].record(units[name], "started")
+    with measure("fan_out", input_path) as stage:
+        result = await convert_fan_out_async(
+            input_path, outputs, timeout, stall_timeout
+        )
+        if result.out_time_us is not None:
+            stage.audio_seconds = result.out_time_us / 1e6
+        if result.ok:
+            stage.outputs.extend(output_path for _, output_path in outputs)
+        else:
+            stage.fail()
+    for name, output_path in outputs:
+        if not result.ok:
+            journals[name].record(units[name], "failed", error=result.error)
+            continue
+        if cache is not None:
+            cache.store(keys[name], [output_path])
+        journals[name].record(
+            units[name], "done", outputs=[os.path.abspath(output_path)]
+        )
+    return result
+
+
+def process_directory(
+    all_audio_input_dir: str,
+    output_dirs: dict,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    max_workers: int = DEFAULT_FFMPEG_LIMIT,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    metrics_dir: str | None = None,
+    plan: bool = True,
+    dry_run: bool = False,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+) -> list:
+    """
+    遍历指定目录，每个音频文件只解码一次，同时输出所有目标。
+    已命中缓存或上次已完成的目标不会重复输出，所有目标都已就绪的文件直接跳过。
+
+    :param all_audio_input_dir: 包含音频文件的输入目录
+    :param output_dirs: {目标名称: 输出目录}，目标名称见 TARGETS
+    :param use_cache: 是否使用转换缓存跳过内容和参数都未变化的输入
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否跳过任务日志中已完成（且输出仍存在）的目标
+    :param max_workers: 同时运行的转换任务数
+    :param timeout: 单个文件的墙钟时间预算（秒），None 表示不限制
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    :param metrics_dir: 性能报告的导出目录（run_report.json 与 itools.prom），None 表示不导出
+    :param plan: 是否先 ffprobe 所有输入，按时长从长到短提交任务并输出耗时与磁盘占用的预估；
+        为 False 时边扫描边提交任务
+    :param dry_run: 只输出预估，不进行转换
+    :param recursive: 是否递归扫描子目录，子目录结构镜像到各输出目录
+    :param include: 只转换匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :return: 转换失败的输入文件路径列表
+    """
+    # 检查输入目录是否存在
+    if not os.path.exists(all_audio_input_dir):
+        logger.error(f"输入目录不存在: {all_audio_input_dir}")
+        logger.info("请创建目录或修改代码中的 input_dir 路径")
+        return []
+
+    if not os.path.isdir(all_audio_input_dir):
+        logger.error(f"输入路径不是目录: {all_audio_input_dir}")
+        return []
+
+    unknown = set(output_dirs) - set(TARGETS)
+    if unknown:
+        logger.error(f"不支持的输出目标: {sorted(unknown)}")
+        return []
+    if "mp3" in output_dirs:
+        try:
+            capabilities = get_ffmpeg_capabilities()
+        except FileNotFoundError as e:
+            logger.error(e)
+            return []
+        if capabilities.mp3_encoder is None:
+            logger.error(f"当前 FFmpeg 没有可用的 MP3 编码器: {capabilities.path}")
+            return []
+
+    # 确保输出目录存在，每个目标使用各自输出目录下的任务日志
+    journals = {}
+    for name, output_dir in output_dirs.items():
+        os.makedirs(output_dir, exist_ok=True)
+        journals[name] = open_journal(os.path.join(output_dir, JOURNAL_FILENAME))
+
+    cache = open_cache(cache_path) if use_cache else None
+
+    def make_jobs(scanned_files, durations, counts):
+        for scanned in scanned_files:
+            input_path = scanned.path
+            outputs = []
+            keys = {}
+            for name, output_dir in output_dirs.items():
+                target = TARGETS[name]
+                output_path = mirror_output_path(output_dir, scanned, target.extension)
+                if resume and journals[name].is_done(unit_id(target.tool, input_path)):
+                    counts["resumed"] += 1
+                    continue
+                if cache is not None:
+                    keys[name] = cache.make_key(
+                        input_path, [target.tool, target.output_args]
+                    )
+                    if cache.restore(keys[name], output_path):
+                        counts["skipped"] += 1
+                        continue
+                outputs.append((name, output_path))
+            if not outputs:
+                continue
+            yield input_path, partial(
+                _convert_one,
+                input_path,
+                outputs,
+                cache,
+                keys,
+                journals,
+                timeout,
+                stall_timeout,
+            )
+
+    # 递归扫描目录中的 MP3 和 WAV 文件（不区分大小写），子目录结构镜像到各输出目录
+    return run_batch(
+        "fan_out",
+        all_audio_input_dir,
+        AUDIO_EXTENSIONS,
+        output_dirs.values(),
+        make_jobs,
+        f"转换（目标: {', '.join(output_dirs)}）",
+        sum(ESTIMATED_BYTES_PER_SECOND[TARGETS[name].tool] for name in output_dirs),
+        # 一次解码同时编码多个目标，速度取各目标中最慢的一个
+        min(DEFAULT_REALTIME_FACTORS[TARGETS[name].tool] for name in output_dirs),
+        max_workers,
+        cache_path if use_cache else None,
+        metrics_dir,
+        plan,
+        dry_run,
+        recursive,
+        include,
+        exclude,
+        unit_label="输出",
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="音频一次解码同时输出多个目标（高清 WAV、MP3 等）"
+    )
+    parser.add_argument("--input", default=r"./data", help="音频文件所在的目录")
+    for name, target in TARGETS.items():
+        parser.add_argument(
+            f"--{name}-output",
+            default=None,
+            help=f"{target.extension} 输出目录（对应 {target.tool}），不指定时不输出该目标",
+        )
+    parser.add_argument(
+        "--resume", action="store_true", help="根据任务日志跳过上次已完成的输出"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不使用转换缓存，强制重新转换所有文件"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_FFMPEG_LIMIT, help="同时运行的转换任务数"
+    )
+    parser.add_argument(
+        "--job-timeout", type=float, default=None, help="单个文件的墙钟时间预算（秒）"
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只输出耗时与磁盘占用的预估，不进行转换"
+    )
+    parser.add_argument(
+        "--no-plan", action="store_true", help="不预先探测和排序，边扫描目录边开始转换"
+    )
+    add_scan_arguments(parser)
+    parser.add_argument(
+        "--metrics-dir", default=None, help="导出性能报告（JSON 与 Prometheus textfile）的目录"
+    )
+    args = parser.parse_args()
+
+    output_dirs = {
+        name: getattr(args, f"{name}_output")
+        for name in TARGETS
+        if getattr(args, f"{name}_output")
+    }
+    if not output_dirs:
+        parser.error("至少需要指定一个输出目录，如 --hires-output 和 --mp3-output")
+
+    # 首先检测并确保 FFmpeg 已安装
+    ensure_ffmpeg()
+
+    process_directory(
+        args.input,
+        output_dirs,
+        use_cache=not args.no_cache,
+        resume=args.resume,
+        max_workers=args.workers,
+        timeout=args.job_timeout,
+        stall_timeout=args.stall_timeout,
+        metrics_dir=args.metrics_dir,
+        plan=not args.no_plan,
+        dry_run=args.dry_run,
+        recursive=not args.no_recursive,
+        include=args.include,
+        exclude=args.exclude,
+    )
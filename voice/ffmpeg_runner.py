@@ -0,0 +1,230 @@
+"""
+基于 asyncio 的 FFmpeg 驱动：使用 create_subprocess_exec 启动进程，解析 -progress 输出判断是否卡住，
+卡住的任务会被终止并重试，每个任务还可以设置总的墙钟时间预算。
+stderr 只保留最后若干行，不会把整个输出缓存在内存中。
+"""
+import asyncio
+import subprocess
+import threading
+from collections import deque
+from typing import Awaitable, Callable, Iterable, NamedTuple
+
+from loguru import logger
+
+from ffmpeg_utils import current_ffmpeg_slots
+
+# 多长时间没有任何进度视为卡住（秒）
+DEFAULT_STALL_TIMEOUT = 120
+# 卡住后的重试次数
+DEFAULT_RETRIES = 1
+# 保留的 stderr 行数
+STDERR_TAIL_LINES = 50
+
+
+class FFmpegResult(NamedTuple):
+    command: list
+    returncode: int | None
+    attempts: int
+    elapsed: float  # 所有尝试的总耗时（秒）
+    error: str | None  # 成功时为 None
+    stderr: str  # stderr 的最后若干行
+    out_time_us: int | None = None  # 最后一次进度报告的输出时长（微秒）
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class StderrTail:
+    """
+    在后台线程中持续读取同步子进程（subprocess.Popen）的 stderr，只保留最后若干行。
+    不及时读取时，持续输出错误的 FFmpeg 会写满管道缓冲区而阻塞，读取 stdout 的一方随之死锁。
+    """
+
+    def __init__(self, stream, lines: int = STDERR_TAIL_LINES):
+        self._tail = deque(maxlen=lines)
+        self._thread = threading.Thread(target=self._drain, args=(stream,), daemon=True)
+        self._thread.start()
+
+    def _drain(self, stream) -> None:
+        for line in stream:
+            self._tail.append(line.decode("utf-8", errors="ignore").rstrip())
+
+    def text(self) -> str:
+        """
+        等待子进程关闭 stderr 后返回保留的内容。
+        """
+        self._thread.join()
+        return "\n".join(self._tail)
+
+
+async def _drain_stderr(stream, tail: deque) -> None:
+    async for line in stream:
+        tail.append(line.decode("utf-8", errors="ignore").rstrip())
+
+
+async def _run_once(
+    command: list, deadline: float | None, stall_timeout: float
+) -> tuple:
+    """
+    运行一次 FFmpeg，直到进程退出、卡住或超出时间预算。
+    :return: (returncode, 终止原因 "stalled"/"timeout"/None, stderr 尾部, 输出时长微秒)
+    """
+    loop = asyncio.get_running_loop()
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    tail = deque(maxlen=STDERR_TAIL_LINES)
+    stderr_task = asyncio.create_task(_drain_stderr(process.stderr, tail))
+
+    # -progress 每隔一段时间输出一组 key=value，以 progress=continue/end 结尾
+    block = {}
+    last_marker = None
+    last_change = loop.time()
+    reason = None
+    while True:
+        now = loop.time()
+        wait = stall_timeout - (now - last_change)
+        if deadline is not None:
+            wait = min(wait, deadline - now)
+        if wait <= 0:
+            reason = "timeout" if deadline is not None and now >= deadline else "stalled"
+            break
+        try:
+            line = await asyncio.wait_for(process.stdout.readline(), wait)
+        except asyncio.TimeoutError:
+            continue
+        if not line:
+            break
+        key, _, value = line.decode("utf-8", errors="ignore").strip().partition("=")
+        if key != "progress":
+            block[key] = value
+            continue
+        marker = (block.get("out_time_us"), block.get("total_size"))
+        if marker != last_marker:
+            last_marker = marker
+            last_change = loop.time()
+
+    if reason is not None:
+        process.kill()
+    returncode = await process.wait()
+    await stderr_task
+    out_time_us = block.get("out_time_us", "")
+    out_time_us = int(out_time_us) if out_time_us.isdigit() else None
+    return returncode, reason, "\n".join(tail), out_time_us
+
+
+async def _acquire_slot(slots) -> None:
+    """
+    在线程中等待 FFmpeg 名额。等待期间任务被取消时，线程仍会拿到名额，
+    由拿到名额的一方（线程或取消处理）立即归还，避免名额泄漏。
+    """
+    lock = threading.Lock()
+    state = {"taken": False, "cancelled": False}
+
+    def take() -> None:
+        slots.acquire()
+        with lock:
+            if state["cancelled"]:
+                slots.release()
+            else:
+                state["taken"] = True
+
+    try:
+        await asyncio.to_thread(take)
+    except asyncio.CancelledError:
+        with lock:
+            state["cancelled"] = True
+            if state["taken"]:
+                slots.release()
+        raise
+
+
+async def run_ffmpeg_async(
+    command: list,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> FFmpegResult:
+    """
+    异步运行一条 FFmpeg 命令，占用全局 FFmpeg 名额。
+    :param command: FFmpeg 命令，第一个元素为可执行文件
+    :param timeout: 整个任务（含重试）的墙钟时间预算（秒），None 表示不限制
+    :param stall_timeout: 没有进度多长时间视为卡住（秒）
+    :param retries: 卡住后的重试次数
+    :return: FFmpegResult，失败信息记录在 error 中而不是抛出异常
+    """
+    command = [command[0], "-nostats", "-progress", "pipe:1", *command[1:]]
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    deadline = start + timeout if timeout else None
+    slots = current_ffmpeg_slots()
+
+    attempt = 0
+    while True:
+        attempt += 1
+        await _acquire_slot(slots)
+        try:
+            returncode, reason, stderr, out_time_us = await _run_once(
+                command, deadline, stall_timeout
+            )
+        except OSError as e:
+            return FFmpegResult(command, None, attempt, loop.time() - start, str(e), "")
+        finally:
+            slots.release()
+
+        if reason == "stalled" and attempt <= retries:
+            logger.warning(f"FFmpeg 超过 {stall_timeout} 秒没有进度，终止并重试: {command}")
+            continue
+        if reason == "stalled":
+            error = f"超过 {stall_timeout} 秒没有进度"
+        elif reason == "timeout":
+            error = f"超出时间预算 {timeout} 秒"
+        elif returncode != 0:
+            error = f"退出码 {returncode}"
+        else:
+            error = None
+        return FFmpegResult(
+            command, returncode, attempt, loop.time() - start, error, stderr, out_time_us
+        )
+
+
+def run_ffmpeg(command: list, **kwargs) -> FFmpegResult:
+    """
+    run_ffmpeg_async 的同步版本，可在普通函数和线程池中调用。
+    """
+    return asyncio.run(run_ffmpeg_async(command, **kwargs))
+
+
+async def run_bounded(
+    job_factories: Iterable[Callable[[], Awaitable]], concurrency: int
+) -> list:
+    """
+    以给定并发数运行一批协程，收集所有结果，异常作为结果返回而不是丢失。
+    job_factories 可以是生成器：有空闲名额时才取下一个任务，目录扫描等阻塞操作在线程中进行，
+    因此任务可以边发现边开始，不必等完整的列表。
+    :param job_factories: 返回协程的无参函数的可迭代对象
+    :param concurrency: 同时运行的任务数
+    :return: 与输入顺序一致的结果列表
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(factory):
+        try:
+            return await factory()
+        finally:
+            semaphore.release()
+
+    iterator = iter(job_factories)
+    tasks = []
+    while True:
+        await semaphore.acquire()
+        factory = await asyncio.to_thread(next, iterator, None)
+        if factory is None:
+            semaphore.release()
+            break
+        tasks.append(asyncio.create_task(run(factory)))
+    return await asyncio.gather(*tasks, return_exceptions=True)
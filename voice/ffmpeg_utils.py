@@ -0,0 +1,328 @@
+"""
+FFmpeg 相关的公共工具：
+- 全局限制同时运行的 FFmpeg 进程数量。文件级并发和片段级并发共用同一个信号量，避免两层线程池叠加后 CPU 被过度占用。
+- FFmpeg 能力探测：每个进程只探测一次（选用的可执行文件、版本、音频编码器、重采样器），
+  结果按可执行文件路径和修改时间持久化到磁盘，之后的运行和进程池子进程直接复用，不再逐个任务调用 ffmpeg -version。
+"""
+import json
+import os
+import platform
+import re
+import shutil
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+from typing import NamedTuple
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_DIR
+
+# 同时运行的 FFmpeg 进程上限，默认等于 CPU 核数
+DEFAULT_FFMPEG_LIMIT = os.cpu_count() or 1
+
+_ffmpeg_slots = threading.BoundedSemaphore(DEFAULT_FFMPEG_LIMIT)
+
+
+def set_ffmpeg_limit(limit: int) -> None:
+    """
+    设置本进程内同时运行的 FFmpeg 进程上限。
+    :param limit: 最大并发数
+    """
+    global _ffmpeg_slots
+    _ffmpeg_slots = threading.BoundedSemaphore(max(1, limit))
+
+
+def init_ffmpeg_slots(semaphore) -> None:
+    """
+    使用外部传入的信号量（如 multiprocessing.BoundedSemaphore），用作进程池的 initializer，
+    使所有子进程共享同一个全局上限。
+    :param semaphore: 支持 acquire/release 的信号量
+    """
+    global _ffmpeg_slots
+    _ffmpeg_slots = semaphore
+
+
+@contextmanager
+def ffmpeg_slot():
+    """
+    占用一个 FFmpeg 运行名额，在 with 块内启动并等待 FFmpeg 进程。
+    """
+    slots = _ffmpeg_slots
+    slots.acquire()
+    try:
+        yield
+    finally:
+        slots.release()
+
+
+def current_ffmpeg_slots():
+    """
+    返回当前生效的全局信号量，供异步驱动在线程中获取名额。
+    """
+    return _ffmpeg_slots
+
+
+# 能力探测结果的持久化位置，与转换缓存放在同一目录
+CAPABILITIES_PATH = os.path.join(DEFAULT_CACHE_DIR, "ffmpeg_capabilities.json")
+
+# 系统中没有 FFmpeg 时尝试的本地可执行文件
+LOCAL_FFMPEG = os.path.join(".", "utils", "ffmpeg")
+
+# MP3 编码器的优先顺序（-acodec mp3 会选用其中第一个可用的）
+_MP3_ENCODERS = ("libmp3lame", "libshine", "mp3_mf")
+
+_capabilities = None
+_capabilities_lock = threading.Lock()
+
+
+class FFmpegCapabilities(NamedTuple):
+    path: str  # 选用的 ffmpeg 可执行文件（绝对路径）
+    mtime_ns: int  # 探测时可执行文件的修改时间，用于判断持久化结果是否过期
+    version: str
+    ffprobe: str  # 与 ffmpeg 同目录的 ffprobe，不存在时为 "ffprobe"
+    encoders: tuple  # 可用的音频编码器名称
+    resamplers: tuple  # 可用的重采样器："swr"，编译了 libsoxr 时还有 "soxr"
+
+    @property
+    def mp3_encoder(self) -> str | None:
+        """
+        -acodec mp3 实际使用的编码器，没有可用的 MP3 编码器时为 None。
+        """
+        for encoder in _MP3_ENCODERS:
+            if encoder in self.encoders:
+                return encoder
+        return None
+
+
+def _locate_ffmpeg() -> str | None:
+    """
+    查找 FFmpeg 可执行文件：优先使用 PATH 中的 ffmpeg，其次是 ./utils/ffmpeg。
+    """
+    path = shutil.which("ffmpeg")
+    if path is None and os.access(LOCAL_FFMPEG, os.X_OK):
+        path = LOCAL_FFMPEG
+    return os.path.realpath(path) if path else None
+
+
+def _probe(path: str, mtime_ns: int) -> FFmpegCapabilities:
+    """
+    运行 ffmpeg -version 和 -encoders，解析版本、编码器和重采样器。
+    """
+    version_output = subprocess.run(
+        [path, "-hide_banner", "-version"],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=30,
+    ).stdout
+    encoders_output = subprocess.run(
+        [path, "-hide_banner", "-encoders"],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=30,
+    ).stdout
+
+    match = re.search(r"ffmpeg version (\S+)", version_output)
+    encoders = []
+    listing = False
+    for line in encoders_output.splitlines():
+        fields = line.split()
+        if not listing:
+            listing = fields[:1] == ["------"]  # 列表正文前的分隔线
+        elif len(fields) >= 2 and fields[0].startswith("A"):
+            encoders.append(fields[1])
+    resamplers = ["swr"]
+    if "--enable-libsoxr" in version_output:
+        resamplers.append("soxr")
+
+    ffprobe = os.path.join(os.path.dirname(path), "ffprobe")
+    if sys.platform == "win32":
+        ffprobe += ".exe"
+    return FFmpegCapabilities(
+        path=path,
+        mtime_ns=mtime_ns,
+        version=match.group(1) if match else "unknown",
+        ffprobe=ffprobe if os.access(ffprobe, os.X_OK) else "ffprobe",
+        encoders=tuple(encoders),
+        resamplers=tuple(resamplers),
+    )
+
+
+def _load_persisted(path: str, mtime_ns: int) -> FFmpegCapabilities | None:
+    try:
+        with open(CAPABILITIES_PATH, encoding="utf-8") as f:
+            entry = json.load(f).get(path)
+    except (OSError, ValueError):
+        return None
+    if not entry or entry.get("mtime_ns") != mtime_ns:
+        return None
+    try:
+        fields = {field: entry[field] for field in FFmpegCapabilities._fields}
+    except KeyError:
+        return None  # 旧版本写入的结果，重新探测
+    fields["encoders"] = tuple(fields["encoders"])
+    fields["resamplers"] = tuple(fields["resamplers"])
+    return FFmpegCapabilities(**fields)
+
+
+def _persist(capabilities: FFmpegCapabilities) -> None:
+    try:
+        with open(CAPABILITIES_PATH, encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, ValueError):
+        entries = {}
+    entries[capabilities.path] = capabilities._asdict()
+    try:
+        os.makedirs(os.path.dirname(CAPABILITIES_PATH), exist_ok=True)
+        temp_path = f"{CAPABILITIES_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, CAPABILITIES_PATH)
+    except OSError as e:
+        logger.warning(f"无法保存 FFmpeg 探测结果: {e}")
+
+
+def get_ffmpeg_capabilities(refresh: bool = False) -> FFmpegCapabilities:
+    """
+    获取 FFmpeg 的能力信息：进程内只探测一次，可执行文件未变化时直接使用磁盘上的结果。
+    :param refresh: 忽略已有结果重新探测（如安装 FFmpeg 之后）
+    :return: FFmpegCapabilities
+    :raises FileNotFoundError: 找不到可用的 FFmpeg
+    """
+    global _capabilities
+    with _capabilities_lock:
+        if _capabilities is not None and not refresh:
+            return _capabilities
+        path = _locate_ffmpeg()
+        if path is None:
+            raise FileNotFoundError(
+                "未找到可用的 FFmpeg，请安装 FFmpeg 或将其放入 utils 目录。"
+            )
+        mtime_ns = os.stat(path).st_mtime_ns
+        capabilities = None if refresh else _load_persisted(path, mtime_ns)
+        if capabilities is None:
+            try:
+                capabilities = _probe(path, mtime_ns)
+            except (OSError, subprocess.SubprocessError) as e:
+                raise FileNotFoundError(f"FFmpeg 无法运行: {path}，错误信息: {e}")
+            _persist(capabilities)
+        _capabilities = capabilities
+        return capabilities
+
+
+def ffmpeg_path() -> str:
+    """
+    返回选用的 ffmpeg 可执行文件路径，所有 FFmpeg 命令都应以它开头。
+    """
+    return get_ffmpeg_capabilities().path
+
+
+def ffprobe_path() -> str:
+    """
+    返回与 ffmpeg 配套的 ffprobe 可执行文件路径。
+    """
+    return get_ffmpeg_capabilities().ffprobe
+
+
+def check_ffmpeg_installed() -> bool:
+    """
+    检测系统是否安装了 FFmpeg
+    :return: True 如果 FFmpeg 可用，否则 False
+    """
+    try:
+        get_ffmpeg_capabilities()
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def install_ffmpeg() -> bool:
+    """
+    根据操作系统自动安装 FFmpeg
+    :return: True 如果安装成功，否则 False
+    """
+    system = platform.system().lower()
+    logger.info(f"检测到操作系统: {system}")
+
+    try:
+        if system == "linux":
+            # 检测 Linux 发行版
+            if os.path.exists("/etc/debian_version"):
+                logger.info("使用 apt 安装 FFmpeg...")
+                subprocess.run(["sudo", "apt-get", "update"], check=True)
+                subprocess.run(
+                    ["sudo", "apt-get", "install", "-y", "ffmpeg"], check=True
+                )
+            elif os.path.exists("/etc/redhat-release"):
+                logger.info("使用 yum 安装 FFmpeg...")
+                subprocess.run(["sudo", "yum", "install", "-y", "ffmpeg"], check=True)
+            elif os.path.exists("/etc/arch-release"):
+                logger.info("使用 pacman 安装 FFmpeg...")
+                subprocess.run(
+                    ["sudo", "pacman", "-S", "--noconfirm", "ffmpeg"], check=True
+                )
+            else:
+                logger.error("未识别的 Linux 发行版，请手动安装 FFmpeg")
+                return False
+
+        elif system == "darwin":  # macOS
+            logger.info("使用 Homebrew 安装 FFmpeg...")
+            # 先检查是否安装了 Homebrew
+            brew_check = subprocess.run(["which", "brew"], capture_output=True)
+            if brew_check.returncode != 0:
+                logger.error(
+                    '未安装 Homebrew，请先安装: /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"'
+                )
+                return False
+            subprocess.run(["brew", "install", "ffmpeg"], check=True)
+
+        elif system == "windows":
+            logger.warning("Windows 系统暂不支持自动安装")
+            logger.info("请访问 https://ffmpeg.org/download.html 下载 FFmpeg")
+            logger.info("或使用 Chocolatey 安装: choco install ffmpeg")
+            return False
+
+        else:
+            logger.error(f"不支持的操作系统: {system}")
+            return False
+
+        # 验证安装是否成功（重新探测，新安装的可执行文件路径可能不同）
+        try:
+            get_ffmpeg_capabilities(refresh=True)
+        except FileNotFoundError:
+            logger.error("FFmpeg 安装失败，请手动安装")
+            return False
+        logger.info("FFmpeg 安装成功！")
+        return True
+
+    except subprocess.CalledProcessError as e:
+        logger.error(f"安装 FFmpeg 时出错: {e}")
+        return False
+    except Exception as e:
+        logger.error(f"未知错误: {e}")
+        return False
+
+
+def ensure_ffmpeg() -> FFmpegCapabilities:
+    """
+    确保 FFmpeg 可用，如果不可用则尝试安装
+    :return: 探测到的 FFmpeg 能力信息
+    """
+    if check_ffmpeg_installed():
+        capabilities = get_ffmpeg_capabilities()
+        logger.info(
+            f"FFmpeg 已安装 ✓ ({capabilities.version}, {capabilities.path}，"
+            f"MP3 编码器: {capabilities.mp3_encoder}，重采样器: {'/'.join(capabilities.resamplers)})"
+        )
+        return capabilities
+
+    logger.warning("未检测到 FFmpeg，准备自动安装...")
+    if not install_ffmpeg():
+        logger.error("FFmpeg 安装失败，程序无法继续运行")
+        sys.exit(1)
+    return get_ffmpeg_capabilities()
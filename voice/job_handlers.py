@@ -0,0 +1,172 @@
+"""
+常驻进程使用的单文件处理器：每种工具（to_hires、to_mp3、视频分段）一个处理器。
+处理器在进程启动时完成 FFmpeg 探测、打开转换缓存和任务日志，之后工作线程逐个文件调用，不再重复初始化。
+"""
+import os
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH, open_cache
+from convert_video_to_hires_audio import (
+    AUDIO_EXTENSIONS as VIDEO_TOOL_AUDIO_EXTENSIONS,
+    VIDEO_EXTENSIONS,
+    process_file,
+)
+from ffmpeg_runner import DEFAULT_STALL_TIMEOUT
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, get_ffmpeg_capabilities
+from job_journal import JOURNAL_FILENAME, open_journal, unit_id
+from media_scanner import ScannedFile, mirror_output_path
+from metrics import drain_records
+from split_encode import split_parts_for
+import to_hires
+import to_mp3
+
+# 支持的工具名称
+TOOLS = ("to_hires", "to_mp3", "video")
+
+
+class ToolHandler:
+    """
+    某个工具的单文件处理器，以 handler(scanned, resume) 调用，返回是否成功。
+    """
+
+    def __init__(
+        self,
+        tool: str,
+        output_dir: str,
+        use_cache: bool = True,
+        cache_path: str = DEFAULT_CACHE_PATH,
+        timeout: float | None = None,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+        split_long: float | None = None,
+        split_parts: int = DEFAULT_FFMPEG_LIMIT,
+        fused: bool = False,
+        copy_segments: bool = False,
+    ):
+        """
+        :param tool: 工具名称，见 TOOLS
+        :param output_dir: 输出目录，输入的相对目录结构镜像到这里
+        :param use_cache: 是否使用转换缓存
+        :param cache_path: 缓存数据库路径
+        :param timeout: 单个文件的墙钟时间预算（秒），仅音频转换使用
+        :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+        :param split_long: 时长超过该秒数的文件切成多段并行转换，仅音频转换使用
+        :param split_parts: 单个文件最多切成的段数
+        :param fused: 视频工具是否使用单遍模式
+        :param copy_segments: 视频工具对已压缩的音频输入是否流复制切分
+        :raises ValueError: 不支持的工具
+        :raises RuntimeError: to_mp3 没有可用的 MP3 编码器
+        """
+        if tool not in TOOLS:
+            raise ValueError(f"不支持的工具: {tool}，可选: {', '.join(TOOLS)}")
+        self.tool = tool
+        self.output_dir = output_dir
+        self.use_cache = use_cache
+        self.cache_path = cache_path
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.split_long = split_long
+        self.split_parts = split_parts
+        self.fused = fused
+        self.copy_segments = copy_segments
+        os.makedirs(output_dir, exist_ok=True)
+
+        # 进程内共享的单例在这里初始化一次，之后的每个文件直接使用
+        self.journal = open_journal(os.path.join(output_dir, JOURNAL_FILENAME))
+        self.cache = open_cache(cache_path) if use_cache else None
+        self.ffmpeg_path = None
+        if tool == "to_mp3":
+            capabilities = get_ffmpeg_capabilities()
+            if capabilities.mp3_encoder is None:
+                raise RuntimeError(f"当前 FFmpeg 没有可用的 MP3 编码器: {capabilities.path}")
+            self.ffmpeg_path = capabilities.path
+            if split_long is not None and capabilities.mp3_encoder != "libmp3lame":
+                logger.warning(
+                    f"MP3 编码器 {capabilities.mp3_encoder} 不支持分段编码，长文件将整体编码"
+                )
+                self.split_long = None
+
+    @staticmethod
+    def extensions_for(tool: str) -> tuple:
+        """
+        工具接受的输入扩展名（不需要创建处理器，如只扫描入队时）。
+        """
+        if tool == "video":
+            return VIDEO_EXTENSIONS + VIDEO_TOOL_AUDIO_EXTENSIONS
+        if tool == "to_mp3":
+            return to_mp3.AUDIO_EXTENSIONS
+        return (".mp3", ".wav")
+
+    @property
+    def extensions(self) -> tuple:
+        """
+        该工具接受的输入扩展名。
+        """
+        return self.extensions_for(self.tool)
+
+    def outputs(self, scanned: ScannedFile) -> list:
+        """
+        文件处理完成后的产物路径（绝对路径），尚未完成时返回空列表。
+        """
+        if self.tool == "video":
+            entry = self.journal.get(unit_id("video", scanned.path))
+            if entry is None or entry["state"] != "done":
+                return []
+            return entry.get("outputs", [])
+        extension = ".mp3" if self.tool == "to_mp3" else ".wav"
+        output_path = mirror_output_path(self.output_dir, scanned, extension)
+        return [os.path.abspath(output_path)] if os.path.isfile(output_path) else []
+
+    def __call__(self, scanned: ScannedFile, resume: bool = False) -> bool:
+        """
+        处理单个文件。
+        :param scanned: 输入文件及其相对输入根目录的路径
+        :param resume: 任务日志中已完成（且输出仍存在）时直接跳过
+        :return: True 如果处理成功、命中缓存或已经完成
+        """
+        try:
+            return self._process(scanned, resume)
+        finally:
+            # 常驻进程不导出性能报告，丢弃各阶段的统计记录，避免随处理的文件数增长
+            drain_records()
+
+    def _process(self, scanned: ScannedFile, resume: bool) -> bool:
+        input_path = scanned.path
+        if self.tool == "video":
+            process_file(
+                input_path,
+                self.output_dir,
+                self.fused,
+                False,
+                self.use_cache,
+                self.cache_path,
+                resume,
+                self.copy_segments,
+                scanned.relative_dir,
+            )
+            entry = self.journal.get(unit_id("video", input_path))
+            return entry is not None and entry["state"] == "done"
+
+        parts = split_parts_for(input_path, None, self.split_long, self.split_parts)
+        if self.tool == "to_mp3":
+            return to_mp3.convert_file(
+                input_path,
+                mirror_output_path(self.output_dir, scanned, ".mp3"),
+                self.ffmpeg_path,
+                self.cache,
+                self.journal,
+                resume,
+                self.timeout,
+                self.stall_timeout,
+                parts,
+            )
+        return to_hires.convert_file(
+            input_path,
+            mirror_output_path(self.output_dir, scanned, ".wav"),
+            self.cache,
+            self.journal,
+            resume,
+            self.timeout,
+            self.stall_timeout,
+            parts,
+        )
@@ -0,0 +1,159 @@
+"""
+批处理任务日志：以追加方式写入 JSONL，每条记录落盘（fsync）后才返回，进程崩溃后可据此续跑。
+输出文件先写入带 .part 后缀的临时文件，完成后再原子重命名，未完成的文件不会被误认为是成品。
+"""
+import json
+import os
+import socket
+import threading
+import time
+
+# 任务日志默认保存在输出目录下
+JOURNAL_FILENAME = ".itools_journal.jsonl"
+
+# 未完成输出的后缀，不以 .wav/.mp3 结尾，不会被目录扫描当作音频文件
+PARTIAL_SUFFIX = ".part"
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def partial_suffix() -> str:
+    """
+    临时文件的后缀，包含主机名和进程号：共享队列上租约过期后，原工作者和接手的工作者可能同时处理同一文件，
+    各自写入自己的临时文件，不会互相覆盖或删除对方写了一半的输出。
+    """
+    return f".{socket.gethostname()}-{os.getpid()}{PARTIAL_SUFFIX}"
+
+
+def partial_path(path: str) -> str:
+    """
+    返回输出文件对应的临时文件路径。
+    """
+    return path + partial_suffix()
+
+
+def commit_partial(path: str) -> None:
+    """
+    将临时文件原子重命名为正式输出。
+    """
+    os.replace(partial_path(path), path)
+
+
+def discard_partial(path: str) -> None:
+    """
+    删除未完成的临时文件（如果存在）。
+    """
+    try:
+        os.remove(partial_path(path))
+    except FileNotFoundError:
+        pass
+
+
+class JobJournal:
+    """
+    追加写入的任务状态日志，每个任务单元（unit）的最新状态以最后一条记录为准。
+    常用状态：started、done（附带 outputs）、failed，视频流水线另有 cut（附带 segments）。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._states, needs_newline = self._read()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        if needs_newline:
+            os.write(self._fd, b"\n")
+
+    def _read(self) -> tuple:
+        """
+        读取日志文件中每个任务单元的最新记录。
+        :return: (状态字典, 最后一行是否缺少换行符)
+        """
+        states = {}
+        needs_newline = False
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as f:
+                for line in f:
+                    needs_newline = not line.endswith(b"\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 崩溃时写了一半的行
+                    states[entry["unit"]] = entry
+        return states, needs_newline
+
+    def reload(self) -> None:
+        """
+        重新读取日志文件，获取其他进程（如进程池的子进程）追加的记录。
+        """
+        states, _ = self._read()
+        with self._lock:
+            self._states = states
+
+    def record(self, unit: str, state: str, **info) -> None:
+        """
+        追加一条状态记录并同步落盘。
+        :param unit: 任务单元标识
+        :param state: 状态
+        :param info: 附加信息，如 outputs、segments、error
+        """
+        entry = {"time": time.time(), "unit": unit, "state": state, **info}
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            os.write(self._fd, line)
+            os.fsync(self._fd)
+            self._states[unit] = entry
+
+    def get(self, unit: str) -> dict | None:
+        """
+        获取任务单元的最新状态记录。
+        """
+        with self._lock:
+            return self._states.get(unit)
+
+    def is_done(self, unit: str) -> bool:
+        """
+        任务单元已完成且记录的输出文件都还存在。
+        """
+        entry = self.get(unit)
+        if entry is None or entry["state"] != "done":
+            return False
+        return all(os.path.isfile(path) for path in entry.get("outputs", []))
+
+    def close(self) -> None:
+        """
+        关闭日志文件。
+        """
+        with self._lock:
+            os.close(self._fd)
+
+
+def open_journal(path: str) -> JobJournal:
+    """
+    获取当前进程内共享的任务日志实例。
+    """
+    key = (os.getpid(), os.path.abspath(path))
+    with _journals_lock:
+        if key not in _journals:
+            _journals[key] = JobJournal(path)
+        return _journals[key]
+
+
+def close_journal(path: str) -> None:
+    """
+    关闭并移除当前进程内共享的任务日志实例（如常驻服务淘汰不再使用的输出目录），之后 open_journal 会重新打开。
+    """
+    key = (os.getpid(), os.path.abspath(path))
+    with _journals_lock:
+        journal = _journals.pop(key, None)
+    if journal is not None:
+        journal.close()
+
+
+def unit_id(tool: str, input_path: str) -> str:
+    """
+    生成任务单元标识：工具名 + 输入文件绝对路径。
+    """
+    return f"{tool}:{os.path.abspath(input_path)}"
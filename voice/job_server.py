@@ -0,0 +1,439 @@
+"""
+本地任务服务：通过 HTTP（默认只监听 127.0.0.1）或 Unix socket 接收转换任务，在常驻工作池中按优先级执行。
+上游服务不再需要每个任务都启动一次 Python 进程（导入依赖、探测 FFmpeg），并发数也由这里统一控制。
+
+接口（请求和响应均为 JSON）：
+- POST /jobs                    提交任务：{"tool": "to_mp3", "input": "/data/a.wav", "output": "/data/out", "priority": 0}
+                                input 为目录时按扫描规则为每个文件提交一个任务；可选字段见 SUBMIT_FIELDS
+- GET  /jobs[?state=queued]     任务列表
+- GET  /jobs/<id>               任务状态
+- GET  /jobs/<id>/result[?wait=秒]  任务结果（产物路径）；未结束时返回 409，wait 指定时最多等待这么多秒
+- GET  /health                  工作池状态
+"""
+import argparse
+import json
+import os
+import signal
+import socketserver
+import threading
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH
+from ffmpeg_runner import DEFAULT_STALL_TIMEOUT
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ensure_ffmpeg, set_ffmpeg_limit
+from job_handlers import TOOLS, ToolHandler
+from job_journal import JOURNAL_FILENAME, close_journal
+from media_scanner import ScannedFile, iter_media_files
+from worker_pool import WorkerPool
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 请求体大小上限（字节）
+MAX_REQUEST_BYTES = 1024 * 1024
+# /result 的 wait 参数上限（秒）
+MAX_WAIT_SECONDS = 300
+# 保留的处理器数量（不同的工具、输出目录和选项组合），超过后淘汰最久未使用且没有未完成任务的处理器
+MAX_HANDLERS = 32
+
+# POST /jobs 接受的字段及类型，tool、input、output 之外均为可选
+SUBMIT_FIELDS = {
+    "tool": str,
+    "input": str,
+    "output": str,
+    "priority": int,
+    "resume": bool,
+    "recursive": bool,
+    "include": list,
+    "exclude": list,
+    "use_cache": bool,
+    "timeout": (int, float),
+    "split_long": (int, float),
+    "fused": bool,
+    "copy_segments": bool,
+}
+# 影响处理器配置的字段，相同配置的任务共用一个处理器
+_HANDLER_FIELDS = ("use_cache", "timeout", "split_long", "fused", "copy_segments")
+
+
+class JobService:
+    """
+    任务服务的核心：校验请求、复用处理器、提交到工作池。与传输方式（HTTP、Unix socket）无关。
+    """
+
+    def __init__(
+        self,
+        pool: WorkerPool,
+        cache_path: str = DEFAULT_CACHE_PATH,
+        stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+        split_parts: int = DEFAULT_FFMPEG_LIMIT,
+    ):
+        self.pool = pool
+        self.cache_path = cache_path
+        self.stall_timeout = stall_timeout
+        self.split_parts = split_parts
+        self._handlers = OrderedDict()  # 按最近使用排序
+        self._active = {}  # (工具, 输入路径, 输出目录) -> (排队或运行中的 Job, 处理器)
+        self._lock = threading.Lock()
+
+    def _handler(self, tool: str, output_dir: str, request: dict) -> ToolHandler:
+        """
+        获取（首次时创建）处理器：同一工具、输出目录和选项的任务共用缓存、任务日志和 FFmpeg 探测结果。
+        """
+        options = tuple(request.get(field) for field in _HANDLER_FIELDS)
+        key = (tool, output_dir, options)
+        with self._lock:
+            handler = self._handlers.get(key)
+            if handler is not None:
+                self._handlers.move_to_end(key)
+            else:
+                use_cache, timeout, split_long, fused, copy_segments = options
+                handler = ToolHandler(
+                    tool,
+                    output_dir,
+                    use_cache=True if use_cache is None else use_cache,
+                    cache_path=self.cache_path,
+                    timeout=timeout,
+                    stall_timeout=self.stall_timeout,
+                    split_long=split_long,
+                    split_parts=self.split_parts,
+                    fused=bool(fused),
+                    copy_segments=bool(copy_segments),
+                )
+                self._handlers[key] = handler
+                self._evict_handlers(key)
+            return handler
+
+    def _evict_handlers(self, keep: tuple) -> None:
+        """
+        处理器超过 MAX_HANDLERS 个时淘汰最久未使用且没有未完成任务的处理器（keep 为刚创建的处理器，不淘汰）；
+        没有其他处理器使用同一输出目录时一并关闭该目录的任务日志。调用方需持有 self._lock。
+        """
+        busy = {id(handler) for _, handler in self._active.values()}
+        for key in list(self._handlers):
+            if len(self._handlers) <= MAX_HANDLERS:
+                break
+            handler = self._handlers[key]
+            if key == keep or id(handler) in busy:
+                continue
+            del self._handlers[key]
+            if not any(other.output_dir == handler.output_dir for other in self._handlers.values()):
+                close_journal(os.path.join(handler.output_dir, JOURNAL_FILENAME))
+
+    def _forget(self, key: tuple, job) -> None:
+        with self._lock:
+            if self._active.get(key, (None,))[0] is job:
+                del self._active[key]
+
+    def submit(self, request: dict) -> list:
+        """
+        提交一个请求。
+        :param request: 请求字段见 SUBMIT_FIELDS
+        :return: 提交的 Job 列表
+        :raises ValueError: 请求不合法（字段缺失、类型错误、输入不存在等）
+        :raises RuntimeError: 处理器无法创建（如没有 MP3 编码器）或工作池已停止
+        """
+        if not isinstance(request, dict):
+            raise ValueError("请求体必须是 JSON 对象")
+        for field, value in request.items():
+            expected = SUBMIT_FIELDS.get(field)
+            if expected is None:
+                raise ValueError(f"未知字段: {field}")
+            # bool 是 int 的子类，数值字段不接受 true/false
+            if not isinstance(value, expected) or (
+                isinstance(value, bool) and expected is not bool
+            ):
+                raise ValueError(f"字段类型错误: {field}")
+        for field in ("tool", "input", "output"):
+            if field not in request:
+                raise ValueError(f"缺少字段: {field}")
+        tool = request["tool"]
+        if tool not in TOOLS:
+            raise ValueError(f"不支持的工具: {tool}，可选: {', '.join(TOOLS)}")
+        input_path = os.path.abspath(request["input"])
+        output_dir = os.path.abspath(request["output"])
+        if not os.path.exists(input_path):
+            raise ValueError(f"输入不存在: {input_path}")
+
+        handler = self._handler(tool, output_dir, request)
+        if os.path.isdir(input_path):
+            scanned_files = iter_media_files(
+                input_path,
+                handler.extensions,
+                request.get("include"),
+                request.get("exclude"),
+                request.get("recursive", True),
+                skip_dirs=[output_dir],
+            )
+        else:
+            scanned_files = [ScannedFile(input_path, os.path.basename(input_path))]
+
+        priority = request.get("priority", 0)
+        resume = request.get("resume", False)
+        jobs = []
+        reused = 0
+        for scanned in scanned_files:
+            # 同一输入和输出目录已有排队或运行中的任务时（如上游重试）直接返回该任务，
+            # 两个任务同时写同一输出会互相覆盖
+            key = (tool, scanned.path, output_dir)
+            with self._lock:
+                active = self._active.get(key)
+                if active is not None:
+                    jobs.append(active[0])
+                    reused += 1
+                    continue
+                job = self.pool.submit(
+                    _run_job,
+                    handler,
+                    scanned,
+                    resume,
+                    priority=priority,
+                    name=f"{tool}:{scanned.relative_path}",
+                    meta={"tool": tool, "input": scanned.path, "output": output_dir},
+                    on_done=lambda job, key=key: self._forget(key, job),
+                )
+                self._active[key] = (job, handler)
+            jobs.append(job)
+        logger.info(
+            f"已提交 {len(jobs) - reused} 个 {tool} 任务（优先级 {priority}）: {input_path}"
+            + (f"，{reused} 个已在处理中" if reused else "")
+        )
+        return jobs
+
+
+def _run_job(handler: ToolHandler, scanned: ScannedFile, resume: bool):
+    """
+    工作线程中执行一个任务，成功时返回产物路径列表，失败时返回 False。
+    """
+    if not handler(scanned, resume):
+        return False
+    return handler.outputs(scanned)
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "ITools"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def log_message(self, format, *args) -> None:
+        # Unix socket 没有客户端地址，不使用默认的 address_string
+        logger.debug(f"{self.command} {self.path} - {format % args}")
+
+    def _send_json(self, status: HTTPStatus, body) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: HTTPStatus, message: str) -> None:
+        self._send_json(status, {"error": message})
+
+    def _job_from_path(self, parts: list):
+        try:
+            job_id = int(parts[1])
+        except ValueError:
+            self._error(HTTPStatus.NOT_FOUND, f"无效的任务 ID: {parts[1]}")
+            return None
+        job = self.service.pool.get(job_id)
+        if job is None:
+            self._error(HTTPStatus.NOT_FOUND, f"任务不存在或记录已过期: {job_id}")
+        return job
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts == ["health"]:
+            self._send_json(HTTPStatus.OK, {"status": "ok", **self.service.pool.stats()})
+        elif parts == ["jobs"]:
+            state = query.get("state", [None])[0]
+            jobs = [
+                job.to_dict()
+                for job in self.service.pool.jobs()
+                if state is None or job.state == state
+            ]
+            self._send_json(HTTPStatus.OK, {"jobs": jobs})
+        elif len(parts) == 2 and parts[0] == "jobs":
+            job = self._job_from_path(parts)
+            if job is not None:
+                self._send_json(HTTPStatus.OK, job.to_dict())
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result":
+            job = self._job_from_path(parts)
+            if job is None:
+                return
+            try:
+                wait = min(float(query.get("wait", ["0"])[0]), MAX_WAIT_SECONDS)
+            except ValueError:
+                self._error(HTTPStatus.BAD_REQUEST, "wait 必须是数字")
+                return
+            if wait > 0:
+                job.wait(wait)
+            if job.finished is None:
+                self._send_json(HTTPStatus.CONFLICT, {"id": job.id, "state": job.state})
+                return
+            self._send_json(
+                HTTPStatus.OK,
+                {
+                    "id": job.id,
+                    "state": job.state,
+                    "outputs": job.result if job.finished_ok else [],
+                    "error": job.error,
+                },
+            )
+        else:
+            self._error(HTTPStatus.NOT_FOUND, f"未知路径: {url.path}")
+
+    def do_POST(self) -> None:
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            self._error(HTTPStatus.NOT_FOUND, f"未知路径: {self.path}")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_REQUEST_BYTES:
+            self._error(HTTPStatus.BAD_REQUEST, "请求体长度无效")
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b"null")
+        except (UnicodeDecodeError, json.JSONDecodeError) as e:
+            self._error(HTTPStatus.BAD_REQUEST, f"请求体不是合法的 JSON: {e}")
+            return
+        try:
+            jobs = self.service.submit(request)
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        except (RuntimeError, FileNotFoundError) as e:
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+            return
+        self._send_json(HTTPStatus.ACCEPTED, {"jobs": [job.to_dict() for job in jobs]})
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self) -> None:
+        socketserver.UnixStreamServer.server_bind(self)
+        # BaseHTTPRequestHandler 需要这两个属性
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def create_server(service: JobService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, socket_path=None):
+    """
+    创建 HTTP 服务（尚未开始处理请求）。
+    :param socket_path: 指定时监听该 Unix socket，忽略 host 和 port
+    """
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)  # 上次运行留下的 socket 文件
+        server = _ThreadingUnixHTTPServer(socket_path, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+        server.daemon_threads = True
+    server.service = service
+    return server
+
+
+def serve(
+    host: str = DEFAULT_HOST,
+    port: int = DEFAULT_PORT,
+    socket_path: str | None = None,
+    workers: int = DEFAULT_FFMPEG_LIMIT,
+    max_ffmpeg: int = DEFAULT_FFMPEG_LIMIT,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> None:
+    """
+    运行任务服务，直到收到 SIGTERM/SIGINT：停止接收请求并等待已提交的任务完成，再次收到信号则取消排队中的任务。
+    需要在主线程调用。
+    :param host: 监听地址
+    :param port: 监听端口
+    :param socket_path: 指定时改为监听 Unix socket
+    :param workers: 常驻工作线程数（同时处理的文件数）
+    :param max_ffmpeg: 全局同时运行的 FFmpeg 进程上限
+    :param cache_path: 缓存数据库路径
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    """
+    set_ffmpeg_limit(max_ffmpeg)
+    pool = WorkerPool(workers, name="job")
+    server = create_server(
+        JobService(pool, cache_path, stall_timeout, max_ffmpeg), host, port, socket_path
+    )
+    stop = threading.Event()
+    abort = threading.Event()
+
+    def on_signal(signum, frame):
+        if stop.is_set():
+            abort.set()
+        stop.set()
+
+    previous = {
+        signum: signal.signal(signum, on_signal) for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    thread = threading.Thread(target=server.serve_forever, name="job-server", daemon=True)
+    thread.start()
+    logger.info(
+        f"任务服务已启动: {socket_path or f'http://{host}:{server.server_port}'}（{workers} 个工作线程）"
+    )
+    try:
+        while not stop.wait(0.5):
+            pass
+        server.shutdown()
+        pending = pool.pending()
+        if pending:
+            logger.info(f"停止接收任务，等待 {pending} 个任务完成（再次发送停止信号取消排队中的任务）")
+        pool.drain(abort)
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    logger.info("任务服务已停止")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="本地任务服务：通过 HTTP 或 Unix socket 提交转换任务")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="监听端口")
+    parser.add_argument("--socket", default=None, help="监听 Unix socket 而不是 TCP 端口")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_FFMPEG_LIMIT, help="常驻工作线程数（同时处理的文件数）"
+    )
+    parser.add_argument(
+        "--max-ffmpeg",
+        type=int,
+        default=DEFAULT_FFMPEG_LIMIT,
+        help="全局同时运行的 FFmpeg 进程上限",
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    args = parser.parse_args()
+
+    # 首先检测并确保 FFmpeg 已安装
+    ensure_ffmpeg()
+
+    serve(
+        args.host,
+        args.port,
+        args.socket,
+        workers=args.workers,
+        max_ffmpeg=args.max_ffmpeg,
+        stall_timeout=args.stall_timeout,
+    )
@@ -0,0 +1,173 @@
+"""
+输入目录扫描：基于 os.scandir 的迭代式递归遍历，边遍历边产出文件，调用方可以在完整列表出来之前就开始处理。
+- 扩展名匹配不区分大小写；--include/--exclude 通配符匹配相对路径或文件名（区分大小写），排除的目录整棵跳过
+- 子目录使用 DirEntry 缓存的类型信息判断，不逐个 stat；同一目录内按名称排序，遍历顺序稳定
+- 输出按输入的相对目录结构镜像到输出目录，输出目录位于输入目录内时自动跳过，不会把产物当作输入
+"""
+import fnmatch
+import os
+import re
+from typing import Iterator, NamedTuple
+
+from loguru import logger
+
+
+class ScannedFile(NamedTuple):
+    path: str  # 文件路径（以输入根目录开头）
+    relative_path: str  # 相对输入根目录的路径，使用 "/" 分隔
+
+    @property
+    def relative_dir(self) -> str:
+        """
+        文件所在目录相对输入根目录的路径，根目录下的文件为空字符串。
+        """
+        return os.path.dirname(self.relative_path)
+
+
+def _compile_globs(patterns) -> re.Pattern | None:
+    """
+    把一组通配符编译为一个正则表达式，每个路径只需匹配一次。
+    """
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{fnmatch.translate(pattern)})" for pattern in patterns))
+
+
+def _matches(pattern: re.Pattern | None, relative_path: str, name: str) -> bool:
+    return pattern is not None and bool(
+        pattern.match(relative_path) or pattern.match(name)
+    )
+
+
+class ScanFilter:
+    """
+    扫描规则：扩展名、--include、--exclude。
+    目录扫描逐个目录应用这些规则；监视模式下单个文件事件用 accepts 判断，两者结果一致。
+    """
+
+    def __init__(self, extensions: tuple, include=None, exclude=None):
+        self.extensions = tuple(extension.lower() for extension in extensions)
+        self.include = _compile_globs(include)
+        self.exclude = _compile_globs(exclude)
+
+    def excludes(self, relative_path: str, name: str) -> bool:
+        """
+        文件或目录是否被 --exclude 排除。
+        """
+        return _matches(self.exclude, relative_path, name)
+
+    def wants_file(self, relative_path: str, name: str) -> bool:
+        """
+        未被排除的文件是否满足扩展名和 --include。
+        """
+        if not name.lower().endswith(self.extensions):
+            return False
+        return self.include is None or _matches(self.include, relative_path, name)
+
+    def accepts(self, relative_path: str) -> bool:
+        """
+        判断单个相对路径是否会被目录扫描产出（任何一级上级目录被排除时也不产出）。
+        """
+        parts = relative_path.split("/")
+        prefix = ""
+        for part in parts[:-1]:
+            prefix += part
+            if self.excludes(prefix, part):
+                return False
+            prefix += "/"
+        name = parts[-1]
+        return not self.excludes(relative_path, name) and self.wants_file(relative_path, name)
+
+
+def iter_media_files(
+    root: str,
+    extensions: tuple,
+    include=None,
+    exclude=None,
+    recursive: bool = True,
+    skip_dirs=(),
+) -> Iterator[ScannedFile]:
+    """
+    遍历输入目录，逐个产出扩展名匹配的文件。
+    :param root: 输入根目录
+    :param extensions: 需要的扩展名，如 (".mp3", ".wav")，不区分大小写
+    :param include: 通配符列表，指定时只保留匹配的文件
+    :param exclude: 通配符列表，匹配的文件和目录被跳过
+    :param recursive: 是否进入子目录（不跟随指向目录的符号链接）
+    :param skip_dirs: 不进入的目录，如位于输入目录内的输出目录
+    :return: ScannedFile 的迭代器
+    """
+    return iter_scan(root, ScanFilter(extensions, include, exclude), recursive, skip_dirs)
+
+
+def iter_scan(
+    root: str, scan_filter: ScanFilter, recursive: bool = True, skip_dirs=(), prefix: str = ""
+) -> Iterator[ScannedFile]:
+    """
+    按已编译的扫描规则遍历目录，参数同 iter_media_files。
+    :param prefix: root 相对输入根目录的路径（以 "/" 结尾），扫描子树时使用
+    """
+    skip = {os.path.realpath(path) for path in skip_dirs}
+
+    stack = [(root, prefix)]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            with os.scandir(directory) as iterator:
+                entries = sorted(iterator, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"无法读取目录: {directory}，错误信息: {e}")
+            continue
+
+        subdirs = []
+        for entry in entries:
+            relative_path = prefix + entry.name
+            if scan_filter.excludes(relative_path, entry.name):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive and (not skip or os.path.realpath(entry.path) not in skip):
+                        subdirs.append((entry.path, relative_path + "/"))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if scan_filter.wants_file(relative_path, entry.name):
+                yield ScannedFile(entry.path, relative_path)
+        # 逆序入栈，按名称顺序深度优先遍历
+        stack.extend(reversed(subdirs))
+
+
+def mirror_output_path(output_dir: str, scanned: ScannedFile, extension: str) -> str:
+    """
+    按输入的相对目录结构生成输出路径，只替换扩展名，并确保输出子目录存在。
+    :param output_dir: 输出根目录
+    :param scanned: 扫描得到的输入文件
+    :param extension: 输出扩展名，如 ".wav"
+    """
+    directory = os.path.join(output_dir, scanned.relative_dir)
+    os.makedirs(directory, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(scanned.relative_path))[0]
+    return os.path.join(directory, stem + extension)
+
+
+def add_scan_arguments(parser) -> None:
+    """
+    为命令行解析器添加目录扫描相关的参数：--include、--exclude、--no-recursive。
+    """
+    parser.add_argument(
+        "--include",
+        action="append",
+        default=None,
+        help="只处理匹配的文件（通配符，匹配相对路径或文件名），可重复指定",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=None,
+        help="跳过匹配的文件或目录（通配符，匹配相对路径或名称），可重复指定",
+    )
+    parser.add_argument(
+        "--no-recursive", action="store_true", help="只处理输入目录顶层的文件，不进入子目录"
+    )
@@ -0,0 +1,214 @@
+"""
+各处理阶段的性能统计：记录墙钟时间、子进程 CPU 时间、输入/输出字节数、处理的音频时长和实时倍率，
+并导出为 JSON 运行报告和 Prometheus textfile，便于定位瓶颈阶段和监控吞吐回退。
+子进程 CPU 时间取自 RUSAGE_CHILDREN 的差值，多个阶段在线程中并发时只能近似归属；Windows 上不可用，记为 None。
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from segmenter import wav_duration_seconds
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，子进程 CPU 时间记为不可用
+    resource = None
+
+REPORT_FILENAME = "run_report.json"
+PROMETHEUS_FILENAME = "itools.prom"
+
+# 批处理运行结束时由 export_report 取出；常驻进程不导出报告，由 job_handlers.ToolHandler 每处理完一个文件清空
+_records = []
+_records_lock = threading.Lock()
+
+
+class StageMetrics:
+    """
+    单次阶段执行的统计，由 measure() 创建，调用方在 with 块内补充输出文件或音频时长。
+    """
+
+    def __init__(self, stage: str, input_path: str | None):
+        self.stage = stage
+        self.input_path = input_path
+        self.outputs = []
+        self.audio_seconds = None  # 未设置时根据输出的 WAV 头部计算
+        self.status = "ok"
+
+    def fail(self) -> None:
+        self.status = "error"
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _children_cpu_seconds() -> float | None:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+@contextmanager
+def measure(stage: str, input_path: str | None = None):
+    """
+    统计一个阶段的执行情况，异常时记为失败并继续抛出。
+    :param stage: 阶段名称，如 convert_audio_to_wav
+    :param input_path: 输入文件路径，用于统计输入字节数
+    """
+    metrics = StageMetrics(stage, input_path)
+    wall_start = time.perf_counter()
+    cpu_start = _children_cpu_seconds()
+    try:
+        yield metrics
+    except BaseException:
+        metrics.fail()
+        raise
+    finally:
+        wall = time.perf_counter() - wall_start
+        audio_seconds = metrics.audio_seconds
+        if audio_seconds is None and metrics.status == "ok":
+            durations = [
+                wav_duration_seconds(path)
+                for path in metrics.outputs
+                if path.lower().endswith(".wav")
+            ]
+            audio_seconds = sum(d for d in durations if d is not None) or None
+        record = {
+            "stage": stage,
+            "status": metrics.status,
+            "input": input_path,
+            "wall_seconds": wall,
+            "child_cpu_seconds": (
+                _children_cpu_seconds() - cpu_start if cpu_start is not None else None
+            ),
+            "bytes_in": _file_size(input_path) if input_path else 0,
+            "bytes_out": sum(_file_size(path) for path in metrics.outputs),
+            "audio_seconds": audio_seconds,
+            "realtime_factor": audio_seconds / wall if audio_seconds and wall else None,
+        }
+        with _records_lock:
+            _records.append(record)
+
+
+def drain_records() -> list:
+    """
+    取出并清空当前进程内的记录（进程池的子进程用它把记录带回主进程）。
+    """
+    with _records_lock:
+        records = list(_records)
+        _records.clear()
+    return records
+
+
+def add_records(records: list) -> None:
+    """
+    合并其他进程带回的记录。
+    """
+    with _records_lock:
+        _records.extend(records)
+
+
+def summarize(records: list) -> dict:
+    """
+    按阶段汇总记录。
+    :return: {stage: {jobs, errors, wall_seconds, child_cpu_seconds, bytes_in, bytes_out, audio_seconds, realtime_factor}}
+    """
+    summary = {}
+    for record in records:
+        stage = summary.setdefault(
+            record["stage"],
+            {
+                "jobs": 0,
+                "errors": 0,
+                "wall_seconds": 0.0,
+                "child_cpu_seconds": 0.0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "audio_seconds": 0.0,
+            },
+        )
+        stage["jobs"] += 1
+        stage["errors"] += record["status"] != "ok"
+        for key in ("wall_seconds", "bytes_in", "bytes_out"):
+            stage[key] += record[key]
+        if record["child_cpu_seconds"] is None or stage["child_cpu_seconds"] is None:
+            stage["child_cpu_seconds"] = None
+        else:
+            stage["child_cpu_seconds"] += record["child_cpu_seconds"]
+        stage["audio_seconds"] += record["audio_seconds"] or 0.0
+    for stage in summary.values():
+        stage["realtime_factor"] = (
+            stage["audio_seconds"] / stage["wall_seconds"]
+            if stage["wall_seconds"]
+            else None
+        )
+    return summary
+
+
+def _write_atomic(path: str, content: str) -> None:
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(temp_path, path)
+
+
+def _prometheus_text(summary: dict, run_wall_seconds: float) -> str:
+    metrics = [
+        ("jobs", "itools_stage_jobs", "阶段执行次数"),
+        ("errors", "itools_stage_errors", "阶段失败次数"),
+        ("wall_seconds", "itools_stage_wall_seconds", "阶段累计墙钟时间"),
+        ("child_cpu_seconds", "itools_stage_child_cpu_seconds", "阶段子进程 CPU 时间"),
+        ("bytes_in", "itools_stage_bytes_in", "阶段输入字节数"),
+        ("bytes_out", "itools_stage_bytes_out", "阶段输出字节数"),
+        ("audio_seconds", "itools_stage_audio_seconds", "阶段处理的音频时长"),
+        ("realtime_factor", "itools_stage_realtime_factor", "音频时长 / 墙钟时间"),
+    ]
+    lines = []
+    for key, name, help_text in metrics:
+        lines.append(f"# HELP {name} 最近一次运行的{help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        for stage, values in sorted(summary.items()):
+            if values[key] is not None:
+                lines.append(f'{name}{{stage="{stage}"}} {values[key]}')
+    lines.append("# HELP itools_run_wall_seconds 最近一次运行的总墙钟时间")
+    lines.append("# TYPE itools_run_wall_seconds gauge")
+    lines.append(f"itools_run_wall_seconds {run_wall_seconds}")
+    lines.append("# HELP itools_run_timestamp_seconds 最近一次运行的结束时间")
+    lines.append("# TYPE itools_run_timestamp_seconds gauge")
+    lines.append(f"itools_run_timestamp_seconds {time.time()}")
+    return "\n".join(lines) + "\n"
+
+
+def export_report(metrics_dir: str, tool: str, run_wall_seconds: float) -> dict:
+    """
+    将本次运行的记录导出为 JSON 报告和 Prometheus textfile，并清空记录。
+    :param metrics_dir: 导出目录
+    :param tool: 工具名称
+    :param run_wall_seconds: 整个运行的墙钟时间
+    :return: 报告内容
+    """
+    records = drain_records()
+    summary = summarize(records)
+    report = {
+        "tool": tool,
+        "finished_at": time.time(),
+        "run_wall_seconds": run_wall_seconds,
+        "stages": summary,
+        "records": records,
+    }
+    os.makedirs(metrics_dir, exist_ok=True)
+    _write_atomic(
+        os.path.join(metrics_dir, REPORT_FILENAME),
+        json.dumps(report, ensure_ascii=False, indent=2),
+    )
+    _write_atomic(
+        os.path.join(metrics_dir, PROMETHEUS_FILENAME),
+        _prometheus_text(summary, run_wall_seconds),
+    )
+    return report
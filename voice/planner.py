@@ -0,0 +1,280 @@
+"""
+批处理的规划阶段：并发 ffprobe 所有输入（结果缓存在转换缓存数据库中），得到时长、编码和采样率，
+按时长从长到短排列任务（最长处理时间优先，缩短整批的完成时间），并在开始转换前估算墙钟时间和输出占用的磁盘空间。
+run_batch 是各目录批处理工具（to_hires、to_mp3、fan_out）共用的扫描、规划、并发转换和汇总流程。
+"""
+import asyncio
+import heapq
+import json
+import os
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH, open_cache
+from ffmpeg_runner import run_bounded
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ffprobe_path
+from media_scanner import ScannedFile, iter_media_files
+from metrics import export_report
+
+# 各工具每秒音频的输出字节数
+ESTIMATED_BYTES_PER_SECOND = {
+    "to_hires": 96000 * 4 * 2,  # 96kHz × 32bit × 双声道 ≈ 768KB/s
+    "to_mp3": 190 * 1000 // 8,  # -q:a 2 的 VBR 平均码率约 190kbps
+}
+
+# 单个工作者的处理速度（音频时长 / 墙钟时间），可用 benchmark.py 在目标机器上实测后通过参数覆盖
+DEFAULT_REALTIME_FACTORS = {
+    "to_hires": 100.0,
+    "to_mp3": 40.0,
+}
+
+
+class MediaInfo(NamedTuple):
+    path: str
+    duration: float | None  # 秒，探测失败时为 None
+    codec: str | None
+    sample_rate: int | None
+    channels: int | None
+    size: int
+
+
+class BatchEstimate(NamedTuple):
+    files: int
+    audio_seconds: float
+    wall_seconds: float  # 按最长优先分配到各工作者后的完成时间
+    output_bytes: int
+    unknown: int  # 无法探测时长的文件数
+
+
+def probe_media(path: str) -> dict:
+    """
+    使用 ffprobe 获取第一条音频流的编码、采样率、声道数和文件时长。
+    :return: {"duration", "codec", "sample_rate", "channels"}，缺失的字段为 None
+    """
+    result = subprocess.run(
+        [
+            ffprobe_path(),
+            "-v",
+            "error",
+            "-select_streams",
+            "a:0",
+            "-show_entries",
+            "format=duration:stream=codec_name,sample_rate,channels",
+            "-of",
+            "json",
+            path,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=60,
+    )
+    data = json.loads(result.stdout)
+    if not isinstance(data, dict):
+        raise ValueError(f"无法解析 ffprobe 输出: {result.stdout.strip()}")
+    stream = (data.get("streams") or [{}])[0]
+    duration = data.get("format", {}).get("duration")
+    sample_rate = stream.get("sample_rate")
+    return {
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "codec": stream.get("codec_name"),
+        "sample_rate": int(sample_rate) if sample_rate else None,
+        "channels": stream.get("channels"),
+    }
+
+
+def _media_info(path: str, cache) -> MediaInfo:
+    info = cache.lookup_probe(path) if cache is not None else None
+    if info is None:
+        try:
+            info = probe_media(path)
+        except (OSError, ValueError, subprocess.SubprocessError) as e:
+            logger.warning(f"无法获取媒体信息: {path}，错误信息: {e}")
+            info = {"duration": None, "codec": None, "sample_rate": None, "channels": None}
+        else:
+            if cache is not None:
+                cache.store_probe(path, info)
+    return MediaInfo(path=path, size=os.path.getsize(path), **info)
+
+
+def plan_inputs(
+    paths: list,
+    cache_path: str | None = DEFAULT_CACHE_PATH,
+    max_workers: int = DEFAULT_FFMPEG_LIMIT,
+) -> list:
+    """
+    探测所有输入并按时长从长到短排序，无法探测时长的文件按文件大小排在最后。
+    :param paths: 输入文件路径列表
+    :param cache_path: 缓存数据库路径，为 None 时不缓存探测结果
+    :param max_workers: 同时运行的 ffprobe 数量
+    :return: 排好序的 MediaInfo 列表
+    """
+    cache = open_cache(cache_path) if cache_path else None
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        infos = list(pool.map(lambda path: _media_info(path, cache), paths))
+    return sorted(
+        infos,
+        key=lambda info: (info.duration is not None, info.duration or 0, info.size),
+        reverse=True,
+    )
+
+
+def estimate_batch(
+    infos: list, workers: int, bytes_per_second: int, realtime_factor: float
+) -> BatchEstimate:
+    """
+    估算整批的墙钟时间和输出大小：按给定顺序把每个任务分配给当前负载最小的工作者。
+    :param infos: plan_inputs 返回的列表
+    :param workers: 工作者数量
+    :param bytes_per_second: 每秒音频的输出字节数
+    :param realtime_factor: 单个工作者的处理速度（音频时长 / 墙钟时间）
+    """
+    loads = [0.0] * max(1, workers)
+    audio_seconds = 0.0
+    unknown = 0
+    for info in infos:
+        if info.duration is None:
+            unknown += 1
+            continue
+        audio_seconds += info.duration
+        heapq.heapreplace(loads, loads[0] + info.duration / realtime_factor)
+    return BatchEstimate(
+        files=len(infos),
+        audio_seconds=audio_seconds,
+        wall_seconds=max(loads),
+        output_bytes=int(audio_seconds * bytes_per_second),
+        unknown=unknown,
+    )
+
+
+def log_estimate(estimate: BatchEstimate, workers: int) -> None:
+    """
+    输出预估结果，便于在开始前确认磁盘空间和批处理时间窗口。
+    """
+    logger.info(
+        f"预估: {estimate.files} 个文件，音频总时长 {estimate.audio_seconds / 3600:.2f} 小时，"
+        f"{workers} 个工作者约需 {estimate.wall_seconds / 60:.1f} 分钟，"
+        f"输出约 {estimate.output_bytes / (1 << 30):.2f} GB"
+    )
+    if estimate.unknown:
+        logger.warning(f"{estimate.unknown} 个文件无法获取时长，未计入预估")
+
+
+def run_batch(
+    tool: str,
+    input_dir: str,
+    extensions: tuple,
+    skip_dirs: Iterable[str],
+    make_jobs: Callable[[Iterable[ScannedFile], dict, dict], Iterator[tuple]],
+    action: str,
+    bytes_per_second: int,
+    realtime_factor: float,
+    max_workers: int = DEFAULT_FFMPEG_LIMIT,
+    cache_path: str | None = DEFAULT_CACHE_PATH,
+    metrics_dir: str | None = None,
+    plan: bool = True,
+    dry_run: bool = False,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    prepare: Callable[[], bool] | None = None,
+    unit_label: str = "文件",
+) -> list:
+    """
+    目录批处理的公共流程：扫描输入，可选地探测所有输入、按时长从长到短排序并输出预估，
+    然后以给定并发数运行转换任务，汇总跳过和失败的文件并导出性能报告。
+    :param tool: 工具名称，用于性能报告
+    :param input_dir: 输入目录（调用方已检查存在）
+    :param extensions: 需要处理的文件扩展名（不区分大小写）
+    :param skip_dirs: 扫描时跳过的目录（输出目录位于输入目录内时）
+    :param make_jobs: make_jobs(scanned_files, durations, counts) 逐个产出 (输入路径, 返回协程的无参函数)；
+        durations 为规划得到的 {路径: 时长}，不规划时为空；跳过的输入在 counts["resumed"]（上次已完成）
+        或 counts["skipped"]（命中缓存）中计数
+    :param action: 日志中的动作描述，如 "转换为 MP3"
+    :param bytes_per_second: 预估使用的每秒音频输出字节数
+    :param realtime_factor: 预估使用的单个工作者处理速度
+    :param max_workers: 同时运行的转换任务数（同时也是规划阶段的 ffprobe 并发数）
+    :param cache_path: 缓存探测结果的数据库路径，为 None 时不缓存
+    :param metrics_dir: 性能报告的导出目录，None 表示不导出
+    :param plan: 是否先探测所有输入并输出预估，为 False 时边扫描边提交任务
+    :param dry_run: 只输出预估，不进行转换
+    :param recursive: 是否递归扫描子目录
+    :param include: 只处理匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :param prepare: 预估之后、开始转换之前调用（dry_run 时不调用），返回 False 时放弃本次运行
+    :param unit_label: 跳过计数的单位，如 "文件" 或 "输出"
+    :return: 转换失败的输入文件路径列表
+    """
+    scanned_files = iter_media_files(
+        input_dir, extensions, include, exclude, recursive, skip_dirs=skip_dirs
+    )
+    missing = f"目录中没有找到音频文件 ({' 或 '.join(extensions)}): {input_dir}"
+
+    durations = {}
+    if plan or dry_run:
+        scanned_files = list(scanned_files)
+        if not scanned_files:
+            logger.warning(missing)
+            return []
+        logger.info(f"找到 {len(scanned_files)} 个音频文件，开始{action}...")
+
+        # 最长的文件最先开始，避免最后才开始的长文件拖长整批的完成时间
+        media = plan_inputs([scanned.path for scanned in scanned_files], cache_path, max_workers)
+        log_estimate(
+            estimate_batch(media, max_workers, bytes_per_second, realtime_factor), max_workers
+        )
+        if dry_run:
+            return []
+        by_path = {scanned.path: scanned for scanned in scanned_files}
+        scanned_files = [by_path[info.path] for info in media]
+        durations = {info.path: info.duration for info in media}
+    else:
+        logger.info(f"边扫描边{action}: {input_dir}")
+
+    if prepare is not None and not prepare():
+        return []
+
+    submitted = []
+    counts = {"found": 0, "resumed": 0, "skipped": 0}
+
+    def iter_found():
+        for scanned in scanned_files:
+            counts["found"] += 1
+            yield scanned
+
+    def iter_factories():
+        # 在 run_bounded 的线程中逐个产出任务，不需要等目录扫描完成
+        for input_path, factory in make_jobs(iter_found(), durations, counts):
+            submitted.append(input_path)
+            yield factory
+
+    # 使用 asyncio 驱动 FFmpeg 并发转换，收集每个任务的结果
+    run_start = time.perf_counter()
+    results = asyncio.run(run_bounded(iter_factories(), max_workers))
+    if not counts["found"]:
+        logger.warning(missing)
+        return []
+    if counts["resumed"]:
+        logger.info(f"{counts['resumed']} 个{unit_label}在上次运行中已完成，已跳过")
+    if counts["skipped"]:
+        logger.info(f"{counts['skipped']} 个{unit_label}命中缓存，已跳过")
+    failed = []
+    for input_path, result in zip(submitted, results):
+        if isinstance(result, BaseException):
+            logger.error(f"转换失败: {input_path}，错误信息: {result}")
+            failed.append(input_path)
+        elif not result.ok:
+            failed.append(input_path)
+
+    if failed:
+        logger.warning(f"{len(failed)} 个文件转换失败: {failed}")
+    logger.info("所有音频转换完成！")
+    if metrics_dir:
+        export_report(metrics_dir, tool, time.perf_counter() - run_start)
+        logger.info(f"性能报告已导出至: {metrics_dir}")
+    return failed
@@ -0,0 +1,164 @@
+"""
+片段名称分配：随机生成三字中文歌曲名作为片段文件名，并保证同一目录中不会重名。
+词表的累计权重只计算一次，加权抽样用二分查找；名字按批生成，已使用的名字按目录记录，
+目录中已有的文件（包括未完成的 .part 文件）在第一次分配时读入，长时间运行也不会覆盖之前的片段。
+"""
+import os
+import random
+import threading
+from bisect import bisect_left
+from collections import deque
+from itertools import accumulate
+
+# 词表和权重：第一个词按权重抽取，后两个词等概率不重复抽取
+NAME_WORDS = (
+    ("巍峨", 2),
+    ("峻峭", 1.9),
+    ("雄浑", 1.8),
+    ("广袤", 1.7),
+    ("缥缈", 1.9),
+    ("阴森", 1.6),
+    ("浩渺", 1.8),
+    ("幽僻", 1.5),
+    ("峰峦", 1.7),
+    ("山涧", 1.6),
+    ("湖泊", 1.7),
+    ("溪流", 1.6),
+    ("沼泽", 1.5),
+    ("旷野", 1.4),
+    ("山岗", 1.3),
+    ("山巅", 1.4),
+    ("险嶂", 1.3),
+    ("洼地", 1.2),
+    ("深渊", 1.1),
+    ("礁石", 1.0),
+    ("霹雳", 1.6),
+    ("暴雪", 1.5),
+    ("晨霜", 1.4),
+    ("朝露", 1.3),
+    ("暮霭", 1.2),
+    ("惊澜", 1.5),
+    ("涟漪", 1.4),
+    ("沙砾", 1.1),
+    ("峭壁", 1.2),
+)
+
+# 名称格式，等概率选择
+NAME_PATTERNS = (
+    "{first}{second}的{third}",
+    "{first}与{second}{third}",
+    "{second}中{second}{third}",
+    "{first}{second}{third}",
+)
+
+# 每批生成的名字数量
+NAME_BATCH_SIZE = 64
+# 连续抽到这么多已使用的名字后视为名字空间接近用尽，改为在名字后追加序号
+MAX_NAME_DRAWS = 256
+
+
+class NameAllocator:
+    """
+    加权随机名称生成器，词表的累计权重在创建时计算一次。
+    """
+
+    def __init__(self, words=NAME_WORDS, patterns=NAME_PATTERNS, rng=random):
+        """
+        :param words: 词和权重的序列 [(词, 权重), ...]
+        :param patterns: 名称格式，使用 {first}、{second}、{third} 占位
+        :param rng: 随机数来源，默认使用 random 模块的全局状态（random.seed 对其生效）
+        """
+        self._words = [word for word, _ in words]
+        self._cumulative = list(accumulate(weight for _, weight in words))
+        self._patterns = list(patterns)
+        self._rng = rng
+
+    def draw(self) -> str:
+        """
+        随机生成一个名字（不保证唯一）。
+        """
+        rng = self._rng
+        index = bisect_left(self._cumulative, rng.random() * self._cumulative[-1])
+        second, third = rng.sample(self._words, 2)  # 防止重复
+        return rng.choice(self._patterns).format(
+            first=self._words[index], second=second, third=third
+        )
+
+    def batch(self, count: int) -> list:
+        """
+        一次生成 count 个名字（不保证唯一）。
+        """
+        return [self.draw() for _ in range(count)]
+
+
+DEFAULT_ALLOCATOR = NameAllocator()
+
+
+class UniqueNames:
+    """
+    为一组目录分配互不重复、也不与目录中已有文件重名的名字，以 names() 调用。
+    同一组目录的所有片段应使用同一个实例；实例是线程安全的。
+    """
+
+    def __init__(
+        self,
+        directories,
+        allocator: NameAllocator = DEFAULT_ALLOCATOR,
+        batch_size: int = NAME_BATCH_SIZE,
+    ):
+        """
+        :param directories: 名字需要在其中唯一的目录，片段和由它派生的文件（如音质提升结果）所在的目录
+        :param allocator: 名称生成器
+        :param batch_size: 每批生成的名字数量
+        """
+        self._allocator = allocator
+        self._batch_size = batch_size
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self.used = set()
+        for directory in directories:
+            self.reserve_existing(directory)
+
+    def reserve_existing(self, directory: str) -> None:
+        """
+        把目录中已有文件的名字（去掉所有扩展名）标记为已使用，目录不存在时忽略。
+        """
+        try:
+            with os.scandir(directory) as entries:
+                names = [entry.name.split(".", 1)[0] for entry in entries]
+        except FileNotFoundError:
+            return
+        with self._lock:
+            self.used.update(names)
+
+    def __call__(self) -> str:
+        """
+        分配一个新名字。
+        """
+        with self._lock:
+            for _ in range(MAX_NAME_DRAWS):
+                if not self._pending:
+                    self._pending.extend(self._allocator.batch(self._batch_size))
+                name = self._pending.popleft()
+                if name not in self.used:
+                    break
+            else:
+                base, suffix = name, 2
+                while f"{base}_{suffix}" in self.used:
+                    suffix += 1
+                name = f"{base}_{suffix}"
+            self.used.add(name)
+            return name
+
+    def take(self, count: int) -> list:
+        """
+        一次分配 count 个互不重复的名字。
+        """
+        return [self() for _ in range(count)]
+
+
+def unique_names(*directories: str) -> UniqueNames:
+    """
+    创建在给定目录中唯一的名称分配器。
+    """
+    return UniqueNames(directories)
@@ -0,0 +1,539 @@
+"""
+流式音频分割工具：按块读取 PCM 数据，边读边写出片段，峰值内存与输入时长无关。
+WAV 输入通过 mmap 直接访问数据区，其他格式通过 FFmpeg 管道解码为 PCM 后按块读取。
+已压缩的音频（mp3/aac/flac）还可以不解码，直接用 segment 复用器按帧边界流复制切分。
+"""
+import csv
+import json
+import mmap
+import os
+import random
+import struct
+import subprocess
+from contextlib import ExitStack
+from typing import Callable, Iterator, NamedTuple
+
+from ffmpeg_runner import StderrTail, run_ffmpeg
+from ffmpeg_utils import ffmpeg_path, ffmpeg_slot, ffprobe_path
+from job_journal import (
+    commit_partial,
+    discard_partial,
+    partial_path,
+    partial_suffix,
+)
+from silence_cuts import quietest_frame
+
+# 片段时长范围（毫秒），与原先 pydub 实现保持一致
+MIN_SEGMENT_MS = 70 * 1000
+MAX_SEGMENT_MS = 75 * 1000
+
+# 每次读取/写出的帧数
+CHUNK_FRAMES = 1 << 16
+
+# 可以直接按字节切分的 WAV 编码：PCM、IEEE float、WAVE_FORMAT_EXTENSIBLE
+_PLAIN_WAV_FORMATS = (0x0001, 0x0003, 0xFFFE)
+
+# 可以流复制切分的压缩格式：扩展名 -> segment 复用器使用的封装格式
+COPY_SEGMENT_FORMATS = {".mp3": "mp3", ".aac": "adts", ".flac": "flac"}
+
+# 流复制切分时记录实际切分点的清单文件，与片段放在同一目录
+SEGMENT_MANIFEST_FILENAME = "segments.json"
+
+
+class WavLayout(NamedTuple):
+    fmt: bytes  # 原始 fmt 块内容，写片段时原样复制
+    data_offset: int  # data 块在文件中的起始偏移
+    data_size: int  # 头部声明的 data 块字节数，可能是占位值
+    frame_rate: int
+    block_align: int
+    format_tag: int
+
+
+def iter_segment_bounds(duration_ms: int | None = None) -> Iterator[tuple]:
+    """
+    按原有的随机时长规则（70-75 秒）逐个生成片段边界。
+    每次迭代才调用一次 random.randint，调用方可以在两次迭代之间穿插其他随机操作，
+    从而与原实现消耗随机数的顺序保持一致。
+    :param duration_ms: 音频总时长（毫秒），为 None 时无限生成，由调用方在输入结束时停止
+    :return: (start_ms, end_ms) 的迭代器
+    """
+    start = 0
+    while duration_ms is None or start < duration_ms:
+        segment_duration = random.randint(MIN_SEGMENT_MS, MAX_SEGMENT_MS)
+        end = start + segment_duration
+        if duration_ms is not None:
+            end = min(end, duration_ms)
+        yield start, end
+        start = end
+
+
+def ms_to_frame(ms: int, frame_rate: int) -> int:
+    """
+    毫秒换算为帧序号，与 pydub 切片的取整方式一致。
+    """
+    return int(ms * (frame_rate / 1000.0))
+
+
+def probe_duration_ms(path: str) -> int:
+    """
+    使用 ffprobe 获取媒体文件时长。
+    :param path: 媒体文件路径
+    :return: 时长（毫秒）
+    """
+    result = subprocess.run(
+        [
+            ffprobe_path(),
+            "-v",
+            "error",
+            "-show_entries",
+            "format=duration",
+            "-of",
+            "default=noprint_wrappers=1:nokey=1",
+            path,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    return round(float(result.stdout.strip()) * 1000)
+
+
+def plan_segment_times(duration_ms: int) -> list:
+    """
+    预先生成全部切分点，供 FFmpeg segment 复用器使用。
+    :param duration_ms: 音频总时长（毫秒）
+    :return: 各片段的结束时间（秒），不包含最后一个片段的结尾
+    """
+    return [end / 1000 for _, end in iter_segment_bounds(duration_ms)][:-1]
+
+
+def segment_muxer_args(
+    segment_times: list, duration_ms: int, pattern: str, segment_format: str = "wav"
+) -> list:
+    """
+    生成 FFmpeg segment 复用器的输出参数。
+    :param segment_times: 切分点（秒）
+    :param duration_ms: 音频总时长（毫秒），没有切分点时用于输出单个片段
+    :param pattern: 输出文件名模板
+    :param segment_format: 片段的封装格式
+    """
+    if segment_times:
+        split_args = ["-segment_times", ",".join(f"{t:.3f}" for t in segment_times)]
+    else:
+        split_args = ["-segment_time", str(duration_ms // 1000 + 1)]
+    return [
+        "-f",
+        "segment",
+        "-segment_format",
+        segment_format,
+        *split_args,
+        "-reset_timestamps",
+        "1",
+        pattern,
+    ]
+
+
+def copy_segment_audio(
+    audio_path: str, output_dir: str, name_factory: Callable[[], str]
+) -> list:
+    """
+    不解码，直接流复制切分已压缩的音频：segment 复用器在目标切分点之后的第一个帧边界处切开，
+    片段保持原格式，实际切分点写入同目录下的 segments.json 清单。
+    :param audio_path: 输入音频文件的路径，扩展名必须在 COPY_SEGMENT_FORMATS 中
+    :param output_dir: 片段存放目录
+    :param name_factory: 生成片段文件名（不含扩展名）的函数
+    :return: 片段路径列表
+    :raises RuntimeError: FFmpeg 切分失败
+    """
+    ext = os.path.splitext(audio_path)[1].lower()
+    segment_format = COPY_SEGMENT_FORMATS[ext]
+    duration_ms = probe_duration_ms(audio_path)
+    segment_times = plan_segment_times(duration_ms)
+
+    temp_pattern = os.path.join(output_dir, f"copy_%04d{ext}{partial_suffix()}")
+    segment_list = partial_path(os.path.join(output_dir, "segments.csv"))
+    command = [
+        ffmpeg_path(),
+        "-nostdin",
+        "-v",
+        "error",
+        "-y",
+        "-i",
+        audio_path,
+        "-map",
+        "0:a:0",
+        "-c",
+        "copy",
+        "-segment_list",
+        segment_list,
+        "-segment_list_type",
+        "csv",
+        *segment_muxer_args(segment_times, duration_ms, temp_pattern, segment_format),
+    ]
+    result = run_ffmpeg(command)
+    try:
+        if not result.ok:
+            raise RuntimeError(f"{result.error}\n{result.stderr}")
+        with open(segment_list, newline="", encoding="utf-8") as f:
+            rows = [row for row in csv.reader(f) if row]
+    finally:
+        if os.path.exists(segment_list):
+            os.remove(segment_list)
+
+    # 按顺序将临时片段重命名为随机名称，并记录每个片段的目标切分点和实际切分点
+    targets = segment_times + [duration_ms / 1000]
+    segment_paths = []
+    manifest = []
+    for index, (temp_filename, start, end) in enumerate(rows):
+        segment_filename = f"{name_factory()}{ext}"
+        segment_path = os.path.join(output_dir, segment_filename)
+        os.replace(os.path.join(output_dir, temp_filename), segment_path)
+        segment_paths.append(segment_path)
+        manifest.append(
+            {
+                "file": segment_filename,
+                "start": float(start),
+                "end": float(end),
+                "target_end": targets[min(index, len(targets) - 1)],
+            }
+        )
+
+    manifest_path = os.path.join(output_dir, SEGMENT_MANIFEST_FILENAME)
+    with open(partial_path(manifest_path), "w", encoding="utf-8") as f:
+        json.dump(
+            {"source": os.path.abspath(audio_path), "segments": manifest},
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+    commit_partial(manifest_path)
+    return segment_paths
+
+
+def _parse_wav_header(read: Callable[[int], bytes]) -> WavLayout:
+    """
+    解析 RIFF/WAVE（或超过 4GB 时使用的 RF64）头部，直到 data 块为止。
+    :param read: 读取指定字节数的函数
+    :return: WavLayout，data_size 为头部中声明的大小
+    """
+    riff = read(12)
+    if len(riff) < 12 or riff[:4] not in (b"RIFF", b"RF64") or riff[8:12] != b"WAVE":
+        raise ValueError("不是有效的 WAV 文件")
+
+    offset = 12
+    fmt = None
+    data_size64 = None
+    while True:
+        header = read(8)
+        if len(header) < 8:
+            raise ValueError("WAV 文件缺少 data 块")
+        chunk_id, chunk_size = header[:4], struct.unpack("<I", header[4:])[0]
+        offset += 8
+        if chunk_id == b"data":
+            if chunk_size == 0xFFFFFFFF and data_size64 is not None:
+                chunk_size = data_size64  # RF64：真实大小记录在 ds64 块中
+            break
+        body = read(chunk_size + (chunk_size & 1))  # 块按偶数字节对齐
+        offset += len(body)
+        if chunk_id == b"fmt ":
+            fmt = body[:chunk_size]
+        elif chunk_id == b"ds64" and len(body) >= 16:
+            data_size64 = struct.unpack("<Q", body[8:16])[0]
+
+    if fmt is None or len(fmt) < 16:
+        raise ValueError("WAV 文件缺少 fmt 块")
+    format_tag, _, frame_rate, _, block_align = struct.unpack("<HHIIH", fmt[:14])
+    return WavLayout(fmt, offset, chunk_size, frame_rate, block_align, format_tag)
+
+
+def wav_duration_seconds(path: str) -> float | None:
+    """
+    根据 WAV 头部计算时长，无法解析时返回 None。
+    """
+    try:
+        with open(path, "rb") as f:
+            layout = _parse_wav_header(f.read)
+            data_size = min(layout.data_size, os.fstat(f.fileno()).st_size - layout.data_offset)
+    except (OSError, ValueError):
+        return None
+    if not layout.block_align or not layout.frame_rate:
+        return None
+    return data_size // layout.block_align / layout.frame_rate
+
+
+class _WavWriter:
+    """
+    顺序写出 WAV 片段，关闭时回填 RIFF 与 data 块大小。
+    数据先写入 .part 临时文件，close() 时才原子重命名为正式文件名。
+    """
+
+    def __init__(self, path: str, fmt: bytes):
+        self.path = path
+        self.data_size = 0
+        self._file = open(partial_path(path), "wb")
+        self._file.write(b"RIFF\x00\x00\x00\x00WAVE")
+        self._file.write(b"fmt " + struct.pack("<I", len(fmt)) + fmt)
+        if len(fmt) & 1:
+            self._file.write(b"\x00")
+        self._file.write(b"data\x00\x00\x00\x00")
+        self._data_size_pos = self._file.tell() - 4
+
+    def write(self, data) -> None:
+        self._file.write(data)
+        self.data_size += len(data)
+
+    def close(self) -> None:
+        if self.data_size & 1:
+            self._file.write(b"\x00")
+        riff_size = self._file.tell() - 8
+        self._file.seek(4)
+        self._file.write(struct.pack("<I", min(riff_size, 0xFFFFFFFF)))
+        self._file.seek(self._data_size_pos)
+        self._file.write(struct.pack("<I", min(self.data_size, 0xFFFFFFFF)))
+        self._file.close()
+        commit_partial(self.path)
+
+    def abort(self) -> None:
+        """
+        放弃未写完的片段。
+        """
+        self._file.close()
+        discard_partial(self.path)
+
+
+class _MmapWavSource:
+    """
+    通过 mmap 读取 PCM WAV 文件，已经写出的页会被及时释放，常驻内存保持平稳。
+    """
+
+    def __init__(self, path: str, layout: WavLayout):
+        self.layout = layout
+        self._file = open(path, "rb")
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            self._mmap.madvise(mmap.MADV_SEQUENTIAL)
+        self._view = memoryview(self._mmap)
+        # 部分工具写出的 data 大小为占位值，按文件实际长度截断
+        data_size = min(layout.data_size, len(self._mmap) - layout.data_offset)
+        self.total_frames = data_size // layout.block_align
+        self._pos = layout.data_offset
+        self._end = layout.data_offset + self.total_frames * layout.block_align
+        self._released = 0
+
+    @property
+    def duration_ms(self) -> int:
+        return round(1000 * self.total_frames / self.layout.frame_rate)
+
+    def read(self, frames: int) -> memoryview:
+        size = min(frames * self.layout.block_align, self._end - self._pos)
+        chunk = self._view[self._pos : self._pos + size]
+        self._pos += size
+        return chunk
+
+    def release(self) -> None:
+        """
+        释放已经读取过的页（调用方需确保之前返回的数据已写出）。
+        """
+        if not hasattr(mmap, "MADV_DONTNEED"):
+            return
+        upto = self._pos - self._pos % mmap.PAGESIZE
+        if upto > self._released:
+            self._mmap.madvise(mmap.MADV_DONTNEED, self._released, upto - self._released)
+            self._released = upto
+
+    def close(self) -> None:
+        self._view.release()
+        self._mmap.close()
+        self._file.close()
+
+
+class _PipeSource:
+    """
+    通过 FFmpeg 将任意格式解码为 WAV 并从管道中按块读取，总时长未知，读到 EOF 为止。
+    """
+
+    total_frames = None
+    duration_ms = None
+
+    def __init__(self, path: str, hold_slot: bool = True):
+        # 解码进程存活期间一直占用一个 FFmpeg 名额
+        self._stack = ExitStack()
+        if hold_slot:
+            self._stack.enter_context(ffmpeg_slot())
+        self._process = subprocess.Popen(
+            [ffmpeg_path(), "-v", "error", "-nostdin", "-i", path, "-vn", "-f", "wav", "-"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self._stderr = StderrTail(self._process.stderr)
+        try:
+            self.layout = _parse_wav_header(self._read_exact)
+        except ValueError:
+            self.close()  # 解码失败时抛出带有 FFmpeg 错误信息的 RuntimeError
+            raise
+
+    def _read_exact(self, size: int) -> bytes:
+        buffer = bytearray()
+        while len(buffer) < size:
+            data = self._process.stdout.read(size - len(buffer))
+            if not data:
+                break
+            buffer += data
+        return bytes(buffer)
+
+    def read(self, frames: int) -> bytes:
+        return self._read_exact(frames * self.layout.block_align)
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self._process.stdout.close()
+        # 提前停止读取时 FFmpeg 可能阻塞在写管道上
+        if self._process.poll() is None:
+            self._process.kill()
+        stderr = self._stderr.text()
+        self._process.stderr.close()
+        returncode = self._process.wait()
+        self._stack.close()
+        if returncode > 0:
+            raise RuntimeError(f"FFmpeg 解码失败: {stderr.strip()}")
+
+
+def open_pcm_source(audio_path: str, hold_slot: bool = True):
+    """
+    打开音频输入：PCM WAV 走 mmap，其余格式走 FFmpeg 管道解码。
+    :param hold_slot: 管道解码期间是否占用全局 FFmpeg 名额
+    """
+    if audio_path.lower().endswith(".wav"):
+        with open(audio_path, "rb") as f:
+            try:
+                layout = _parse_wav_header(f.read)
+            except ValueError:
+                layout = None
+        if layout is not None and layout.format_tag in _PLAIN_WAV_FORMATS:
+            return _MmapWavSource(audio_path, layout)
+    return _PipeSource(audio_path, hold_slot)
+
+
+def _copy_frames(source, output_path: str, frames: int, chunk_frames: int) -> int:
+    """
+    从输入中按块读取指定帧数并写入新的 WAV 片段。
+    :return: 实际写出的帧数，输入已经结束时为 0 且不会创建文件
+    """
+    block_align = source.layout.block_align
+    chunk = source.read(min(chunk_frames, frames))
+    if not chunk:
+        return 0
+
+    copied = 0
+    writer = _WavWriter(output_path, source.layout.fmt)
+    try:
+        while chunk:
+            writer.write(chunk)
+            copied += len(chunk) // block_align
+            source.release()
+            if copied >= frames:
+                break
+            chunk = source.read(min(chunk_frames, frames - copied))
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    return copied
+
+
+def iter_cut_audio(
+    audio_path: str,
+    output_dir: str,
+    name_factory: Callable[[], str],
+    chunk_frames: int = CHUNK_FRAMES,
+    hold_slot: bool = True,
+    snap_to_silence: bool = False,
+) -> Iterator[str]:
+    """
+    流式地将音频分割为随机时长的 WAV 片段，每个片段写完立即产出其路径。
+    :param audio_path: 输入音频文件的路径
+    :param output_dir: 片段存放目录
+    :param name_factory: 生成片段文件名（不含扩展名）的函数
+    :param chunk_frames: 每次读取的帧数
+    :param hold_slot: 管道解码期间是否占用全局 FFmpeg 名额。调用方在两次迭代之间可能长时间阻塞
+        （如等待有界队列）时应传 False，否则占着名额的解码进程会让等待名额的下游永远无法消费
+    :param snap_to_silence: 不使用随机时长，而是在 70-75 秒的窗口内选择最安静的位置切分
+    :return: 片段路径的迭代器
+    """
+    source = open_pcm_source(audio_path, hold_slot)
+    try:
+        if snap_to_silence:
+            yield from _iter_silence_cuts(source, output_dir, name_factory, chunk_frames)
+            return
+        position = 0
+        for start_ms, end_ms in iter_segment_bounds(source.duration_ms):
+            segment_filename = f"{name_factory()}.wav"
+            end_frame = ms_to_frame(end_ms, source.layout.frame_rate)
+            if source.total_frames is not None:
+                end_frame = min(end_frame, source.total_frames)
+
+            audio_output_path = os.path.join(output_dir, segment_filename)
+            wanted = end_frame - position
+            copied = _copy_frames(source, audio_output_path, wanted, chunk_frames)
+            if copied == 0:
+                break  # 输入已经读完
+            position += copied
+            yield audio_output_path
+            if copied < wanted:
+                break
+    finally:
+        source.close()
+
+
+def _iter_silence_cuts(
+    source, output_dir: str, name_factory: Callable[[], str], chunk_frames: int
+) -> Iterator[str]:
+    """
+    静音感知的流式分割：每个片段的前 70 秒按块直接写出，随后读入 70-75 秒的窗口（约 5 秒），
+    在窗口中最安静的位置切开，切分点之后的数据作为下一个片段的开头。
+    内存中最多只有一个窗口的数据，与输入时长无关。
+    :return: 片段路径的迭代器
+    """
+    layout = source.layout
+    block_align = layout.block_align
+    head_frames = ms_to_frame(MIN_SEGMENT_MS, layout.frame_rate)
+    window_frames = ms_to_frame(MAX_SEGMENT_MS, layout.frame_rate) - head_frames
+    carry = b""
+    while True:
+        chunk = carry or source.read(min(chunk_frames, head_frames))
+        if not chunk:
+            break  # 输入已经读完
+
+        audio_output_path = os.path.join(output_dir, f"{name_factory()}.wav")
+        writer = _WavWriter(audio_output_path, layout.fmt)
+        try:
+            copied = 0
+            while chunk:
+                writer.write(chunk)
+                copied += len(chunk) // block_align
+                source.release()
+                if copied >= head_frames:
+                    break
+                chunk = source.read(min(chunk_frames, head_frames - copied))
+
+            # 复制成 bytes：mmap 输入的视图必须在关闭前释放
+            window = bytes(source.read(window_frames)) if copied >= head_frames else b""
+            finished = len(window) < window_frames * block_align
+            if finished:
+                carry = b""  # 输入在窗口内结束，剩余部分全部归入最后一个片段
+                cut = len(window)
+            else:
+                cut = quietest_frame(window, layout.fmt) * block_align
+                carry = window[cut:]
+            writer.write(window[:cut])
+        except BaseException:
+            writer.abort()
+            raise
+        writer.close()
+        yield audio_output_path
+        if finished:
+            break
+
@@ -0,0 +1,117 @@
+"""
+静音感知的切分点：在允许的切分窗口（如 70-75 秒）内找出能量最低的位置，避免把一个字或一个音符切成两半。
+只分析窗口内的 PCM 数据（每个片段约 5 秒），分析量只占输入的一小部分，分割仍然是单次流式读取。
+- 以 10 毫秒为一跳计算所有声道的平方和，再以 50 毫秒的滑动窗口求和，取总能量最低的窗口中点作为切分点
+- 能量相同（如整段数字静音）时取最靠前的位置
+安装了 NumPy 时向量化计算，否则使用纯 Python 实现（结果相同，速度较慢）。
+"""
+import struct
+import sys
+from array import array
+from operator import mul
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 是可选依赖
+    np = None
+
+# 计算能量的跳长和滑动窗口长度（毫秒）
+SILENCE_HOP_MS = 10
+SILENCE_WINDOW_MS = 50
+
+# WAV 格式标记：IEEE float 和 WAVE_FORMAT_EXTENSIBLE
+_FORMAT_FLOAT = 0x0003
+_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 每个采样的字节数 -> array 类型码（整数, 浮点）
+_ARRAY_TYPECODES = {1: ("B", None), 2: ("h", None), 4: ("i", "f"), 8: ("q", "d")}
+_NUMPY_DTYPES = {1: ("u1", None), 2: ("<i2", None), 4: ("<i4", "<f4"), 8: ("<i8", "<f8")}
+
+
+def _sample_layout(fmt: bytes) -> tuple:
+    """
+    从 WAV fmt 块解析采样格式。
+    :return: (声道数, 每个采样的字节数, 是否为浮点, 采样率)
+    """
+    format_tag, channels, frame_rate, _, block_align = struct.unpack("<HHIIH", fmt[:14])
+    if format_tag == _FORMAT_EXTENSIBLE and len(fmt) >= 26:
+        format_tag = struct.unpack("<H", fmt[24:26])[0]  # 子格式 GUID 的前两个字节
+    channels = max(channels, 1)
+    return channels, block_align // channels, format_tag == _FORMAT_FLOAT, frame_rate
+
+
+def _hop_energies_numpy(data, width: int, is_float: bool, hop_samples: int):
+    """
+    NumPy 实现：每一跳所有采样的平方和。
+    """
+    if width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        samples = (
+            (raw[:, 2].astype(np.int8).astype(np.int32) << 16)
+            | (raw[:, 1].astype(np.int32) << 8)
+            | raw[:, 0]
+        ).astype(np.float64)
+    else:
+        dtype = _NUMPY_DTYPES[width][1 if is_float else 0]
+        samples = np.frombuffer(data, dtype=dtype).astype(np.float64)
+        if width == 1:
+            samples -= 128  # 8bit PCM 是无符号的
+    usable = len(samples) - len(samples) % hop_samples
+    return np.square(samples[:usable]).reshape(-1, hop_samples).sum(axis=1)
+
+
+def _hop_energies_python(data, width: int, is_float: bool, hop_samples: int) -> list:
+    """
+    纯 Python 实现：每一跳所有采样的平方和。
+    """
+    if width == 3:
+        samples = [
+            int.from_bytes(data[offset : offset + 3], "little", signed=True)
+            for offset in range(0, len(data) - 2, 3)
+        ]
+    else:
+        samples = array(_ARRAY_TYPECODES[width][1 if is_float else 0])
+        samples.frombytes(bytes(data[: len(data) - len(data) % samples.itemsize]))
+        if sys.byteorder == "big":
+            samples.byteswap()
+        if width == 1:
+            samples = [sample - 128 for sample in samples]
+    return [
+        sum(map(mul, hop, hop))
+        for hop in (
+            samples[offset : offset + hop_samples]
+            for offset in range(0, len(samples) - hop_samples + 1, hop_samples)
+        )
+    ]
+
+
+def quietest_frame(data, fmt: bytes) -> int:
+    """
+    找出一段 PCM 数据中最安静的位置。
+    :param data: 完整帧组成的 PCM 数据（bytes 或 memoryview）
+    :param fmt: WAV fmt 块内容，用于确定声道数、采样宽度和采样率
+    :return: 切分点相对 data 开头的帧序号；数据不足一个窗口时返回 0
+    """
+    channels, width, is_float, frame_rate = _sample_layout(fmt)
+    if width not in (1, 2, 3, 4, 8):
+        raise ValueError(f"不支持的采样宽度: {width} 字节")
+    hop_frames = max(1, frame_rate * SILENCE_HOP_MS // 1000)
+    hops_per_window = max(1, SILENCE_WINDOW_MS // SILENCE_HOP_MS)
+
+    if np is not None:
+        energies = _hop_energies_numpy(data, width, is_float, hop_frames * channels)
+        if len(energies) < hops_per_window:
+            return 0
+        windows = np.convolve(energies, np.ones(hops_per_window), mode="valid")
+        best = int(np.argmin(windows))
+    else:
+        energies = _hop_energies_python(data, width, is_float, hop_frames * channels)
+        if len(energies) < hops_per_window:
+            return 0
+        window = sum(energies[:hops_per_window])
+        best, lowest = 0, window
+        for index in range(1, len(energies) - hops_per_window + 1):
+            window += energies[index + hops_per_window - 1] - energies[index - 1]
+            if window < lowest:
+                best, lowest = index, window
+    return best * hop_frames + hops_per_window * hop_frames // 2
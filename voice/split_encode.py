@@ -0,0 +1,588 @@
+"""
+长文件的分段并行编码：把一个输入按时间切成若干段，每段由一个 FFmpeg 进程同时编码，最后无损拼接为一个输出文件，
+避免整批转换的最后只剩一个长文件在单核上编码。
+- WAV：切分点取整秒，各段从切分点前 1 秒开始解码用于重采样器预热，再按输出采样数精确裁掉多余部分，
+  第一段写出 WAV 头部，其余各段输出裸 PCM 直接追加，最后改写头部中的大小（超过 4GB 时改写为 RF64）。
+- MP3：切分点对齐到 MP3 帧边界，各段关闭比特池（-reservoir 0）使帧之间互不依赖，
+  并从切分点前两帧开始编码，拼接时按帧丢弃这些前导帧和每段自带的标签帧。
+  第一段的 Xing/LAME 标签保留编码器延迟，改写帧数、字节数、TOC、结尾填充和 CRC，解码器可以无缝（gapless）播放。
+压缩格式的输入先解码为临时的 32 位浮点 WAV，各段才能按采样精确定位。
+"""
+import asyncio
+import mmap
+import os
+import re
+import shutil
+import struct
+
+from loguru import logger
+
+from ffmpeg_runner import DEFAULT_STALL_TIMEOUT, FFmpegResult, run_ffmpeg_async
+from ffmpeg_utils import ffmpeg_path
+from job_journal import partial_path, partial_suffix
+from segmenter import _PLAIN_WAV_FORMATS, _parse_wav_header, probe_duration_ms
+
+# 每段至少这么长（秒），过短的分段带来的进程启动和预热开销得不偿失
+SPLIT_MIN_PART_SECONDS = 60
+
+# WAV 分段在切分点前后多解码的时长（秒），覆盖重采样滤波器的长度
+WAV_PREROLL_SECONDS = 1
+
+# MP3 分段在切分点前多编码的帧数，以及在切分点后多编码的帧数
+MP3_PREROLL_FRAMES = 2
+MP3_TAIL_FRAMES = 2
+
+# libmp3lame 支持的采样率，其他采样率会被 FFmpeg 自动重采样，无法按输入采样对齐帧边界
+LAME_SAMPLE_RATES = (48000, 44100, 32000, 24000, 22050, 16000, 12000, 11025, 8000)
+
+# 拼接时每次复制的字节数
+_COPY_BUFFER = 1 << 20
+
+# WAV 头部 32 位大小字段能表示的最大值；RF64 文件中这些字段固定写为该值，真实大小记录在 ds64 块中
+_RIFF_LIMIT = 0xFFFFFFFF
+_RF64_PLACEHOLDER = 0xFFFFFFFF
+
+# MPEG 音频 Layer III 的码率表（kbps）：MPEG-1 与 MPEG-2/2.5
+_MP3_BITRATES = {
+    3: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MP3_BITRATES[0] = _MP3_BITRATES[2]
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+# Xing 标签 TOC 的采样桶数，与 FFmpeg mp3 复用器一致
+_XING_BAGS = 400
+
+# LAME 标签中 CRC 使用的 CRC-16（多项式 0x8005，按位反转）
+_CRC16_POLY = 0xA001
+# x^8 在 GF(2)[x]/(0x8005) 中的阶：0x8005 = (x+1)(x^15+x+1)，后者是本原多项式
+_CRC16_BYTE_ORDER = (1 << 15) - 1
+
+
+def _crc16_table() -> list:
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ _CRC16_POLY if crc & 1 else crc >> 1
+        table.append(crc)
+    return table
+
+
+_CRC16_TABLE = _crc16_table()
+
+
+def crc16(data, crc: int = 0) -> int:
+    """
+    计算 LAME 标签使用的 CRC-16，只用于标签帧和少量前导帧，不适合大块数据。
+    """
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC16_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _gf2_times(matrix: list, vector: int) -> int:
+    total = 0
+    for row in matrix:
+        if not vector:
+            break
+        if vector & 1:
+            total ^= row
+        vector >>= 1
+    return total
+
+
+def crc16_shift(crc: int, length: int) -> int:
+    """
+    在 crc 对应的数据后面追加 length 个零字节后的 CRC，用于不读取数据就合并各段的 CRC：
+    crc(A + B) = crc16_shift(crc(A), len(B)) ^ crc(B)。length 为负数时反向移除零字节。
+    做法与 zlib 的 crc32_combine 相同，用矩阵平方在 O(log length) 内完成。
+    """
+    length %= _CRC16_BYTE_ORDER
+    odd = [_CRC16_POLY] + [1 << n for n in range(15)]  # 追加一个零比特的变换
+    even = [_gf2_times(odd, row) for row in odd]
+    odd = [_gf2_times(even, row) for row in even]
+    while length:
+        even = [_gf2_times(odd, row) for row in odd]
+        if length & 1:
+            crc = _gf2_times(even, crc)
+        length >>= 1
+        if not length:
+            break
+        odd = [_gf2_times(even, row) for row in even]
+        if length & 1:
+            crc = _gf2_times(odd, crc)
+        length >>= 1
+    return crc
+
+
+def split_parts_for(
+    input_path: str, duration: float | None, split_long: float | None, max_parts: int
+) -> int:
+    """
+    计算一个输入应当切成几段：不超过 split_long 秒的文件不切分，更长的文件按每段至少
+    SPLIT_MIN_PART_SECONDS 秒切成不超过 max_parts 段。
+    :param duration: 已知的时长（秒），为 None 时用 ffprobe 获取
+    :param split_long: 切分阈值（秒），None 表示不切分
+    :return: 分段数，1 表示整个文件由一个进程编码
+    """
+    if split_long is None or max_parts < 2:
+        return 1
+    if duration is None:
+        try:
+            duration = probe_duration_ms(input_path) / 1000
+        except Exception as e:
+            logger.warning(f"无法获取时长，不切分: {input_path}，错误信息: {e}")
+            return 1
+    if duration <= split_long:
+        return 1
+    return max(1, min(max_parts, int(duration // SPLIT_MIN_PART_SECONDS)))
+
+
+def _even_bounds(total: int, parts: int) -> list:
+    """
+    把 [0, total) 平均分为 parts 段，返回包含首尾的边界列表。
+    """
+    return [total * index // parts for index in range(parts + 1)]
+
+
+def _seconds(samples: int, rate: int) -> str:
+    return f"{samples / rate:.6f}"
+
+
+def _arg(output_args: list, name: str) -> str:
+    return output_args[output_args.index(name) + 1]
+
+
+def _part_path(output_path: str, label) -> str:
+    # 以 .part 结尾，不会被目录扫描当作音频文件
+    return f"{output_path}.{label}{partial_suffix()}"
+
+
+def _remove(paths) -> None:
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def _combined_result(commands: list, results: list, elapsed: float, out_time_us) -> FFmpegResult:
+    """
+    把各段的运行结果合并为一个 FFmpegResult，任何一段失败则整体失败。
+    """
+    failed = next((result for result in results if not result.ok), None)
+    if failed is not None:
+        return failed._replace(attempts=sum(result.attempts for result in results), elapsed=elapsed)
+    return FFmpegResult(
+        commands,
+        0,
+        sum(result.attempts for result in results),
+        elapsed,
+        None,
+        "",
+        out_time_us,
+    )
+
+
+async def _pcm_source(input_path: str, work_path: str, timeout, stall_timeout) -> tuple:
+    """
+    准备可以按采样精确定位的 PCM 输入：未压缩的 WAV 直接使用，其他格式先解码为 32 位浮点 WAV。
+    :param work_path: 临时 WAV 的路径
+    :return: (PCM 文件路径, WavLayout, 总帧数, 解码结果或 None)
+    """
+    try:
+        with open(input_path, "rb") as f:
+            layout = _parse_wav_header(f.read)
+        if layout.format_tag in _PLAIN_WAV_FORMATS and layout.block_align:
+            size = os.path.getsize(input_path)
+            frames = min(layout.data_size, size - layout.data_offset) // layout.block_align
+            return input_path, layout, frames, None
+    except (OSError, ValueError):
+        pass
+
+    result = await run_ffmpeg_async(
+        [
+            ffmpeg_path(),
+            "-nostdin",
+            "-y",
+            "-i",
+            input_path,
+            "-map",
+            "0:a:0",
+            "-c:a",
+            "pcm_f32le",  # 浮点解码器（mp3/aac 等）的输出原样保存，不损失精度
+            "-rf64",
+            "auto",
+            "-f",
+            "wav",
+            work_path,
+        ],
+        timeout=timeout,
+        stall_timeout=stall_timeout,
+    )
+    if not result.ok:
+        return None, None, 0, result
+    with open(work_path, "rb") as f:
+        layout = _parse_wav_header(f.read)
+    size = os.path.getsize(work_path)
+    frames = min(layout.data_size, size - layout.data_offset) // layout.block_align
+    return work_path, layout, frames, result
+
+
+def _finish_wav(path: str, part_paths: list) -> None:
+    """
+    把裸 PCM 分段追加到第一段的 WAV 之后，并改写头部中的大小；超过 4GB 时把预留的 JUNK 块改写为 ds64，
+    文件头改为 RF64。
+    """
+    with open(path, "r+b") as f:
+        layout = _parse_wav_header(f.read)
+        f.truncate(layout.data_offset + layout.data_size)
+        f.seek(0, os.SEEK_END)
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, f, _COPY_BUFFER)
+        file_size = f.tell()
+        data_size = file_size - layout.data_offset
+
+        if file_size - 8 <= _RIFF_LIMIT:
+            f.seek(4)
+            f.write(struct.pack("<I", file_size - 8))
+            f.seek(layout.data_offset - 4)
+            f.write(struct.pack("<I", data_size))
+            return
+
+        f.seek(12)
+        if f.read(8) != b"JUNK" + struct.pack("<I", 28):
+            raise ValueError("输出超过 4GB，但第一段没有为 RF64 预留 JUNK 块")
+        f.seek(0)
+        f.write(b"RF64" + struct.pack("<I", _RF64_PLACEHOLDER))
+        f.seek(12)
+        f.write(
+            b"ds64"
+            + struct.pack(
+                "<IQQQI", 28, file_size - 8, data_size, data_size // layout.block_align, 0
+            )
+        )
+        f.seek(layout.data_offset - 4)
+        f.write(struct.pack("<I", _RF64_PLACEHOLDER))
+
+
+async def split_convert_wav(
+    input_path: str,
+    output_path: str,
+    output_args: list,
+    parts: int,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> FFmpegResult:
+    """
+    分段并行转换为 PCM WAV，结果写入 output_path 的 .part 临时文件，由调用方提交。
+    各段的输出与单个进程转换的对应采样完全一致。
+    :param output_args: 输出参数，需包含 -ar、-ac 和 pcm 编码的 -acodec
+    :param parts: 最大分段数
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    output_rate = int(_arg(output_args, "-ar"))
+    codec = _arg(output_args, "-acodec")
+    raw_format = codec[len("pcm_"):]
+    frame_bytes = int(re.search(r"\d+", raw_format).group()) // 8 * int(_arg(output_args, "-ac"))
+
+    work_path = _part_path(output_path, "pcm")
+    part_paths = []
+    try:
+        source, layout, frames, decoded = await _pcm_source(
+            input_path, work_path, timeout, stall_timeout
+        )
+        if source is None:
+            return decoded
+        rate = layout.frame_rate
+        total_seconds = frames // rate
+        parts = max(1, min(parts, total_seconds // SPLIT_MIN_PART_SECONDS))
+        bounds = _even_bounds(total_seconds, parts)  # 整秒切分，输入和输出的采样位置都是整数
+        preroll = WAV_PREROLL_SECONDS
+        # 预计超过 4GB 时让第一段预留 RF64 所需的 JUNK 块
+        large = frames / rate * output_rate * frame_bytes > _RIFF_LIMIT - _COPY_BUFFER
+
+        commands = []
+        for index in range(parts):
+            first, last = index == 0, index == parts - 1
+            start = 0 if first else bounds[index] - preroll
+            command = [ffmpeg_path(), "-nostdin", "-y"]
+            if not first:
+                command += ["-ss", str(start)]
+            if not last:
+                command += ["-t", str(bounds[index + 1] - start + preroll)]
+            trim = [f"start_sample={(bounds[index] - start) * output_rate}"]
+            if not last:
+                trim.append(f"end_sample={(bounds[index + 1] - start) * output_rate}")
+            command += [
+                "-i",
+                source,
+                "-map",
+                "0:a:0",
+                "-af",
+                f"aresample={output_rate},atrim={':'.join(trim)}",
+                *output_args,
+            ]
+            if first:
+                command += (["-rf64", "auto"] if large else []) + ["-f", "wav", partial_path(output_path)]
+            else:
+                part_paths.append(_part_path(output_path, index))
+                command += ["-f", raw_format, part_paths[-1]]
+            commands.append(command)
+
+        logger.info(f"分 {parts} 段并行转换: {input_path}")
+        results = await asyncio.gather(
+            *(run_ffmpeg_async(command, timeout=timeout, stall_timeout=stall_timeout) for command in commands)
+        )
+        if decoded is not None:
+            results.insert(0, decoded)
+        out_time_us = round(frames / rate * 1e6)
+        result = _combined_result(commands, results, loop.time() - start_time, out_time_us)
+        if result.ok:
+            try:
+                _finish_wav(partial_path(output_path), part_paths)
+            except ValueError as e:
+                result = result._replace(returncode=None, error=f"拼接失败: {e}")
+        return result
+    finally:
+        _remove([work_path, *part_paths])
+
+
+def _mp3_frame(header: bytes) -> tuple | None:
+    """
+    解析 MPEG 音频 Layer III 帧头。
+    :return: (帧长度, 每帧采样数, 边信息长度)，不是有效帧头时返回 None
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 3
+    if version == 1 or (header[1] >> 1) & 3 != 1:
+        return None
+    bitrate_index, rate_index = header[2] >> 4, (header[2] >> 2) & 3
+    if bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = _MP3_BITRATES[version][bitrate_index] * 1000
+    rate = _MP3_SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 1
+    mono = header[3] >> 6 == 3
+    if version == 3:
+        return 144 * bitrate // rate + padding, 1152, 17 if mono else 32
+    return 72 * bitrate // rate + padding, 576, 9 if mono else 17
+
+
+def _id3v2_size(data) -> int:
+    """
+    文件开头 ID3v2 标签的长度，没有标签时为 0。
+    """
+    if data[:3] != b"ID3" or len(data) < 10:
+        return 0
+    size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _mp3_frames(data, offset: int) -> list:
+    """
+    从 offset 开始逐帧扫描，遇到无法解析的数据（如 ID3v1 标签）时停止。
+    :return: [(帧偏移, 帧长度)]
+    """
+    frames = []
+    end = len(data)
+    while offset + 4 <= end:
+        info = _mp3_frame(data[offset : offset + 4])
+        if info is None or offset + info[0] > end:
+            break
+        frames.append((offset, info[0]))
+        offset += info[0]
+    return frames
+
+
+class _LameTag:
+    """
+    标签帧中 Xing/Info 头部和 LAME 扩展字段的位置。
+    """
+
+    def __init__(self, frame: bytes):
+        _, _, side_info = _mp3_frame(frame)
+        self.xing = 4 + side_info
+        if frame[self.xing : self.xing + 4] not in (b"Xing", b"Info"):
+            raise ValueError("不是 Xing/Info 标签帧")
+        flags = struct.unpack(">I", frame[self.xing + 4 : self.xing + 8])[0]
+        if flags & 7 != 7:
+            raise ValueError("Xing 标签缺少帧数、字节数或 TOC")
+        self.frames = self.xing + 8
+        self.bytes = self.frames + 4
+        self.toc = self.bytes + 4
+        self.lame = self.toc + 100 + (4 if flags & 8 else 0)
+        if len(frame) < self.lame + 36:
+            raise ValueError("标签帧中没有 LAME 扩展")
+        self.delay_padding = self.lame + 21
+        self.music_length = self.lame + 28
+        self.music_crc = self.lame + 32
+        self.tag_crc = self.lame + 34
+
+    def padding(self, frame: bytes) -> int:
+        return struct.unpack(">I", b"\0" + frame[self.delay_padding : self.delay_padding + 3])[0] & 0xFFF
+
+    def music_crc_of(self, frame: bytes) -> int:
+        return struct.unpack(">H", frame[self.music_crc : self.music_crc + 2])[0]
+
+
+def _xing_toc(frame_sizes: list, tag_size: int) -> bytes:
+    """
+    按 FFmpeg mp3 复用器的方式计算 Xing TOC：每隔若干帧记录一次累计字节数，桶满后抽掉一半并加倍间隔。
+    """
+    want, seen, size, bags = 1, 0, tag_size, []
+    for frame_size in frame_sizes:
+        size += frame_size
+        seen += 1
+        if seen == want:
+            bags.append(size)
+            seen = 0
+            if len(bags) == _XING_BAGS:
+                bags = bags[1::2]
+                want *= 2
+    if not bags:
+        return bytes(100)
+    toc = bytearray(min(255, int(256.0 * bags[index * len(bags) // 100] / size)) for index in range(100))
+    toc[0] = 0
+    return bytes(toc)
+
+
+def _finish_mp3(path: str, part_paths: list, keep: list) -> None:
+    """
+    拼接各段保留的帧：第一段的 ID3v2 标签和 Xing/LAME 标签帧放在开头，其余各段的标签帧和前导帧丢弃，
+    然后改写标签中的帧数、字节数、TOC、结尾填充、音频长度和 CRC。
+    :param keep: 每段保留的音频帧范围 (起始帧, 结束帧)，结束帧为 None 表示到末尾
+    """
+    frame_sizes = []
+    music_crc = 0
+    tag = None
+    with open(path, "wb") as output:
+        for index, (part_path, (first, last)) in enumerate(zip(part_paths, keep)):
+            with open(part_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                frames = _mp3_frames(data, _id3v2_size(data))
+                if not frames:
+                    raise ValueError(f"分段中没有 MP3 帧: {part_path}")
+                tag_frame = bytes(data[frames[0][0] : frames[0][0] + frames[0][1]])
+                try:
+                    part_tag = _LameTag(tag_frame)
+                except ValueError:
+                    part_tag = None
+                audio = frames[1:] if part_tag is not None else frames
+                kept = audio[first:last]
+                if not kept:
+                    raise ValueError(f"分段的帧数少于预期: {part_path}")
+                if index == 0:
+                    tag = part_tag
+                    output.write(data[: frames[0][0] + frames[0][1] if tag is not None else frames[0][0]])
+                    tag_offset = frames[0][0]
+                begin, end = kept[0][0], kept[-1][0] + kept[-1][1]
+                output.write(data[begin:end])
+                frame_sizes.extend(size for _, size in kept)
+
+                if tag is None:
+                    continue
+                if part_tag is None:
+                    tag = None  # 无法得到这一段的 CRC 和填充信息，保留原标签
+                    continue
+                # 由整段的 CRC 去掉前导帧和尾部帧的贡献，得到保留部分的 CRC，不必重新读取全部音频数据
+                audio_end = audio[-1][0] + audio[-1][1]
+                part_crc = part_tag.music_crc_of(tag_frame)
+                prefix_crc = crc16(data[audio[0][0] : begin])
+                suffix_crc = crc16(data[end:audio_end])
+                rest_crc = part_crc ^ crc16_shift(prefix_crc, audio_end - begin)
+                kept_crc = crc16_shift(rest_crc ^ suffix_crc, -(audio_end - end))
+                music_crc = crc16_shift(music_crc, end - begin) ^ kept_crc
+                padding = part_tag.padding(tag_frame)
+
+    if tag is None:
+        logger.warning(f"没有可改写的 Xing/LAME 标签，播放器可能无法准确去除首尾静音: {path}")
+        return
+    with open(path, "r+b") as f:
+        f.seek(tag_offset)
+        frame = bytearray(f.read(tag.tag_crc + 2))
+        total_bytes = _mp3_frame(frame)[0] + sum(frame_sizes)
+        frame[tag.frames : tag.frames + 4] = struct.pack(">I", len(frame_sizes))
+        frame[tag.bytes : tag.bytes + 4] = struct.pack(">I", total_bytes)
+        frame[tag.toc : tag.toc + 100] = _xing_toc(frame_sizes, _mp3_frame(frame)[0])
+        delay_padding = struct.unpack(">I", b"\0" + frame[tag.delay_padding : tag.delay_padding + 3])[0]
+        delay_padding = (delay_padding & ~0xFFF) | padding
+        frame[tag.delay_padding : tag.delay_padding + 3] = struct.pack(">I", delay_padding)[1:]
+        frame[tag.music_length : tag.music_length + 4] = struct.pack(">I", total_bytes)
+        frame[tag.music_crc : tag.music_crc + 2] = struct.pack(">H", music_crc)
+        frame[tag.tag_crc : tag.tag_crc + 2] = struct.pack(">H", crc16(frame[: tag.tag_crc]))
+        f.seek(tag_offset)
+        f.write(frame)
+
+
+async def split_convert_mp3(
+    input_path: str,
+    output_path: str,
+    output_args: list,
+    parts: int,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> FFmpegResult | None:
+    """
+    分段并行编码为 MP3（需要 libmp3lame），结果写入 output_path 的 .part 临时文件，由调用方提交。
+    :param output_args: MP3 编码参数
+    :param parts: 最大分段数
+    :return: 运行结果；输入采样率不受 libmp3lame 支持、无法按帧对齐时返回 None，由调用方整体编码
+    """
+    loop = asyncio.get_running_loop()
+    start_time = loop.time()
+    work_path = _part_path(output_path, "pcm")
+    part_paths = []
+    try:
+        source, layout, frames, decoded = await _pcm_source(
+            input_path, work_path, timeout, stall_timeout
+        )
+        if source is None:
+            return decoded
+        rate = layout.frame_rate
+        if rate not in LAME_SAMPLE_RATES:
+            logger.info(f"采样率 {rate}Hz 需要重采样，不切分: {input_path}")
+            return None
+        frame_samples = 1152 if rate >= 32000 else 576
+        total_frames = frames // frame_samples
+        parts = max(1, min(parts, total_frames * frame_samples // rate // SPLIT_MIN_PART_SECONDS))
+        bounds = _even_bounds(total_frames, parts)  # 以 MP3 帧为单位的切分点
+
+        commands, keep = [], []
+        for index in range(parts):
+            first, last = index == 0, index == parts - 1
+            # 前导帧保证切分点所在帧的 MDCT 重叠部分由同样的输入编码
+            lead = 0 if first else MP3_PREROLL_FRAMES
+            start = (bounds[index] - lead) * frame_samples
+            command = [ffmpeg_path(), "-nostdin", "-y"]
+            if not first:
+                command += ["-ss", _seconds(start, rate)]
+            command += ["-i", source, "-map", "0:a:0"]
+            if not last:
+                end = (bounds[index + 1] + MP3_TAIL_FRAMES) * frame_samples
+                command += ["-af", f"atrim=end_sample={end - start}"]
+            part_paths.append(_part_path(output_path, index))
+            command += [*output_args, "-reservoir", "0", "-f", "mp3", part_paths[-1]]
+            commands.append(command)
+            keep.append((lead, None if last else lead + bounds[index + 1] - bounds[index]))
+
+        logger.info(f"分 {parts} 段并行编码: {input_path}")
+        results = await asyncio.gather(
+            *(run_ffmpeg_async(command, timeout=timeout, stall_timeout=stall_timeout) for command in commands)
+        )
+        if decoded is not None:
+            results.insert(0, decoded)
+        out_time_us = round(frames / rate * 1e6)
+        result = _combined_result(commands, results, loop.time() - start_time, out_time_us)
+        if result.ok:
+            try:
+                _finish_mp3(partial_path(output_path), part_paths, keep)
+            except ValueError as e:
+                result = result._replace(returncode=None, error=f"拼接失败: {e}")
+        return result
+    finally:
+        _remove([work_path, *part_paths])
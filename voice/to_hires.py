@@ -1,211 +1,376 @@
+import argparse
+import asyncio
 import os
-import subprocess
-import sys
-import platform
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 
 from loguru import logger
 
+from conversion_cache import DEFAULT_CACHE_PATH, open_cache
+from ffmpeg_runner import (
+    DEFAULT_STALL_TIMEOUT,
+    FFmpegResult,
+    run_ffmpeg_async,
+)
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ensure_ffmpeg, ffmpeg_path
+from job_journal import (
+    JOURNAL_FILENAME,
+    commit_partial,
+    discard_partial,
+    open_journal,
+    partial_path,
+    unit_id,
+)
+from media_scanner import add_scan_arguments, mirror_output_path
+from metrics import measure
+from planner import (
+    DEFAULT_REALTIME_FACTORS,
+    ESTIMATED_BYTES_PER_SECOND,
+    run_batch,
+)
+from split_encode import split_convert_wav, split_parts_for
 
-def check_ffmpeg_installed() -> bool:
+# 高清 WAV 的输出参数，其他模块（如视频流水线的单遍模式）复用同一组参数
+HIRES_OUTPUT_ARGS = [
+    "-ar",
+    "96000",  # 采样率 96000Hz
+    "-ac",
+    "2",  # 双声道
+    "-sample_fmt",
+    "s32",  # 32bit 位深度
+    "-acodec",
+    "pcm_s32le",  # 使用 32 位的 PCM 编码
+]
+
+
+def build_wav_command(input_path: str, output_path: str) -> list:
     """
-    检测系统是否安装了 FFmpeg
-    :return: True 如果 FFmpeg 可用，否则 False
+    生成转换为高清 WAV 的 FFmpeg 命令，输出先写入 .part 临时文件。
     """
-    try:
-        result = subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=5,
-        )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
+    return [
+        ffmpeg_path(),
+        "-nostdin",  # 不读取标准输入，避免等待交互确认
+        "-y",  # 覆盖已有输出
+        "-i",
+        input_path,
+        *HIRES_OUTPUT_ARGS,
+        "-f",
+        "wav",
+        partial_path(output_path),
+    ]
 
 
-def install_ffmpeg() -> bool:
+async def convert_audio_to_wav_async(
+    input_path: str,
+    output_path: str,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    split_parts: int = 1,
+) -> FFmpegResult:
     """
-    根据操作系统自动安装 FFmpeg
-    :return: True 如果安装成功，否则 False
+    异步版本的 convert_audio_to_wav，返回 FFmpeg 运行结果而不是只记录日志。
+    :param input_path: 输入音频文件的路径
+    :param output_path: 转换后的 WAV 文件的输出路径
+    :param timeout: 单个任务的墙钟时间预算（秒）
+    :param stall_timeout: 没有进度多长时间视为卡住（秒）
+    :param split_parts: 大于 1 时按时间切成最多这么多段并行转换，再拼接为一个文件（结果与不切分时一致）
     """
-    system = platform.system().lower()
-    logger.info(f"检测到操作系统: {system}")
-
-    try:
-        if system == "linux":
-            # 检测 Linux 发行版
-            if os.path.exists("/etc/debian_version"):
-                logger.info("使用 apt 安装 FFmpeg...")
-                subprocess.run(["sudo", "apt-get", "update"], check=True)
-                subprocess.run(
-                    ["sudo", "apt-get", "install", "-y", "ffmpeg"], check=True
-                )
-            elif os.path.exists("/etc/redhat-release"):
-                logger.info("使用 yum 安装 FFmpeg...")
-                subprocess.run(["sudo", "yum", "install", "-y", "ffmpeg"], check=True)
-            elif os.path.exists("/etc/arch-release"):
-                logger.info("使用 pacman 安装 FFmpeg...")
-                subprocess.run(
-                    ["sudo", "pacman", "-S", "--noconfirm", "ffmpeg"], check=True
-                )
-            else:
-                logger.error("未识别的 Linux 发行版，请手动安装 FFmpeg")
-                return False
-
-        elif system == "darwin":  # macOS
-            logger.info("使用 Homebrew 安装 FFmpeg...")
-            brew_check = subprocess.run(["which", "brew"], capture_output=True)
-            if brew_check.returncode != 0:
-                logger.error(
-                    '未安装 Homebrew，请先安装: /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"'
-                )
-                return False
-            subprocess.run(["brew", "install", "ffmpeg"], check=True)
-
-        elif system == "windows":
-            logger.warning("Windows 系统暂不支持自动安装")
-            logger.info("请访问 https://ffmpeg.org/download.html 下载 FFmpeg")
-            logger.info("或使用 Chocolatey 安装: choco install ffmpeg")
-            return False
+    if split_parts > 1:
+        result = await split_convert_wav(
+            input_path, output_path, HIRES_OUTPUT_ARGS, split_parts, timeout, stall_timeout
+        )
+    else:
+        result = await run_ffmpeg_async(
+            build_wav_command(input_path, output_path),
+            timeout=timeout,
+            stall_timeout=stall_timeout,
+        )
+    if result.ok:
+        commit_partial(output_path)
+        logger.info(f"转换完成: {output_path}")
+    else:
+        discard_partial(output_path)
+        logger.error(
+            f"FFmpeg 转换失败: {input_path}，错误信息: {result.error}\n{result.stderr}"
+        )
+    return result
 
-        else:
-            logger.error(f"不支持的操作系统: {system}")
-            return False
 
-        # 验证安装是否成功
-        if check_ffmpeg_installed():
-            logger.info("FFmpeg 安装成功！")
-            return True
-        else:
-            logger.error("FFmpeg 安装失败，请手动安装")
-            return False
+def convert_audio_to_wav(input_path: str, output_path: str) -> bool:
+    """
+    使用 FFmpeg 将音频文件转换为 WAV 文件，并确保采样率为 96000Hz，采样位深为 32bit。
 
-    except subprocess.CalledProcessError as e:
-        logger.error(f"安装 FFmpeg 时出错: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"未知错误: {e}")
-        return False
+    :param input_path: 输入音频文件的路径 (MP3 或 WAV)
+    :param output_path: 转换后的 WAV 文件的输出路径
+    :return: True 如果转换成功
+    """
+    return asyncio.run(convert_audio_to_wav_async(input_path, output_path)).ok
 
 
-def ensure_ffmpeg() -> None:
+async def _convert_one(
+    input_path: str,
+    output_path: str,
+    cache,
+    key,
+    journal,
+    timeout,
+    stall_timeout,
+    split_parts: int = 1,
+) -> FFmpegResult:
     """
-    确保 FFmpeg 可用，如果不可用则尝试安装
+    转换单个文件，成功后写入缓存，并在任务日志中记录开始和结束状态。
     """
-    if check_ffmpeg_installed():
-        logger.info("FFmpeg 已安装 ✓")
-        return
-
-    logger.warning("未检测到 FFmpeg，准备自动安装...")
-    if not install_ffmpeg():
-        logger.error("FFmpeg 安装失败，程序无法继续运行")
-        sys.exit(1)
+    unit = unit_id("to_hires", input_path)
+    journal.record(unit, "started")
+    with measure("convert_audio_to_wav", input_path) as stage:
+        result = await convert_audio_to_wav_async(
+            input_path, output_path, timeout, stall_timeout, split_parts
+        )
+        if result.out_time_us is not None:
+            stage.audio_seconds = result.out_time_us / 1e6
+        if result.ok:
+            stage.outputs.append(output_path)
+        else:
+            stage.fail()
+    if not result.ok:
+        journal.record(unit, "failed", error=result.error)
+        return result
+    if cache is not None:
+        cache.store(key, [output_path])
+    journal.record(unit, "done", outputs=[os.path.abspath(output_path)])
+    return result
 
 
-def convert_audio_to_wav(input_path: str, output_path: str) -> None:
+def convert_segment(
+    input_path: str,
+    output_path: str,
+    journal,
+    resume: bool = False,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+) -> bool:
     """
-    使用 FFmpeg 将音频文件转换为 WAV 文件，并确保采样率为 96000Hz，采样位深为 32bit。
-
-    :param input_path: 输入音频文件的路径 (MP3 或 WAV)
-    :param output_path: 转换后的 WAV 文件的输出路径
+    同步转换单个文件并记录任务日志，供视频流水线的音质提升工作者逐个片段调用。
+    :param journal: 任务日志
+    :param resume: 任务日志中已完成（且输出仍存在）时直接跳过
+    :return: True 如果转换成功或已经完成
     """
-    # 尝试使用系统 FFmpeg
-    command = [
-        "ffmpeg",
-        "-i",
-        input_path,  # 输入文件
-        "-ar",
-        "96000",  # 采样率 96000Hz
-        "-ac",
-        "2",  # 双声道
-        "-sample_fmt",
-        "s32",  # 32bit 位深度
-        "-acodec",
-        "pcm_s32le",  # 使用 32 位的 PCM 编码
-        output_path,  # 输出文件
-    ]
+    if resume and journal.is_done(unit_id("to_hires", input_path)):
+        return True
+    result = asyncio.run(
+        _convert_one(
+            input_path, output_path, None, None, journal, timeout, stall_timeout
+        )
+    )
+    return result.ok
 
-    try:
-        # 尝试运行系统的 ffmpeg
-        result = subprocess.run(
-            command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            errors="ignore",
+
+def convert_file(
+    input_path: str,
+    output_path: str,
+    cache,
+    journal,
+    resume: bool = False,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    split_parts: int = 1,
+) -> bool:
+    """
+    同步转换单个文件（任务日志、缓存、转换），供常驻进程在工作线程中逐个调用。
+    :param cache: 转换缓存，None 表示不使用
+    :param journal: 任务日志
+    :param resume: 任务日志中已完成（且输出仍存在）时直接跳过
+    :return: True 如果转换成功、命中缓存或已经完成
+    """
+    if resume and journal.is_done(unit_id("to_hires", input_path)):
+        return True
+    key = None
+    if cache is not None:
+        key = cache.make_key(input_path, ["to_hires", HIRES_OUTPUT_ARGS])
+        if cache.restore(key, output_path):
+            logger.info(f"命中缓存，已跳过: {input_path}")
+            return True
+    result = asyncio.run(
+        _convert_one(
+            input_path, output_path, cache, key, journal, timeout, stall_timeout, split_parts
         )
-        logger.info(f"转换完成: {output_path}")
-    except subprocess.CalledProcessError as e:
-        logger.info(f"系统 FFmpeg 转换失败: {input_path}，尝试使用本地 FFmpeg")
-        # 尝试使用当前目录下的 ffmpeg
-        local_ffmpeg = "./utils/ffmpeg"  # 假设 ffmpeg 在当前目录下的 utils 文件夹
-        command[0] = local_ffmpeg  # 替换为本地的 ffmpeg 可执行文件路径
-        try:
-            result = subprocess.run(
-                command,
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                errors="ignore",
-            )
-            logger.info(f"本地 FFmpeg 转换完成: {output_path}")
-            logger.info(result.stdout)  # 输出 FFmpeg 的信息
-        except subprocess.CalledProcessError as e:
-            logger.info(f"本地 FFmpeg 转换仍然失败: {input_path}，错误信息: {e}")
-            logger.info(e.stderr)  # 打印 FFmpeg 错误信息
+    )
+    return result.ok
 
 
-def process_directory(all_audio_input_dir: str, output_dir: str) -> None:
+def process_directory(
+    all_audio_input_dir: str,
+    output_dir: str,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    journal_path: str | None = None,
+    max_workers: int = DEFAULT_FFMPEG_LIMIT,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    metrics_dir: str | None = None,
+    plan: bool = True,
+    dry_run: bool = False,
+    extensions: tuple = (".mp3", ".wav"),
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    split_long: float | None = None,
+    split_parts: int = DEFAULT_FFMPEG_LIMIT,
+) -> list:
     """
     遍历指定目录，处理所有音频文件，调用转换函数将其转为 WAV 格式。
 
     :param all_audio_input_dir: 包含音频文件的输入目录
     :param output_dir: 转换后的 WAV 文件的输出目录
+    :param use_cache: 是否使用转换缓存跳过内容和参数都未变化的输入
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否跳过任务日志中已完成（且输出仍存在）的文件
+    :param journal_path: 任务日志路径，默认为输出目录下的 .itools_journal.jsonl
+    :param max_workers: 同时运行的转换任务数
+    :param timeout: 单个文件的墙钟时间预算（秒），None 表示不限制
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    :param metrics_dir: 性能报告的导出目录（run_report.json 与 itools.prom），None 表示不导出
+    :param plan: 是否先 ffprobe 所有输入，按时长从长到短提交任务并输出耗时与磁盘占用的预估；
+        为 False 时边扫描边提交任务
+    :param dry_run: 只输出预估，不进行转换
+    :param extensions: 需要转换的文件扩展名（不区分大小写）
+    :param recursive: 是否递归扫描子目录，子目录结构镜像到输出目录
+    :param include: 只转换匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :param split_long: 时长超过该秒数的文件切成多段并行转换，None 表示不切分
+    :param split_parts: 单个文件最多切成的段数
+    :return: 转换失败的输入文件路径列表
     """
     # 检查输入目录是否存在
     if not os.path.exists(all_audio_input_dir):
         logger.error(f"输入目录不存在: {all_audio_input_dir}")
         logger.info("请创建目录或修改代码中的 input_dir 路径")
-        return
+        return []
 
     if not os.path.isdir(all_audio_input_dir):
         logger.error(f"输入路径不是目录: {all_audio_input_dir}")
-        return
+        return []
 
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
-    # 搜索目录中的 MP3 和 WAV 文件
-    audio_files = [
-        f for f in os.listdir(all_audio_input_dir) if f.endswith((".mp3", ".wav"))
-    ]
-    if not audio_files:
-        logger.warning(f"目录中没有找到音频文件 (.mp3 或 .wav): {all_audio_input_dir}")
-        return
+    def make_jobs(scanned_files, durations, counts):
+        # 开始转换时才打开缓存和任务日志，只输出预估时不会创建任务日志
+        cache = open_cache(cache_path) if use_cache else None
+        journal = open_journal(journal_path or os.path.join(output_dir, JOURNAL_FILENAME))
+        for scanned in scanned_files:
+            input_path = scanned.path
+            # 保持原文件名，仅修改扩展名为 .wav
+            output_path = mirror_output_path(output_dir, scanned, ".wav")
 
-    logger.info(f"找到 {len(audio_files)} 个音频文件，开始转换...")
+            if resume and journal.is_done(unit_id("to_hires", input_path)):
+                counts["resumed"] += 1
+                continue
 
-    # 使用多线程处理音频文件的转换
-    with ThreadPoolExecutor() as executor:
-        for filename in audio_files:
-            input_path = os.path.join(all_audio_input_dir, filename)
-            output_filename = (
-                os.path.splitext(filename)[0] + ".wav"
-            )  # 保持原文件名，仅修改扩展名为 .wav
-            output_path = os.path.join(output_dir, output_filename)
-            executor.submit(convert_audio_to_wav, input_path, output_path)
+            key = None
+            if cache is not None:
+                key = cache.make_key(input_path, ["to_hires", HIRES_OUTPUT_ARGS])
+                if cache.restore(key, output_path):
+                    counts["skipped"] += 1
+                    continue
+            yield input_path, partial(
+                _convert_one,
+                input_path,
+                output_path,
+                cache,
+                key,
+                journal,
+                timeout,
+                stall_timeout,
+                split_parts_for(
+                    input_path, durations.get(input_path), split_long, split_parts
+                ),
+            )
 
-    logger.info("所有音频转换完成！")
+    # 递归扫描目录中的音频文件（默认为 MP3 和 WAV），子目录结构镜像到输出目录
+    return run_batch(
+        "to_hires",
+        all_audio_input_dir,
+        extensions,
+        [output_dir],
+        make_jobs,
+        "转换",
+        ESTIMATED_BYTES_PER_SECOND["to_hires"],
+        DEFAULT_REALTIME_FACTORS["to_hires"],
+        max_workers,
+        cache_path if use_cache else None,
+        metrics_dir,
+        plan,
+        dry_run,
+        recursive,
+        include,
+        exclude,
+    )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="音频转高清 WAV（96kHz/32bit）")
+    parser.add_argument("--input", default=r"./data", help="音频文件所在的目录")
+    parser.add_argument("--output", default=r"./output", help="转换后的 WAV 文件存放目录")
+    parser.add_argument(
+        "--resume", action="store_true", help="根据任务日志跳过上次已完成的文件"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不使用转换缓存，强制重新转换所有文件"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_FFMPEG_LIMIT, help="同时运行的转换任务数"
+    )
+    parser.add_argument(
+        "--job-timeout", type=float, default=None, help="单个文件的墙钟时间预算（秒）"
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只输出耗时与磁盘占用的预估，不进行转换"
+    )
+    parser.add_argument(
+        "--no-plan", action="store_true", help="不预先探测和排序，边扫描目录边开始转换"
+    )
+    add_scan_arguments(parser)
+    parser.add_argument(
+        "--metrics-dir", default=None, help="导出性能报告（JSON 与 Prometheus textfile）的目录"
+    )
+    parser.add_argument(
+        "--split-long",
+        type=float,
+        default=None,
+        help="时长超过该秒数的文件切成多段并行转换后拼接，默认不切分",
+    )
+    parser.add_argument(
+        "--split-parts",
+        type=int,
+        default=DEFAULT_FFMPEG_LIMIT,
+        help="单个文件最多切成的段数",
+    )
+    args = parser.parse_args()
+
     # 首先检测并确保 FFmpeg 已安装
     ensure_ffmpeg()
 
-    # 定义要转换的目录
-    input_dir = r"./data"  # 音频文件所在的目录
-    output_dir = r"./output"  # 转换后的 WAV 文件存放目录
-    process_directory(input_dir, output_dir)
+    process_directory(
+        args.input,
+        args.output,
+        use_cache=not args.no_cache,
+        resume=args.resume,
+        max_workers=args.workers,
+        timeout=args.job_timeout,
+        stall_timeout=args.stall_timeout,
+        metrics_dir=args.metrics_dir,
+        plan=not args.no_plan,
+        dry_run=args.dry_run,
+        recursive=not args.no_recursive,
+        include=args.include,
+        exclude=args.exclude,
+        split_long=args.split_long,
+        split_parts=args.split_parts,
+    )
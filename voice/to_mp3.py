@@ -1,222 +1,394 @@
+import argparse
+import asyncio
 import os
-import subprocess
-import sys
-import platform
-from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from loguru import logger
 
-
-def check_ffmpeg_installed() -> bool:
-    """
-    检测系统是否安装了 FFmpeg
-    :return: True 如果 FFmpeg 可用，否则 False
-    """
-    try:
-        result = subprocess.run(
-            ["ffmpeg", "-version"],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            timeout=5,
-        )
-        return result.returncode == 0
-    except (FileNotFoundError, subprocess.TimeoutExpired):
-        return False
-
-
-def install_ffmpeg() -> bool:
-    """
-    根据操作系统自动安装 FFmpeg
-    :return: True 如果安装成功，否则 False
-    """
-    system = platform.system().lower()
-    logger.info(f"检测到操作系统: {system}")
-
-    try:
-        if system == "linux":
-            # 检测 Linux 发行版
-            if os.path.exists("/etc/debian_version"):
-                logger.info("使用 apt 安装 FFmpeg...")
-                subprocess.run(["sudo", "apt-get", "update"], check=True)
-                subprocess.run(
-                    ["sudo", "apt-get", "install", "-y", "ffmpeg"], check=True
-                )
-            elif os.path.exists("/etc/redhat-release"):
-                logger.info("使用 yum 安装 FFmpeg...")
-                subprocess.run(["sudo", "yum", "install", "-y", "ffmpeg"], check=True)
-            elif os.path.exists("/etc/arch-release"):
-                logger.info("使用 pacman 安装 FFmpeg...")
-                subprocess.run(
-                    ["sudo", "pacman", "-S", "--noconfirm", "ffmpeg"], check=True
-                )
-            else:
-                logger.error("未识别的 Linux 发行版，请手动安装 FFmpeg")
-                return False
-
-        elif system == "darwin":  # macOS
-            logger.info("使用 Homebrew 安装 FFmpeg...")
-            brew_check = subprocess.run(["which", "brew"], capture_output=True)
-            if brew_check.returncode != 0:
-                logger.error(
-                    '未安装 Homebrew，请先安装: /bin/bash -c "$(curl -fsSL https://raw.githubusercontent.com/Homebrew/install/HEAD/install.sh)"'
-                )
-                return False
-            subprocess.run(["brew", "install", "ffmpeg"], check=True)
-
-        elif system == "windows":
-            logger.warning("Windows 系统暂不支持自动安装")
-            logger.info("请访问 https://ffmpeg.org/download.html 下载 FFmpeg")
-            logger.info("或使用 Chocolatey 安装: choco install ffmpeg")
-            return False
-
-        else:
-            logger.error(f"不支持的操作系统: {system}")
-            return False
-
-        # 验证安装是否成功
-        if check_ffmpeg_installed():
-            logger.info("FFmpeg 安装成功！")
-            return True
-        else:
-            logger.error("FFmpeg 安装失败，请手动安装")
-            return False
-
-    except subprocess.CalledProcessError as e:
-        logger.error(f"安装 FFmpeg 时出错: {e}")
-        return False
-    except Exception as e:
-        logger.error(f"未知错误: {e}")
-        return False
-
-
-def ensure_ffmpeg() -> None:
+from conversion_cache import DEFAULT_CACHE_PATH, open_cache
+from ffmpeg_runner import (
+    DEFAULT_STALL_TIMEOUT,
+    FFmpegResult,
+    run_ffmpeg_async,
+)
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ensure_ffmpeg, get_ffmpeg_capabilities
+from job_journal import (
+    JOURNAL_FILENAME,
+    commit_partial,
+    discard_partial,
+    open_journal,
+    partial_path,
+    unit_id,
+)
+from media_scanner import add_scan_arguments, mirror_output_path
+from metrics import measure
+from planner import (
+    DEFAULT_REALTIME_FACTORS,
+    ESTIMATED_BYTES_PER_SECOND,
+    run_batch,
+)
+from split_encode import split_convert_mp3, split_parts_for
+
+# 需要转换的输入扩展名（不区分大小写）
+AUDIO_EXTENSIONS = (".mp3", ".wav")
+
+# MP3 的输出参数，同时作为转换缓存键的一部分
+MP3_OUTPUT_ARGS = [
+    "-acodec",
+    "mp3",  # 使用 MP3 编码 (替代 libmp3lame)
+    "-q:a",
+    "2",  # 设置 MP3 的质量 (0-9, 0 是最高质量)
+]
+
+
+def build_mp3_command(input_path: str, output_path: str, ffmpeg_path: str) -> list:
     """
-    确保 FFmpeg 可用，如果不可用则尝试安装
+    生成转换为 MP3 的 FFmpeg 命令，输出先写入 .part 临时文件。
     """
-    if check_ffmpeg_installed():
-        logger.info("FFmpeg 已安装 ✓")
-        return
-
-    logger.warning("未检测到 FFmpeg，准备自动安装...")
-    if not install_ffmpeg():
-        logger.error("FFmpeg 安装失败，程序无法继续运行")
-        sys.exit(1)
+    return [
+        ffmpeg_path,
+        "-nostdin",  # 不读取标准输入，避免卡在覆盖确认提示上
+        "-y",  # 覆盖已有输出（是否需要重新转换由缓存决定）
+        "-i",
+        input_path,  # 输入文件
+        *MP3_OUTPUT_ARGS,
+        "-f",
+        "mp3",
+        partial_path(output_path),  # 先写入 .part 临时文件，成功后再原子重命名
+    ]
 
 
-def find_ffmpeg() -> str:
+async def convert_audio_to_mp3_async(
+    input_path: str,
+    output_path: str,
+    ffmpeg_path: str,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    split_parts: int = 1,
+) -> FFmpegResult:
     """
-    查找可用的 FFmpeg 路径，优先使用系统 FFmpeg，如果不可用，则尝试使用本地 ffmpeg 可执行文件。
+    异步版本的 convert_audio_to_mp3，返回 FFmpeg 运行结果。
+    :param input_path: 输入音频文件的路径
+    :param output_path: 转换后的 MP3 文件的输出路径
+    :param ffmpeg_path: FFmpeg 可执行文件路径
+    :param timeout: 单个任务的墙钟时间预算（秒）
+    :param stall_timeout: 没有进度多长时间视为卡住（秒）
+    :param split_parts: 大于 1 时按帧边界切成最多这么多段并行编码，再无缝拼接为一个文件（需要 libmp3lame）
     """
-    # 检查系统是否安装了 ffmpeg
-    if (
-        subprocess.run(
-            ["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.PIPE
-        ).returncode
-        == 0
-    ):
-        return "ffmpeg"
-
-    # 尝试使用本地 ffmpeg
-    local_ffmpeg = "./utils/ffmpeg"
-    if os.path.exists(local_ffmpeg) and os.access(local_ffmpeg, os.X_OK):
-        return local_ffmpeg
-
-    # 如果都找不到，抛出异常
-    raise FileNotFoundError(
-        "未找到可用的 FFmpeg，请安装 FFmpeg 或将其放入 utils 目录。"
-    )
+    result = None
+    if split_parts > 1:
+        result = await split_convert_mp3(
+            input_path, output_path, MP3_OUTPUT_ARGS, split_parts, timeout, stall_timeout
+        )
+    if result is None:
+        result = await run_ffmpeg_async(
+            build_mp3_command(input_path, output_path, ffmpeg_path),
+            timeout=timeout,
+            stall_timeout=stall_timeout,
+        )
+    if result.ok:
+        commit_partial(output_path)
+        logger.info(f"转换完成: {output_path}")
+    else:
+        discard_partial(output_path)
+        logger.error(
+            f"FFmpeg 转换失败: {input_path}，错误信息: {result.error}\n{result.stderr}"
+        )
+    return result
 
 
-def convert_audio_to_mp3(input_path: str, output_path: str, ffmpeg_path: str) -> None:
+def convert_audio_to_mp3(input_path: str, output_path: str, ffmpeg_path: str) -> bool:
     """
     使用 FFmpeg 将音频文件转换为 MP3 文件。
 
     :param input_path: 输入音频文件的路径 (MP3 或 WAV)
     :param output_path: 转换后的 MP3 文件的输出路径
     :param ffmpeg_path: FFmpeg 可执行文件路径
+    :return: True 如果转换成功
     """
-    command = [
-        ffmpeg_path,
-        "-i",
-        input_path,  # 输入文件
-        "-acodec",
-        "mp3",  # 使用 MP3 编码 (替代 libmp3lame)
-        "-q:a",
-        "2",  # 设置 MP3 的质量 (0-9, 0 是最高质量)
-        output_path,  # 输出文件
-    ]
-
-    try:
-        # 指定 encoding='utf-8' 来解决编码问题
-        result = subprocess.run(
-            command,
-            check=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
+    return asyncio.run(
+        convert_audio_to_mp3_async(input_path, output_path, ffmpeg_path)
+    ).ok
+
+
+async def _convert_one(
+    input_path: str,
+    output_path: str,
+    ffmpeg_path: str,
+    cache,
+    key,
+    journal,
+    timeout,
+    stall_timeout,
+    split_parts: int = 1,
+) -> FFmpegResult:
+    """
+    转换单个文件，成功后写入缓存，并在任务日志中记录开始和结束状态。
+    """
+    unit = unit_id("to_mp3", input_path)
+    journal.record(unit, "started")
+    with measure("convert_audio_to_mp3", input_path) as stage:
+        result = await convert_audio_to_mp3_async(
+            input_path, output_path, ffmpeg_path, timeout, stall_timeout, split_parts
         )
-        logger.info(f"转换完成: {output_path}")
-    except subprocess.CalledProcessError as e:
-        logger.error(f"FFmpeg 转换失败: {input_path}，错误信息: {e.stderr or e.stdout}")
+        if result.out_time_us is not None:
+            stage.audio_seconds = result.out_time_us / 1e6
+        if result.ok:
+            stage.outputs.append(output_path)
+        else:
+            stage.fail()
+    if not result.ok:
+        journal.record(unit, "failed", error=result.error)
+        return result
+    if cache is not None:
+        cache.store(key, [output_path])
+    journal.record(unit, "done", outputs=[os.path.abspath(output_path)])
+    return result
+
+
+def convert_file(
+    input_path: str,
+    output_path: str,
+    ffmpeg_path: str,
+    cache,
+    journal,
+    resume: bool = False,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    split_parts: int = 1,
+) -> bool:
+    """
+    同步转换单个文件（任务日志、缓存、转换），供常驻进程在工作线程中逐个调用。
+    :param ffmpeg_path: FFmpeg 可执行文件路径
+    :param cache: 转换缓存，None 表示不使用
+    :param journal: 任务日志
+    :param resume: 任务日志中已完成（且输出仍存在）时直接跳过
+    :param split_parts: 大于 1 时分段并行编码（需要 libmp3lame）
+    :return: True 如果转换成功、命中缓存或已经完成
+    """
+    if resume and journal.is_done(unit_id("to_mp3", input_path)):
+        return True
+    key = None
+    if cache is not None:
+        # 分段编码关闭了比特池，输出与整体编码不完全相同，使用不同的缓存键
+        params = ["to_mp3", MP3_OUTPUT_ARGS] + (["split"] if split_parts > 1 else [])
+        key = cache.make_key(input_path, params)
+        if cache.restore(key, output_path):
+            logger.info(f"命中缓存，已跳过: {input_path}")
+            return True
+    result = asyncio.run(
+        _convert_one(
+            input_path,
+            output_path,
+            ffmpeg_path,
+            cache,
+            key,
+            journal,
+            timeout,
+            stall_timeout,
+            split_parts,
+        )
+    )
+    return result.ok
 
 
 def process_directory(
-    all_audio_input_dir: str, output_dir: str, max_workers: int = 4
-) -> None:
+    all_audio_input_dir: str,
+    output_dir: str,
+    max_workers: int = 4,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    resume: bool = False,
+    journal_path: str | None = None,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    metrics_dir: str | None = None,
+    plan: bool = True,
+    dry_run: bool = False,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    split_long: float | None = None,
+    split_parts: int = DEFAULT_FFMPEG_LIMIT,
+) -> list:
     """
     遍历指定目录，处理所有音频文件，调用转换函数将其转为 MP3 格式。
 
     :param all_audio_input_dir: 包含音频文件的输入目录
     :param output_dir: 转换后的 MP3 文件的输出目录
-    :param max_workers: 线程池最大工作线程数
+    :param max_workers: 同时运行的转换任务数
+    :param use_cache: 是否使用转换缓存跳过内容和参数都未变化的输入
+    :param cache_path: 缓存数据库路径
+    :param resume: 是否跳过任务日志中已完成（且输出仍存在）的文件
+    :param journal_path: 任务日志路径，默认为输出目录下的 .itools_journal.jsonl
+    :param timeout: 单个文件的墙钟时间预算（秒），None 表示不限制
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    :param metrics_dir: 性能报告的导出目录（run_report.json 与 itools.prom），None 表示不导出
+    :param plan: 是否先 ffprobe 所有输入，按时长从长到短提交任务并输出耗时与磁盘占用的预估；
+        为 False 时边扫描边提交任务
+    :param dry_run: 只输出预估，不进行转换
+    :param recursive: 是否递归扫描子目录，子目录结构镜像到输出目录
+    :param include: 只转换匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :param split_long: 时长超过该秒数的文件切成多段并行编码，None 表示不切分
+    :param split_parts: 单个文件最多切成的段数
+    :return: 转换失败的输入文件路径列表
     """
     # 检查输入目录是否存在
     if not os.path.exists(all_audio_input_dir):
         logger.error(f"输入目录不存在: {all_audio_input_dir}")
         logger.info("请创建目录或输入正确的目录路径")
-        return
+        return []
 
     if not os.path.isdir(all_audio_input_dir):
         logger.error(f"输入路径不是目录: {all_audio_input_dir}")
-        return
+        return []
 
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
 
-    # 搜索目录中的 MP3 和 WAV 文件
-    audio_files = [
-        f for f in os.listdir(all_audio_input_dir) if f.endswith((".mp3", ".wav"))
-    ]
-    if not audio_files:
-        logger.warning(f"目录中没有找到音频文件 (.mp3 或 .wav): {all_audio_input_dir}")
-        return
-
-    logger.info(f"找到 {len(audio_files)} 个音频文件，开始转换为 MP3...")
+    encoder = {}  # prepare() 探测到的 FFmpeg 路径和是否分段编码
 
-    # 查找可用的 FFmpeg
-    try:
-        ffmpeg_path = find_ffmpeg()
-    except FileNotFoundError as e:
-        logger.error(e)
-        return
-
-    # 使用多线程处理音频文件的转换
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        for filename in audio_files:
-            input_path = os.path.join(all_audio_input_dir, filename)
-            output_filename = (
-                os.path.splitext(filename)[0] + ".mp3"
-            )  # 仅修改扩展名为 .mp3
-            output_path = os.path.join(output_dir, output_filename)
-            executor.submit(convert_audio_to_mp3, input_path, output_path, ffmpeg_path)
-
-    logger.info("所有音频转换完成！")
+    def prepare() -> bool:
+        # 使用进程内共享的探测结果，不再逐个任务查找 FFmpeg；只输出预估时不需要
+        try:
+            capabilities = get_ffmpeg_capabilities()
+        except FileNotFoundError as e:
+            logger.error(e)
+            return False
+        if capabilities.mp3_encoder is None:
+            logger.error(f"当前 FFmpeg 没有可用的 MP3 编码器: {capabilities.path}")
+            return False
+        encoder["path"] = capabilities.path
+        encoder["split_long"] = split_long
+        if split_long is not None and capabilities.mp3_encoder != "libmp3lame":
+            # 分段编码依赖 libmp3lame 的 -reservoir 选项和 LAME 标签
+            logger.warning(
+                f"MP3 编码器 {capabilities.mp3_encoder} 不支持分段编码，长文件将整体编码"
+            )
+            encoder["split_long"] = None
+        return True
+
+    def make_jobs(scanned_files, durations, counts):
+        # 开始转换时才打开缓存和任务日志，只输出预估时不会创建任务日志
+        cache = open_cache(cache_path) if use_cache else None
+        journal = open_journal(journal_path or os.path.join(output_dir, JOURNAL_FILENAME))
+        for scanned in scanned_files:
+            input_path = scanned.path
+            output_path = mirror_output_path(output_dir, scanned, ".mp3")  # 仅修改扩展名为 .mp3
+
+            if resume and journal.is_done(unit_id("to_mp3", input_path)):
+                counts["resumed"] += 1
+                continue
+
+            parts = split_parts_for(
+                input_path, durations.get(input_path), encoder["split_long"], split_parts
+            )
+            key = None
+            if cache is not None:
+                # 分段编码关闭了比特池，输出与整体编码不完全相同，使用不同的缓存键
+                params = ["to_mp3", MP3_OUTPUT_ARGS] + (["split"] if parts > 1 else [])
+                key = cache.make_key(input_path, params)
+                if cache.restore(key, output_path):
+                    counts["skipped"] += 1
+                    continue
+            yield input_path, partial(
+                _convert_one,
+                input_path,
+                output_path,
+                encoder["path"],
+                cache,
+                key,
+                journal,
+                timeout,
+                stall_timeout,
+                parts,
+            )
+
+    # 递归扫描目录中的 MP3 和 WAV 文件（不区分大小写），子目录结构镜像到输出目录
+    return run_batch(
+        "to_mp3",
+        all_audio_input_dir,
+        AUDIO_EXTENSIONS,
+        [output_dir],
+        make_jobs,
+        "转换为 MP3",
+        ESTIMATED_BYTES_PER_SECOND["to_mp3"],
+        DEFAULT_REALTIME_FACTORS["to_mp3"],
+        max_workers,
+        cache_path if use_cache else None,
+        metrics_dir,
+        plan,
+        dry_run,
+        recursive,
+        include,
+        exclude,
+        prepare,
+    )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="音频转 MP3")
+    parser.add_argument("--input", help="音频文件所在的目录，不指定时交互输入")
+    parser.add_argument("--output", help="转换后的 MP3 文件存放目录，不指定时交互输入")
+    parser.add_argument(
+        "--resume", action="store_true", help="根据任务日志跳过上次已完成的文件"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="不使用转换缓存，强制重新转换所有文件"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="同时运行的转换任务数")
+    parser.add_argument(
+        "--job-timeout", type=float, default=None, help="单个文件的墙钟时间预算（秒）"
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    parser.add_argument(
+        "--dry-run", action="store_true", help="只输出耗时与磁盘占用的预估，不进行转换"
+    )
+    parser.add_argument(
+        "--no-plan", action="store_true", help="不预先探测和排序，边扫描目录边开始转换"
+    )
+    add_scan_arguments(parser)
+    parser.add_argument(
+        "--metrics-dir", default=None, help="导出性能报告（JSON 与 Prometheus textfile）的目录"
+    )
+    parser.add_argument(
+        "--split-long",
+        type=float,
+        default=None,
+        help="时长超过该秒数的文件切成多段并行编码后无缝拼接，默认不切分",
+    )
+    parser.add_argument(
+        "--split-parts",
+        type=int,
+        default=DEFAULT_FFMPEG_LIMIT,
+        help="单个文件最多切成的段数",
+    )
+    args = parser.parse_args()
+
     # 首先检测并确保 FFmpeg 已安装
     ensure_ffmpeg()
 
-    input_dir = input("请输入音频文件所在的目录: ").strip()
-    output_dir = input("请输入转换后的 MP3 文件存放目录: ").strip()
-    process_directory(input_dir, output_dir, max_workers=4)
+    input_dir = args.input or input("请输入音频文件所在的目录: ").strip()
+    output_dir = args.output or input("请输入转换后的 MP3 文件存放目录: ").strip()
+    process_directory(
+        input_dir,
+        output_dir,
+        max_workers=args.workers,
+        use_cache=not args.no_cache,
+        resume=args.resume,
+        timeout=args.job_timeout,
+        stall_timeout=args.stall_timeout,
+        metrics_dir=args.metrics_dir,
+        plan=not args.no_plan,
+        dry_run=args.dry_run,
+        recursive=not args.no_recursive,
+        include=args.include,
+        exclude=args.exclude,
+        split_long=args.split_long,
+        split_parts=args.split_parts,
+    )
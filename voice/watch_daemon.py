@@ -0,0 +1,627 @@
+"""
+监视目录的常驻模式：持续监视输入目录，新文件写完后立即交给常驻工作池处理（to_hires、to_mp3 或视频分段）。
+- Linux 上通过 ctypes 调用 inotify，文件关闭写入（IN_CLOSE_WRITE）或被移动进来（IN_MOVED_TO）后再等待一小段静默期即开始处理，
+  不需要反复扫描目录；新建的子目录自动加入监视
+- 不支持 inotify（非 Linux、网络文件系统、监视数量超出上限）时退回轮询：文件大小和修改时间在一段时间内不变才视为写完
+- 工作池、FFmpeg 探测结果、转换缓存和任务日志在启动时初始化一次，处理每个文件时直接复用
+- 收到 SIGTERM/SIGINT 后停止监视，等待已提交的任务全部完成再退出；再次收到信号则取消排队中的任务，只等待运行中的任务
+"""
+import argparse
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import signal
+import struct
+import sys
+import threading
+import time
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH
+from ffmpeg_runner import DEFAULT_STALL_TIMEOUT
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ensure_ffmpeg, set_ffmpeg_limit
+from job_handlers import TOOLS, ToolHandler
+from media_scanner import ScanFilter, ScannedFile, add_scan_arguments, iter_scan
+from worker_pool import WorkerPool
+
+# 文件关闭写入后等待的静默期（秒），期间再次写入则重新计时
+DEFAULT_QUIET_SECONDS = 0.25
+# 轮询模式下两次扫描的间隔（秒）
+DEFAULT_POLL_INTERVAL = 2.0
+# 轮询模式下文件大小和修改时间保持不变多长时间才视为写完（秒）
+DEFAULT_STABLE_SECONDS = 3.0
+# 主循环最长的等待时间（秒），决定响应停止信号的延迟
+_MAX_WAIT_SECONDS = 0.5
+
+# inotify 事件掩码，见 <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = (
+    _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF | _IN_MOVE_SELF | _IN_ONLYDIR
+)
+# struct inotify_event 的固定部分：wd、mask、cookie、len，之后是 len 字节的文件名
+_EVENT_HEADER = struct.Struct("iIII")
+_READ_SIZE = 64 * 1024
+
+
+def _load_libc():
+    """
+    加载提供 inotify 的 libc，不可用时返回 None。
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    """
+    inotify 监视器：每个目录一个 watch，读取到的事件转换为 (mask, 目录路径, 相对路径)。
+    """
+
+    def __init__(self, libc):
+        self._libc = libc
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code))
+        self._fd = fd
+        self._dirs = {}  # wd -> (目录路径, 相对输入根目录的前缀)
+
+    def add_watch(self, path: str, prefix: str) -> None:
+        """
+        监视一个目录（不含子目录）。
+        :param prefix: 目录相对输入根目录的路径，以 "/" 结尾，根目录为空字符串
+        :raises OSError: 添加失败，如超出 fs.inotify.max_user_watches（ENOSPC）
+        """
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise OSError(code, os.strerror(code), path)
+        self._dirs[wd] = (path, prefix)
+
+    def read(self, timeout: float) -> list:
+        """
+        等待并读取事件。
+        :param timeout: 最长等待时间（秒）
+        :return: (mask, 事件所在目录的路径, 事件对象相对输入根目录的路径) 的列表；队列溢出时目录路径为 None
+        """
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, _READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((mask, None, ""))
+                continue
+            watched = self._dirs.get(wd)
+            if watched is None:
+                continue
+            if mask & _IN_IGNORED:
+                # 目录已被删除或移走，内核自动移除了 watch
+                del self._dirs[wd]
+                continue
+            directory, prefix = watched
+            events.append((mask, directory, prefix + name if name else prefix.rstrip("/")))
+        return events
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _Pending:
+    """
+    等待写完的文件：到期时若 signature 为 None（inotify 已确认关闭写入）直接处理，
+    否则重新 stat，大小和修改时间不变才处理。
+    """
+
+    __slots__ = ("scanned", "deadline", "signature")
+
+    def __init__(self, scanned: ScannedFile, deadline: float, signature):
+        self.scanned = scanned
+        self.deadline = deadline
+        self.signature = signature
+
+
+def _signature(path: str):
+    """
+    文件的 (大小, 修改时间)，文件不存在时返回 None。
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WatchDaemon:
+    """
+    监视输入目录并把写完的文件提交到常驻工作池。
+    """
+
+    def __init__(
+        self,
+        input_dir: str,
+        handler,
+        pool: WorkerPool,
+        scan_filter: ScanFilter,
+        recursive: bool = True,
+        skip_dirs=(),
+        use_inotify: bool = True,
+        quiet_seconds: float = DEFAULT_QUIET_SECONDS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        stable_seconds: float = DEFAULT_STABLE_SECONDS,
+    ):
+        """
+        :param input_dir: 监视的输入目录
+        :param handler: 单文件处理器，以 handler(scanned, resume) 调用，返回是否成功
+        :param pool: 常驻工作池
+        :param scan_filter: 扩展名与 --include/--exclude 规则
+        :param recursive: 是否监视子目录
+        :param skip_dirs: 不监视的目录，如位于输入目录内的输出目录
+        :param use_inotify: 是否使用 inotify，为 False 或不可用时使用轮询
+        :param quiet_seconds: 文件关闭写入后的静默期（秒）
+        :param poll_interval: 轮询间隔（秒）
+        :param stable_seconds: 轮询模式下文件保持不变多长时间才视为写完（秒）
+        """
+        self.input_dir = input_dir
+        self.handler = handler
+        self.pool = pool
+        self.scan_filter = scan_filter
+        self.recursive = recursive
+        self.skip_dirs = list(skip_dirs)
+        self._skip = {os.path.realpath(path) for path in skip_dirs}
+        self.use_inotify = use_inotify
+        self.quiet_seconds = quiet_seconds
+        self.poll_interval = poll_interval
+        self.stable_seconds = stable_seconds
+
+        self._watcher = None
+        self._pending = {}  # 相对路径 -> _Pending
+        self._seen = {}  # 轮询模式：相对路径 -> 已提交时的 (大小, 修改时间)
+        self._lock = threading.Lock()
+        self._active = {}  # 输入路径 -> 运行或排队中的 Job
+        self._dirty = set()  # 处理期间再次写完、结束后需要重新处理的输入路径
+        self._stop = threading.Event()
+        self._abort = threading.Event()
+        self.processed = 0
+        self.failed = 0
+
+    def stop(self) -> None:
+        """
+        请求停止：第一次调用停止监视并排空已提交的任务，再次调用取消排队中的任务。
+        只设置标志，可以在信号处理函数中调用。
+        """
+        if self._stop.is_set():
+            self._abort.set()
+        else:
+            self._stop.set()
+
+    def run(self, initial_scan: bool = True) -> None:
+        """
+        开始监视，直到 stop 被调用，然后等待已提交的任务完成。
+        :param initial_scan: 是否先处理目录中已有的文件（任务日志中已完成的跳过）
+        """
+        self._watcher = self._open_watcher()
+        mode = "inotify" if self._watcher is not None else f"轮询（每 {self.poll_interval} 秒）"
+        # 先建立监视再扫描已有文件，两者之间写完的文件不会漏掉（重复的由 _dispatch 合并）
+        if initial_scan:
+            count = 0
+            for scanned in self._scan(self.input_dir, ""):
+                self._seen[scanned.relative_path] = _signature(scanned.path)
+                self._dispatch(scanned, resume=True)
+                count += 1
+            logger.info(f"已提交目录中已有的 {count} 个文件")
+        elif self._watcher is None:
+            self._seen = {
+                scanned.relative_path: _signature(scanned.path)
+                for scanned in self._scan(self.input_dir, "")
+            }
+        logger.info(f"开始监视目录（{mode}）: {self.input_dir}")
+
+        next_poll = time.monotonic() + self.poll_interval
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                wait = _MAX_WAIT_SECONDS
+                if self._pending:
+                    wait = min(wait, max(0.0, min(p.deadline for p in self._pending.values()) - now))
+                if self._watcher is not None:
+                    for mask, directory, relative_path in self._watcher.read(wait):
+                        self._handle_event(mask, directory, relative_path)
+                else:
+                    if now >= next_poll:
+                        self._poll()
+                        next_poll = now + self.poll_interval
+                    wait = min(wait, max(0.0, next_poll - now))
+                    self._stop.wait(wait)
+                self._flush_pending()
+        finally:
+            if self._watcher is not None:
+                self._watcher.close()
+            self._drain()
+
+    def _open_watcher(self) -> InotifyWatcher | None:
+        if not self.use_inotify:
+            return None
+        libc = _load_libc()
+        if libc is None:
+            logger.info("当前系统不支持 inotify，使用轮询监视")
+            return None
+        try:
+            watcher = InotifyWatcher(libc)
+        except OSError as e:
+            logger.warning(f"inotify 初始化失败，使用轮询监视，错误信息: {e}")
+            return None
+        try:
+            self._watch_tree(watcher, self.input_dir, "")
+        except OSError as e:
+            watcher.close()
+            if e.errno == errno.ENOSPC:
+                logger.warning(
+                    "inotify 监视数量超出上限（可调大 fs.inotify.max_user_watches），使用轮询监视"
+                )
+            else:
+                logger.warning(f"无法监视目录，使用轮询监视，错误信息: {e}")
+            return None
+        return watcher
+
+    def _watch_tree(self, watcher: InotifyWatcher, root: str, prefix: str) -> None:
+        """
+        监视 root 及其所有（未被排除的）子目录。
+        """
+        stack = [(root, prefix)]
+        while stack:
+            directory, prefix = stack.pop()
+            watcher.add_watch(directory, prefix)
+            if not self.recursive:
+                continue
+            try:
+                with os.scandir(directory) as iterator:
+                    for entry in iterator:
+                        relative_path = prefix + entry.name
+                        try:
+                            if not entry.is_dir(follow_symlinks=False):
+                                continue
+                        except OSError:
+                            continue
+                        if self._skips_dir(entry.path, relative_path, entry.name):
+                            continue
+                        stack.append((entry.path, relative_path + "/"))
+            except FileNotFoundError:
+                continue  # 目录在监视前已被删除
+
+    def _skips_dir(self, path: str, relative_path: str, name: str) -> bool:
+        if self.scan_filter.excludes(relative_path, name):
+            return True
+        return bool(self._skip) and os.path.realpath(path) in self._skip
+
+    def _scan(self, root: str, prefix: str):
+        return iter_scan(root, self.scan_filter, self.recursive, self.skip_dirs, prefix)
+
+    def _handle_event(self, mask: int, directory: str | None, relative_path: str) -> None:
+        if directory is None:
+            # 事件队列溢出，可能丢失了事件：扫描一次，未完成的文件照常处理
+            logger.warning("inotify 事件队列溢出，重新扫描输入目录")
+            for scanned in self._scan(self.input_dir, ""):
+                self._dispatch(scanned, resume=True)
+            return
+        if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+            if not relative_path:
+                logger.error(f"输入目录已被删除或移走，停止监视: {self.input_dir}")
+                self._stop.set()
+            return
+
+        name = os.path.basename(relative_path)
+        path = os.path.join(directory, name)
+        if mask & _IN_ISDIR:
+            if not mask & (_IN_CREATE | _IN_MOVED_TO) or not self.recursive:
+                return
+            if self._skips_dir(path, relative_path, name):
+                return
+            try:
+                self._watch_tree(self._watcher, path, relative_path + "/")
+            except OSError as e:
+                logger.warning(f"无法监视新目录: {path}，错误信息: {e}")
+                return
+            # 新目录中已有的文件（如整个目录被移进来）不会再产生事件，按大小稳定判断是否写完
+            deadline = time.monotonic() + self.stable_seconds
+            for scanned in self._scan(path, relative_path + "/"):
+                self._pending[scanned.relative_path] = _Pending(
+                    scanned, deadline, _signature(scanned.path)
+                )
+            return
+
+        if mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO) and self.scan_filter.accepts(relative_path):
+            # 多次打开写入的文件每次关闭都会重新计时，静默期过后才处理
+            self._pending[relative_path] = _Pending(
+                ScannedFile(path, relative_path), time.monotonic() + self.quiet_seconds, None
+            )
+
+    def _poll(self) -> None:
+        """
+        轮询模式：扫描一次，新出现或变化的文件进入等待，大小和修改时间稳定后处理。
+        """
+        present = set()
+        deadline = time.monotonic() + self.stable_seconds
+        for scanned in self._scan(self.input_dir, ""):
+            relative_path = scanned.relative_path
+            present.add(relative_path)
+            if relative_path in self._pending:
+                continue
+            signature = _signature(scanned.path)
+            if signature is not None and signature != self._seen.get(relative_path):
+                self._pending[relative_path] = _Pending(scanned, deadline, signature)
+        for relative_path in list(self._seen):
+            if relative_path not in present:
+                del self._seen[relative_path]
+
+    def _flush_pending(self) -> None:
+        now = time.monotonic()
+        for relative_path, pending in list(self._pending.items()):
+            if pending.deadline > now:
+                continue
+            if pending.signature is not None:
+                signature = _signature(pending.scanned.path)
+                if signature is None:
+                    del self._pending[relative_path]  # 文件已被删除
+                    continue
+                if signature != pending.signature:
+                    # 仍在写入，重新计时
+                    pending.signature = signature
+                    pending.deadline = now + self.stable_seconds
+                    continue
+                self._seen[relative_path] = signature
+            elif not os.path.isfile(pending.scanned.path):
+                del self._pending[relative_path]
+                continue
+            del self._pending[relative_path]
+            self._dispatch(pending.scanned, resume=False)
+
+    def _dispatch(self, scanned: ScannedFile, resume: bool) -> None:
+        """
+        提交一个文件。同一文件已在处理中时只做标记，结束后再处理一次最新的内容。
+        """
+        with self._lock:
+            if self._stop.is_set():
+                return
+            if scanned.path in self._active:
+                self._dirty.add(scanned.path)
+                return
+            try:
+                job = self.pool.submit(
+                    self.handler,
+                    scanned,
+                    resume,
+                    name=scanned.relative_path,
+                    on_done=lambda job: self._job_done(scanned, job),
+                )
+            except RuntimeError:
+                return
+            self._active[scanned.path] = job
+
+    def _job_done(self, scanned: ScannedFile, job) -> None:
+        with self._lock:
+            self._active.pop(scanned.path, None)
+            rerun = scanned.path in self._dirty
+            self._dirty.discard(scanned.path)
+            if job.state == "done":
+                self.processed += 1
+            elif job.state == "failed":
+                self.failed += 1
+                logger.error(f"处理失败: {scanned.path}")
+        if rerun:
+            self._dispatch(scanned, resume=False)
+
+    def _drain(self) -> None:
+        """
+        停止接收新文件，等待已提交的任务完成；期间再次收到停止请求则取消排队中的任务。
+        """
+        self._pending.clear()
+        pending = self.pool.pending()
+        if pending:
+            logger.info(f"停止监视，等待 {pending} 个任务完成（再次发送停止信号取消排队中的任务）")
+        self.pool.drain(self._abort, _MAX_WAIT_SECONDS)
+        logger.info(f"监视已停止：处理成功 {self.processed} 个文件，失败 {self.failed} 个")
+
+
+def watch_directory(
+    tool: str,
+    input_dir: str,
+    output_dir: str,
+    workers: int = DEFAULT_FFMPEG_LIMIT,
+    max_ffmpeg: int = DEFAULT_FFMPEG_LIMIT,
+    use_cache: bool = True,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    timeout: float | None = None,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    split_long: float | None = None,
+    fused: bool = False,
+    copy_segments: bool = False,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    use_inotify: bool = True,
+    initial_scan: bool = True,
+    quiet_seconds: float = DEFAULT_QUIET_SECONDS,
+    poll_interval: float = DEFAULT_POLL_INTERVAL,
+    stable_seconds: float = DEFAULT_STABLE_SECONDS,
+) -> None:
+    """
+    监视输入目录并持续处理新文件，直到收到 SIGTERM/SIGINT（需要在主线程调用）。
+    :param tool: 工具名称：to_hires、to_mp3 或 video
+    :param input_dir: 监视的输入目录
+    :param output_dir: 输出目录，输入的相对目录结构镜像到这里
+    :param workers: 常驻工作线程数（同时处理的文件数）
+    :param max_ffmpeg: 全局同时运行的 FFmpeg 进程上限
+    :param use_cache: 是否使用转换缓存
+    :param cache_path: 缓存数据库路径
+    :param timeout: 单个文件的墙钟时间预算（秒）
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    :param split_long: 时长超过该秒数的文件切成多段并行转换（仅音频工具）
+    :param fused: 视频工具使用单遍模式
+    :param copy_segments: 视频工具对已压缩的音频输入流复制切分
+    :param recursive: 是否监视子目录
+    :param include: 只处理匹配这些通配符的文件
+    :param exclude: 跳过匹配这些通配符的文件和目录
+    :param use_inotify: 是否使用 inotify，为 False 时使用轮询
+    :param initial_scan: 启动时是否处理目录中已有的文件
+    :param quiet_seconds: inotify 模式下文件关闭写入后的静默期（秒）
+    :param poll_interval: 轮询模式的扫描间隔（秒）
+    :param stable_seconds: 轮询模式下文件保持不变多长时间才视为写完（秒）
+    """
+    if not os.path.isdir(input_dir):
+        logger.error(f"输入目录不存在或不是目录: {input_dir}")
+        return
+
+    set_ffmpeg_limit(max_ffmpeg)
+    try:
+        handler = ToolHandler(
+            tool,
+            output_dir,
+            use_cache,
+            cache_path,
+            timeout,
+            stall_timeout,
+            split_long,
+            max_ffmpeg,
+            fused,
+            copy_segments,
+        )
+    except (FileNotFoundError, RuntimeError) as e:
+        logger.error(e)
+        return
+
+    daemon = WatchDaemon(
+        input_dir,
+        handler,
+        WorkerPool(workers, name=f"watch-{tool}"),
+        ScanFilter(handler.extensions, include, exclude),
+        recursive,
+        skip_dirs=[output_dir],
+        use_inotify=use_inotify,
+        quiet_seconds=quiet_seconds,
+        poll_interval=poll_interval,
+        stable_seconds=stable_seconds,
+    )
+
+    def on_signal(signum, frame):
+        daemon.stop()
+
+    previous = {
+        signum: signal.signal(signum, on_signal) for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    try:
+        daemon.run(initial_scan)
+    finally:
+        for signum, handler_before in previous.items():
+            signal.signal(signum, handler_before)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="监视目录，新文件写完后自动处理（常驻运行）")
+    parser.add_argument("--tool", choices=TOOLS, default="to_hires", help="处理新文件使用的工具")
+    parser.add_argument("--input", default=r"./data", help="监视的输入目录")
+    parser.add_argument("--output", default=r"./output", help="输出目录")
+    parser.add_argument(
+        "--workers", type=int, default=DEFAULT_FFMPEG_LIMIT, help="常驻工作线程数（同时处理的文件数）"
+    )
+    parser.add_argument(
+        "--max-ffmpeg",
+        type=int,
+        default=DEFAULT_FFMPEG_LIMIT,
+        help="全局同时运行的 FFmpeg 进程上限",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="不使用转换缓存")
+    parser.add_argument(
+        "--job-timeout", type=float, default=None, help="单个文件的墙钟时间预算（秒）"
+    )
+    parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    parser.add_argument(
+        "--split-long",
+        type=float,
+        default=None,
+        help="时长超过该秒数的音频切成多段并行转换后拼接，默认不切分",
+    )
+    parser.add_argument("--fused", action="store_true", help="视频工具使用单遍模式")
+    parser.add_argument(
+        "--copy-segments", action="store_true", help="视频工具对已压缩的音频输入流复制切分"
+    )
+    add_scan_arguments(parser)
+    parser.add_argument(
+        "--poll", action="store_true", help="不使用 inotify，定期扫描目录（用于网络文件系统）"
+    )
+    parser.add_argument(
+        "--no-initial-scan", action="store_true", help="启动时不处理目录中已有的文件"
+    )
+    parser.add_argument(
+        "--quiet-seconds",
+        type=float,
+        default=DEFAULT_QUIET_SECONDS,
+        help="文件关闭写入后等待的静默期（秒）",
+    )
+    parser.add_argument(
+        "--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL, help="轮询间隔（秒）"
+    )
+    parser.add_argument(
+        "--stable-seconds",
+        type=float,
+        default=DEFAULT_STABLE_SECONDS,
+        help="轮询模式下文件大小保持不变多长时间才视为写完（秒）",
+    )
+    args = parser.parse_args()
+
+    # 首先检测并确保 FFmpeg 已安装
+    ensure_ffmpeg()
+
+    watch_directory(
+        args.tool,
+        args.input,
+        args.output,
+        workers=args.workers,
+        max_ffmpeg=args.max_ffmpeg,
+        use_cache=not args.no_cache,
+        timeout=args.job_timeout,
+        stall_timeout=args.stall_timeout,
+        split_long=args.split_long,
+        fused=args.fused,
+        copy_segments=args.copy_segments,
+        recursive=not args.no_recursive,
+        include=args.include,
+        exclude=args.exclude,
+        use_inotify=not args.poll,
+        initial_scan=not args.no_initial_scan,
+        quiet_seconds=args.quiet_seconds,
+        poll_interval=args.poll_interval,
+        stable_seconds=args.stable_seconds,
+    )
@@ -0,0 +1,595 @@
+"""
+共享存储上的任务队列：多台机器指向同一个队列数据库（SQLite，放在 NFS 等共享目录上），共同处理一批文件。
+- 入队：扫描输入目录，每个文件一行（工具 + 输入绝对路径为主键，重复入队不会产生重复任务）
+- 领取：工作者在一个写事务中领取空闲名额数量的任务并获得租约，同一任务同一时间只属于一个工作者
+- 心跳：处理期间定期延长租约；工作者崩溃或断网后租约过期，任务回到待处理状态由其他工作者接手
+- 完成：只有仍持有租约的工作者才能提交结果，租约已被接手的结果作废，不会覆盖别人的记录
+共享存储上不使用 WAL（WAL 依赖共享内存，不能跨机器），使用默认的回滚日志和文件锁；
+各机器需要以相同的路径挂载共享目录，系统时钟需要同步（租约按墙钟时间判断过期）。
+"""
+import argparse
+import json
+import os
+import signal
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from loguru import logger
+
+from conversion_cache import DEFAULT_CACHE_PATH
+from ffmpeg_runner import DEFAULT_STALL_TIMEOUT
+from ffmpeg_utils import DEFAULT_FFMPEG_LIMIT, ensure_ffmpeg, set_ffmpeg_limit
+from job_handlers import TOOLS, ToolHandler
+from job_journal import unit_id
+from media_scanner import ScannedFile, add_scan_arguments, iter_media_files
+from worker_pool import WorkerPool
+
+# 租约时长（秒），心跳间隔为其三分之一
+DEFAULT_LEASE_SECONDS = 120.0
+# 同一任务最多被领取的次数，超过后记为失败（避免导致工作者崩溃的文件被反复领取）
+DEFAULT_MAX_ATTEMPTS = 3
+# 没有可领取的任务时的等待间隔（秒）
+DEFAULT_IDLE_SECONDS = 2.0
+# 提交结果时数据库被锁住（如共享存储上等待超时）的重试次数
+COMMIT_RETRIES = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    unit TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    input TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
+    output TEXT NOT NULL,
+    options TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    outputs TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+class QueueItem:
+    """
+    领取到的一个任务。
+    """
+
+    __slots__ = ("unit", "tool", "scanned", "output", "options")
+
+    def __init__(self, unit, tool, input_path, relative_path, output, options):
+        self.unit = unit
+        self.tool = tool
+        self.scanned = ScannedFile(input_path, relative_path)
+        self.output = output
+        self.options = json.loads(options)
+
+
+class WorkQueue:
+    """
+    基于 SQLite 的租约式任务队列。状态：pending（待处理）、leased（处理中）、done、failed。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    ):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # 事务由 _transaction 显式控制；其他机器持有写锁时最多等待 60 秒
+        self._conn = sqlite3.connect(
+            db_path, timeout=60, isolation_level=None, check_same_thread=False
+        )
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=DELETE")
+            self._conn.execute("PRAGMA synchronous=FULL")
+            self._conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        """
+        写事务：BEGIN IMMEDIATE 立即获取写锁，事务内的读取和更新对其他工作者是原子的。
+        """
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def enqueue(self, tool: str, output_dir: str, scanned_files, options: dict | None = None, requeue: bool = False) -> int:
+        """
+        把文件加入队列。
+        :param tool: 工具名称，见 job_handlers.TOOLS
+        :param output_dir: 输出目录（所有机器上相同的路径）
+        :param scanned_files: ScannedFile 的可迭代对象
+        :param options: 处理器选项（use_cache、timeout、split_long、fused、copy_segments）
+        :param requeue: 已完成或失败的任务是否重新置为待处理
+        :return: 新加入（或重新置为待处理）的任务数
+        """
+        if tool not in TOOLS:
+            raise ValueError(f"不支持的工具: {tool}，可选: {', '.join(TOOLS)}")
+        options = json.dumps(options or {}, sort_keys=True)
+        output_dir = os.path.abspath(output_dir)
+        now = time.time()
+        rows = [
+            (
+                unit_id(tool, scanned.path),
+                tool,
+                os.path.abspath(scanned.path),
+                scanned.relative_path,
+                output_dir,
+                options,
+                now,
+            )
+            for scanned in scanned_files
+        ]
+        with self._transaction() as conn:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO jobs (unit, tool, input, relative_path, output, options, state, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)",
+                rows,
+            )
+            if requeue:
+                conn.executemany(
+                    "UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL, attempts = 0,"
+                    " error = NULL, output = ?, options = ?, updated = ?"
+                    " WHERE unit = ? AND state IN ('done', 'failed')",
+                    [(row[4], row[5], now, row[0]) for row in rows],
+                )
+            return conn.total_changes - before
+
+    def _release_expired(self, conn, now: float) -> int:
+        """
+        把租约已过期的任务放回待处理；领取次数达到上限的记为失败。
+        """
+        conn.execute(
+            "UPDATE jobs SET state = 'failed', owner = NULL, updated = ?,"
+            " error = '租约多次过期（工作者可能在处理该文件时崩溃）'"
+            " WHERE state = 'leased' AND lease_expires < ? AND attempts >= ?",
+            (now, now, self.max_attempts),
+        )
+        cursor = conn.execute(
+            "UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL, updated = ?"
+            " WHERE state = 'leased' AND lease_expires < ?",
+            (now, now),
+        )
+        return cursor.rowcount
+
+    def release_expired(self) -> int:
+        """
+        回收租约已过期的任务（领取时也会自动回收）。
+        :return: 放回待处理的任务数
+        """
+        with self._transaction() as conn:
+            return self._release_expired(conn, time.time())
+
+    def claim(self, owner: str, limit: int = 1) -> list:
+        """
+        领取最多 limit 个待处理任务。
+        :param owner: 工作者标识（如 主机名:进程号）
+        :return: QueueItem 列表
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        with self._transaction() as conn:
+            released = self._release_expired(conn, now)
+            if released:
+                logger.warning(f"回收了 {released} 个租约过期的任务")
+            rows = conn.execute(
+                "SELECT unit, tool, input, relative_path, output, options FROM jobs"
+                " WHERE state = 'pending' ORDER BY rowid LIMIT ?",
+                (limit,),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE jobs SET state = 'leased', owner = ?, lease_expires = ?,"
+                " attempts = attempts + 1, updated = ? WHERE unit = ?",
+                [(owner, now + self.lease_seconds, now, row[0]) for row in rows],
+            )
+        return [QueueItem(*row) for row in rows]
+
+    def heartbeat(self, owner: str, units) -> list:
+        """
+        延长仍由 owner 持有的任务的租约。
+        :return: 租约已经丢失（过期后被回收或接手）的任务
+        """
+        lost = []
+        now = time.time()
+        with self._transaction() as conn:
+            for unit in units:
+                cursor = conn.execute(
+                    "UPDATE jobs SET lease_expires = ?, updated = ?"
+                    " WHERE unit = ? AND owner = ? AND state = 'leased'",
+                    (now + self.lease_seconds, now, unit, owner),
+                )
+                if cursor.rowcount == 0:
+                    lost.append(unit)
+        return lost
+
+    def complete(self, owner: str, unit: str, ok: bool, outputs=None, error: str | None = None) -> bool:
+        """
+        提交任务结果，只有仍持有租约时才生效。
+        :return: 是否生效
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, owner = NULL, lease_expires = NULL, outputs = ?,"
+                " error = ?, updated = ? WHERE unit = ? AND owner = ? AND state = 'leased'",
+                (
+                    "done" if ok else "failed",
+                    json.dumps(outputs or [], ensure_ascii=False),
+                    error,
+                    time.time(),
+                    unit,
+                    owner,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def release(self, owner: str, unit: str) -> None:
+        """
+        放弃租约，任务回到待处理且不计入领取次数（如工作者停止前未开始处理的任务）。
+        """
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'pending', owner = NULL, lease_expires = NULL,"
+                " attempts = MAX(attempts - 1, 0), updated = ?"
+                " WHERE unit = ? AND owner = ? AND state = 'leased'",
+                (time.time(), unit, owner),
+            )
+
+    def retry_failed(self) -> int:
+        """
+        把失败的任务重新置为待处理。
+        :return: 任务数
+        """
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = 'pending', attempts = 0, error = NULL, updated = ?"
+                " WHERE state = 'failed'",
+                (time.time(),),
+            )
+            return cursor.rowcount
+
+    def stats(self) -> dict:
+        """
+        各状态的任务数，以及各工作者持有的租约数。
+        """
+        with self._lock:
+            states = dict(self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+            owners = dict(
+                self._conn.execute(
+                    "SELECT owner, COUNT(*) FROM jobs WHERE state = 'leased' GROUP BY owner"
+                )
+            )
+        return {"states": states, "owners": owners}
+
+    def failures(self) -> list:
+        """
+        失败任务的 (输入路径, 错误信息) 列表。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT input, error FROM jobs WHERE state = 'failed' ORDER BY rowid"
+            ).fetchall()
+
+    def unfinished(self) -> int:
+        """
+        尚未结束（待处理或处理中）的任务数。
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE state IN ('pending', 'leased')"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def enqueue_directory(
+    queue_path: str,
+    tool: str,
+    input_dir: str,
+    output_dir: str,
+    options: dict | None = None,
+    recursive: bool = True,
+    include=None,
+    exclude=None,
+    requeue: bool = False,
+) -> int:
+    """
+    扫描输入目录并把文件加入共享队列。
+    :return: 新加入的任务数
+    """
+    extensions = ToolHandler.extensions_for(tool)
+    scanned_files = iter_media_files(
+        input_dir, extensions, include, exclude, recursive, skip_dirs=[output_dir]
+    )
+    queue = WorkQueue(queue_path)
+    try:
+        count = queue.enqueue(tool, output_dir, scanned_files, options, requeue)
+    finally:
+        queue.close()
+    logger.info(f"已加入 {count} 个任务: {queue_path}")
+    return count
+
+
+def run_worker(
+    queue_path: str,
+    workers: int = DEFAULT_FFMPEG_LIMIT,
+    max_ffmpeg: int = DEFAULT_FFMPEG_LIMIT,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    cache_path: str = DEFAULT_CACHE_PATH,
+    stall_timeout: float = DEFAULT_STALL_TIMEOUT,
+    follow: bool = False,
+    idle_seconds: float = DEFAULT_IDLE_SECONDS,
+    owner: str | None = None,
+) -> int:
+    """
+    作为工作者处理共享队列中的任务：有空闲的工作线程才领取，处理期间定期心跳，完成后提交结果。
+    收到 SIGTERM/SIGINT 后不再领取新任务，等待处理中的任务完成并提交。需要在主线程调用。
+    :param queue_path: 队列数据库路径（共享存储上）
+    :param workers: 同时处理的文件数
+    :param max_ffmpeg: 本机同时运行的 FFmpeg 进程上限
+    :param lease_seconds: 租约时长（秒）
+    :param max_attempts: 同一任务最多被领取的次数
+    :param cache_path: 本机的转换缓存数据库路径
+    :param stall_timeout: FFmpeg 没有进度多长时间视为卡住并重试（秒）
+    :param follow: 队列处理完后继续等待新任务，否则所有任务结束后退出
+    :param idle_seconds: 没有可领取的任务时的等待间隔（秒）
+    :param owner: 工作者标识，默认为 主机名:进程号
+    :return: 本工作者处理失败的任务数
+    """
+    owner = owner or f"{socket.gethostname()}:{os.getpid()}"
+    queue = WorkQueue(queue_path, lease_seconds, max_attempts)
+    set_ffmpeg_limit(max_ffmpeg)
+    pool = WorkerPool(workers, name="queue")
+    handlers = {}
+    active = {}  # unit -> QueueItem
+    lock = threading.Lock()
+    wake = threading.Event()
+    stop = threading.Event()
+    abort = threading.Event()
+    counts = {"done": 0, "failed": 0, "lost": 0}
+
+    def handler_for(item: QueueItem) -> ToolHandler:
+        key = (item.tool, item.output, json.dumps(item.options, sort_keys=True))
+        if key not in handlers:
+            handlers[key] = ToolHandler(
+                item.tool,
+                item.output,
+                cache_path=cache_path,
+                stall_timeout=stall_timeout,
+                split_parts=max_ffmpeg,
+                **item.options,
+            )
+        return handlers[key]
+
+    def run_item(handler: ToolHandler, item: QueueItem):
+        if not handler(item.scanned):
+            return False
+        return handler.outputs(item.scanned)
+
+    def commit(item: QueueItem, job) -> bool:
+        if job.state == "cancelled":
+            queue.release(owner, item.unit)
+            return True
+        return queue.complete(owner, item.unit, job.finished_ok, job.result or [], job.error)
+
+    def on_done(item: QueueItem, job) -> None:
+        try:
+            for attempt in range(1, COMMIT_RETRIES + 1):
+                try:
+                    committed = commit(item, job)
+                    break
+                except sqlite3.Error as e:
+                    if attempt == COMMIT_RETRIES:
+                        # 不再续租，租约过期后任务由其他工作者（或本工作者）重新领取
+                        logger.error(f"提交结果失败，等待租约过期后重试任务: {item.scanned.path}，错误信息: {e}")
+                        return
+                    logger.warning(f"提交结果失败，稍后重试（第 {attempt} 次）: {e}")
+                    time.sleep(idle_seconds * attempt)
+            if not committed:
+                counts["lost"] += 1
+                logger.warning(f"租约已丢失，结果未提交（任务已由其他工作者接手）: {item.scanned.path}")
+            elif job.state != "cancelled":
+                counts["done" if job.finished_ok else "failed"] += 1
+        finally:
+            # 无论提交是否成功都移出 active，否则心跳会一直续租，任务永远不会被其他工作者接手
+            with lock:
+                active.pop(item.unit, None)
+            wake.set()
+
+    def heartbeat_loop() -> None:
+        while not heartbeat_stop.wait(lease_seconds / 3):
+            with lock:
+                units = list(active)
+            if not units:
+                continue
+            try:
+                lost = queue.heartbeat(owner, units)
+            except sqlite3.Error as e:
+                logger.warning(f"心跳失败，稍后重试: {e}")
+                continue
+            for unit in lost:
+                # 处理中的任务继续运行，但写入本工作者自己的临时文件（见 job_journal.partial_suffix），
+                # 不会覆盖接手者写了一半的输出，结果也不会被提交
+                logger.warning(f"租约已丢失，任务已由其他工作者接手: {unit}")
+
+    def on_signal(signum, frame):
+        if stop.is_set():
+            abort.set()
+        stop.set()
+        wake.set()
+
+    previous = {
+        signum: signal.signal(signum, on_signal) for signum in (signal.SIGTERM, signal.SIGINT)
+    }
+    heartbeat_stop = threading.Event()
+    heartbeat = threading.Thread(target=heartbeat_loop, name="queue-heartbeat", daemon=True)
+    heartbeat.start()
+    logger.info(f"工作者 {owner} 开始处理队列: {queue_path}")
+    try:
+        while not stop.is_set():
+            wake.clear()
+            with lock:
+                free = workers - len(active)
+            items = queue.claim(owner, free) if free > 0 else []
+            for item in items:
+                try:
+                    handler = handler_for(item)
+                except (ValueError, TypeError, RuntimeError, FileNotFoundError) as e:
+                    logger.error(f"无法处理任务: {item.scanned.path}，错误信息: {e}")
+                    queue.complete(owner, item.unit, False, error=str(e))
+                    counts["failed"] += 1
+                    continue
+                with lock:
+                    active[item.unit] = item
+                pool.submit(
+                    run_item,
+                    handler,
+                    item,
+                    name=item.unit,
+                    on_done=lambda job, item=item: on_done(item, job),
+                )
+            if items:
+                continue
+            with lock:
+                busy = bool(active)
+            if not busy and not follow and queue.unfinished() == 0:
+                break
+            # 其他工作者持有的租约可能过期，需要继续等待而不是退出
+            wake.wait(idle_seconds)
+
+        with lock:
+            remaining = len(active)
+        if remaining:
+            logger.info(f"停止领取任务，等待 {remaining} 个任务完成（再次发送停止信号取消排队中的任务）")
+        pool.drain(abort)
+    finally:
+        heartbeat_stop.set()
+        heartbeat.join()
+        queue.close()
+        for signum, handler in previous.items():
+            signal.signal(signum, handler)
+    logger.info(
+        f"工作者 {owner} 已停止：完成 {counts['done']} 个，失败 {counts['failed']} 个，"
+        f"租约丢失 {counts['lost']} 个"
+    )
+    return counts["failed"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="共享存储上的任务队列：多台机器共同处理一批文件")
+    parser.add_argument("--queue", required=True, help="队列数据库路径（放在所有机器都能访问的共享目录上）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = subparsers.add_parser("enqueue", help="扫描目录并把文件加入队列")
+    enqueue_parser.add_argument("--tool", choices=TOOLS, required=True, help="处理使用的工具")
+    enqueue_parser.add_argument("--input", required=True, help="输入目录")
+    enqueue_parser.add_argument("--output", required=True, help="输出目录")
+    enqueue_parser.add_argument("--no-cache", action="store_true", help="不使用转换缓存")
+    enqueue_parser.add_argument(
+        "--job-timeout", type=float, default=None, help="单个文件的墙钟时间预算（秒）"
+    )
+    enqueue_parser.add_argument(
+        "--split-long", type=float, default=None, help="时长超过该秒数的音频切成多段并行转换"
+    )
+    enqueue_parser.add_argument("--fused", action="store_true", help="视频工具使用单遍模式")
+    enqueue_parser.add_argument(
+        "--copy-segments", action="store_true", help="视频工具对已压缩的音频输入流复制切分"
+    )
+    enqueue_parser.add_argument(
+        "--requeue", action="store_true", help="已完成或失败的文件重新置为待处理"
+    )
+    add_scan_arguments(enqueue_parser)
+
+    worker_parser = subparsers.add_parser("worker", help="领取并处理队列中的任务")
+    worker_parser.add_argument(
+        "--workers", type=int, default=DEFAULT_FFMPEG_LIMIT, help="同时处理的文件数"
+    )
+    worker_parser.add_argument(
+        "--max-ffmpeg", type=int, default=DEFAULT_FFMPEG_LIMIT, help="本机同时运行的 FFmpeg 进程上限"
+    )
+    worker_parser.add_argument(
+        "--lease-seconds", type=float, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）"
+    )
+    worker_parser.add_argument(
+        "--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="同一任务最多被领取的次数"
+    )
+    worker_parser.add_argument(
+        "--stall-timeout",
+        type=float,
+        default=DEFAULT_STALL_TIMEOUT,
+        help="FFmpeg 没有进度多长时间视为卡住并重试（秒）",
+    )
+    worker_parser.add_argument(
+        "--follow", action="store_true", help="队列处理完后继续等待新任务"
+    )
+    worker_parser.add_argument("--worker-id", default=None, help="工作者标识，默认为 主机名:进程号")
+
+    subparsers.add_parser("status", help="显示队列状态")
+    subparsers.add_parser("retry-failed", help="把失败的任务重新置为待处理")
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        options = {
+            "use_cache": not args.no_cache,
+            "timeout": args.job_timeout,
+            "split_long": args.split_long,
+            "fused": args.fused,
+            "copy_segments": args.copy_segments,
+        }
+        enqueue_directory(
+            args.queue,
+            args.tool,
+            args.input,
+            args.output,
+            options,
+            recursive=not args.no_recursive,
+            include=args.include,
+            exclude=args.exclude,
+            requeue=args.requeue,
+        )
+    elif args.command == "worker":
+        # 首先检测并确保 FFmpeg 已安装
+        ensure_ffmpeg()
+        failed = run_worker(
+            args.queue,
+            workers=args.workers,
+            max_ffmpeg=args.max_ffmpeg,
+            lease_seconds=args.lease_seconds,
+            max_attempts=args.max_attempts,
+            stall_timeout=args.stall_timeout,
+            follow=args.follow,
+            owner=args.worker_id,
+        )
+        raise SystemExit(1 if failed else 0)
+    else:
+        work_queue = WorkQueue(args.queue)
+        if args.command == "retry-failed":
+            logger.info(f"{work_queue.retry_failed()} 个失败的任务已重新置为待处理")
+        stats = work_queue.stats()
+        logger.info(f"任务状态: {stats['states']}")
+        for owner, count in stats["owners"].items():
+            logger.info(f"  {owner}: 处理中 {count} 个")
+        for input_path, error in work_queue.failures():
+            logger.warning(f"失败: {input_path}，错误信息: {error}")
+        work_queue.close()
@@ -0,0 +1,259 @@
+"""
+常驻工作池：固定数量的工作线程从优先级队列中取任务执行，供监视目录的常驻进程和本地任务服务复用。
+工作线程在进程生命周期内一直存在，FFmpeg 探测结果、转换缓存和任务日志等进程内单例只需初始化一次。
+每个任务都有状态记录（排队、运行、完成、失败、取消），可以按 ID 查询；停止时可以等待已提交的任务全部完成（排空）。
+"""
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from collections import OrderedDict, deque
+
+from loguru import logger
+
+# 保留的已结束任务数量，更早的记录被丢弃
+DEFAULT_HISTORY = 1000
+
+
+class Job:
+    """
+    一个提交到工作池的任务及其状态。
+    """
+
+    def __init__(self, job_id: int, name: str, priority: int, fn, args, kwargs, meta=None):
+        self.id = job_id
+        self.name = name
+        self.priority = priority
+        self.meta = meta or {}  # 调用方附加的说明信息，如工具名和输入路径
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.state = "queued"  # queued/running/done/failed/cancelled
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.callbacks = []
+        self._done = threading.Event()
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """
+        等待任务结束。
+        :return: 任务是否已结束
+        """
+        return self._done.wait(timeout)
+
+    @property
+    def finished_ok(self) -> bool:
+        return self.state == "done"
+
+    def to_dict(self) -> dict:
+        """
+        任务状态的 JSON 可序列化表示。
+        """
+        return {
+            "id": self.id,
+            "name": self.name,
+            "priority": self.priority,
+            "meta": self.meta,
+            "state": self.state,
+            "result": self.result,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class WorkerPool:
+    """
+    优先级工作池：priority 越大越先执行，相同优先级按提交顺序执行。
+    任务函数返回 False 或抛出异常时记为失败。
+    """
+
+    def __init__(self, workers: int, name: str = "worker", history: int = DEFAULT_HISTORY):
+        self._condition = threading.Condition()
+        self._heap = []
+        self._sequence = itertools.count()
+        self._ids = itertools.count(1)
+        self._jobs = OrderedDict()
+        self._finished = deque()  # 已结束任务的 id，按结束顺序
+        self._history = history
+        self._running = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(
+        self,
+        fn,
+        *args,
+        priority: int = 0,
+        name: str | None = None,
+        on_done=None,
+        meta: dict | None = None,
+        **kwargs,
+    ) -> Job:
+        """
+        提交一个任务。
+        :param fn: 任务函数，在工作线程中以 fn(*args, **kwargs) 调用
+        :param priority: 优先级，越大越先执行
+        :param name: 任务名称，用于日志和状态查询
+        :param on_done: 任务结束（包括失败和取消）后在工作线程中调用 on_done(job)
+        :param meta: 附加在任务状态中的说明信息（需可 JSON 序列化）
+        :return: Job
+        :raises RuntimeError: 工作池已停止接收任务
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("工作池已停止，不再接收任务")
+            job = Job(
+                next(self._ids),
+                name or getattr(fn, "__name__", "job"),
+                priority,
+                fn,
+                args,
+                kwargs,
+                meta,
+            )
+            if on_done is not None:
+                job.callbacks.append(on_done)
+            self._jobs[job.id] = job
+            heapq.heappush(self._heap, (-priority, next(self._sequence), job))
+            self._condition.notify()
+            return job
+
+    def get(self, job_id: int) -> Job | None:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> list:
+        with self._condition:
+            return list(self._jobs.values())
+
+    def stats(self) -> dict:
+        """
+        当前排队和运行中的任务数，以及各状态的任务数。
+        """
+        with self._condition:
+            states = {}
+            for job in self._jobs.values():
+                states[job.state] = states.get(job.state, 0) + 1
+            return {
+                "workers": len(self._threads),
+                "queued": len(self._heap),
+                "running": self._running,
+                "states": states,
+            }
+
+    def pending(self) -> int:
+        """
+        尚未结束的任务数（排队中和运行中）。
+        """
+        with self._condition:
+            return len(self._heap) + self._running
+
+    def cancel_pending(self) -> int:
+        """
+        取消所有尚未开始的任务，运行中的任务不受影响。
+        :return: 取消的任务数
+        """
+        with self._condition:
+            cancelled = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._condition.notify_all()
+        for job in cancelled:
+            self._finish(job, "cancelled")
+        return len(cancelled)
+
+    def close(self) -> None:
+        """
+        停止接收新任务，已提交的任务继续执行。
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def join(self, timeout: float | None = None) -> bool:
+        """
+        等待所有工作线程退出（需先 close），即排空已提交的任务。
+        :return: 是否已全部退出
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in self._threads:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            thread.join(remaining)
+            if thread.is_alive():
+                return False
+        return True
+
+    def shutdown(self, cancel_pending: bool = False) -> None:
+        """
+        停止工作池：不再接收任务，等待运行中的任务结束。
+        :param cancel_pending: 是否取消排队中的任务，为 False 时排队的任务也会执行完
+        """
+        self.close()
+        if cancel_pending:
+            self.cancel_pending()
+        self.join()
+
+    def drain(self, abort: threading.Event | None = None, interval: float = 0.5) -> int:
+        """
+        停止接收新任务并等待已提交的任务全部完成；等待期间 abort 被设置时取消排队中的任务，只等待运行中的任务。
+        适合在收到停止信号后调用：信号处理函数只需设置事件，不在信号上下文中操作工作池。
+        :param abort: 取消排队任务的事件
+        :param interval: 检查 abort 的间隔（秒）
+        :return: 被取消的任务数
+        """
+        self.close()
+        cancelled = None
+        while not self.join(interval):
+            if abort is not None and abort.is_set() and cancelled is None:
+                cancelled = self.cancel_pending()
+                logger.warning(f"已取消 {cancelled} 个排队中的任务，等待运行中的任务结束")
+        return cancelled or 0
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                while not self._heap and not self._closed:
+                    self._condition.wait()
+                if not self._heap:
+                    return  # 已关闭且队列为空
+                _, _, job = heapq.heappop(self._heap)
+                self._running += 1
+                job.state = "running"
+                job.started = time.time()
+            try:
+                result = job.fn(*job.args, **job.kwargs)
+            except Exception as e:
+                logger.error(f"任务失败: {job.name}，错误信息: {e}\n{traceback.format_exc()}")
+                job.error = str(e)
+                state = "failed"
+            else:
+                job.result = result
+                state = "failed" if result is False else "done"
+            with self._condition:
+                self._running -= 1
+            self._finish(job, state)
+
+    def _finish(self, job: Job, state: str) -> None:
+        job.state = state
+        job.finished = time.time()
+        with self._condition:
+            # 只保留最近的已结束任务，常驻进程的内存不会随处理的文件数增长
+            self._finished.append(job.id)
+            while len(self._finished) > self._history:
+                self._jobs.pop(self._finished.popleft(), None)
+        job._done.set()
+        for callback in job.callbacks:
+            try:
+                callback(job)
+            except Exception as e:
+                logger.error(f"任务回调失败: {job.name}，错误信息: {e}")